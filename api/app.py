@@ -3,17 +3,218 @@ API Server for Water Quality Monitoring System
 Flask-based REST API that receives sensor measurements and stores them in InfluxDB.
 """
 
+import atexit
+import itertools
+import os
+import time
+from functools import partial
 from flask import Flask, request, jsonify
 from datetime import datetime
+from api.compression import (
+    MIN_BYTES,
+    RequestBodyError,
+    compress,
+    compress_stream,
+    compressible,
+    decode_body,
+    negotiate,
+)
+from api.ingest_schema import (
+    format_timestamp,
+    loads,
+    missing_fields,
+    normalize_measurement,
+)
+from api.responses import (
+    ARROW_AVAILABLE,
+    arrow_response,
+    csv_response,
+    json_stream_response,
+    SSE_MIMETYPE,
+    ndjson_response,
+    sse_response,
+)
+from operations.alerting import AlertEngine, load_rules
+from operations.incremental_aggregator import AGGREGATION_MODE, IncrementalAggregator
+from operations.live_stream import LiveBroker, TooManySubscribersError
+from operations.watermarks import WatermarkTracker
+from storage.columnar import to_rows
+from storage.downsample import (
+    METHODS as DOWNSAMPLE_METHODS,
+    downsample_columns,
+    downsample_rows,
+)
 from storage.influx_client import InfluxDBClient
+from storage.sensor_registry import SensorRegistry
+from storage.sketch import (
+    RELATIVE_ACCURACY,
+    merge_counts,
+    parse_percentiles,
+    percentiles,
+)
+from storage.write_buffer import WriteBufferFullError
 from utils.logger_config import setup_logging
+from utils.windows import epoch_ns, parse_time, resolve_window, select_window
 
 logger = setup_logging("api")
 
 app = Flask(__name__)
 
-# Initialize InfluxDB client
-influx_client = InfluxDBClient()
+# Per-process state, created by init_worker() (see below)
+influx_client = None
+aggregator = None
+watermarks = None
+sensor_registry = None
+alert_engine = None
+live_broker = None
+_worker_pid = None
+
+
+def init_worker():
+    """
+    Create this process's InfluxDB client, inline aggregator, watermarks,
+    sensor registry connection, alert engine and live stream broker.
+
+    Called at import time. A pre-fork server that imports the app before
+    forking (gunicorn --preload) must call it again in each worker, since
+    the client's connection pool and the background writer and aggregator
+    threads do not survive a fork; api/gunicorn_conf.py does so in post_fork.
+    """
+    global influx_client, aggregator, watermarks, sensor_registry, alert_engine
+    global live_broker, _worker_pid
+
+    influx_client = InfluxDBClient()
+
+    # Streaming rollups of the finest tiers, updated as readings are ingested
+    aggregator = None
+    if AGGREGATION_MODE == "inline":
+        aggregator = IncrementalAggregator(
+            write_fn=influx_client.write_lines,
+            grace=float(os.getenv("AGGREGATION_GRACE_MS", "2000")) / 1000.0,
+        )
+
+    # Per-sensor watermarks; readings too late for the rollups are recorded
+    # for `aggregation_tasks.py backfill --pending`
+    watermarks = WatermarkTracker(lateness=aggregator.grace if aggregator else None)
+
+    # Backfills rewrite settled windows; drop cached copies when one completes
+    if influx_client.query_cache:
+        influx_client.query_cache.generation_fn = watermarks.generation
+
+    # First/last seen and reading counts per sensor, served by GET /sensors
+    sensor_registry = SensorRegistry()
+
+    # Threshold/anomaly rules evaluated on every accepted reading
+    # (ALERT_RULES_PATH; invalid rules stop the worker from starting)
+    rules = load_rules()
+    alert_engine = AlertEngine(rules) if rules else None
+
+    # Subscribers of GET /stream, fed with accepted readings and alerts
+    live_broker = LiveBroker()
+    if alert_engine:
+        alert_engine.add_listener(live_broker.publish_alert)
+
+    _worker_pid = os.getpid()
+
+
+def shutdown_worker():
+    """
+    Flush and release this process's state before it exits.
+
+    Ends the live streams, closes the open inline windows, saves recorded
+    late ranges, delivers queued alerts and drains buffered writes. Safe to
+    call more than once (worker_exit and atexit).
+    """
+    global _worker_pid
+
+    if _worker_pid != os.getpid():
+        return
+    _worker_pid = None
+    logger.info(f"Shutting down API worker {os.getpid()}...")
+
+    live_broker.close()
+    try:
+        if aggregator:
+            aggregator.close()
+        watermarks.save()
+    except Exception as e:
+        logger.error(f"Error flushing aggregation state: {e}")
+    sensor_registry.close()
+    if alert_engine:
+        alert_engine.close()
+    influx_client.close()
+
+
+init_worker()
+atexit.register(shutdown_worker)
+
+# Upper bound on the number of readings accepted by POST /measurements/batch
+MAX_BATCH_SIZE = int(os.getenv("API_MAX_BATCH_SIZE", "10000"))
+
+# Upper bound on the number of sensors in one multi-sensor read
+MAX_SENSOR_IDS = int(os.getenv("API_MAX_SENSOR_IDS", "1000"))
+
+# Sensors returned by one GET /sensors page when no limit is given
+SENSORS_PAGE_SIZE = int(os.getenv("API_SENSORS_PAGE_SIZE", "1000"))
+
+# Rows read for a points= raw read when no limit is given
+DOWNSAMPLE_MAX_ROWS = int(os.getenv("API_DOWNSAMPLE_MAX_ROWS", "1000000"))
+
+# Seconds between keep-alive comments on an idle GET /stream
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+
+# format= values answered with column arrays instead of one object per row
+COLUMNAR_FORMATS = ("csv", "arrow")
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compress the body with the encoding negotiated from Accept-Encoding.
+
+    Buffered bodies are compressed whole once they reach
+    API_COMPRESS_MIN_BYTES; streamed bodies are compressed chunk by chunk as
+    they are written (see api/compression.py).
+    """
+    if (
+        response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or not compressible(response.mimetype)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.headers.get("Accept-Encoding"))
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(
+            response.response,
+            encoding,
+            flush_every_chunk=response.mimetype == SSE_MIMETYPE,
+        )
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_BYTES:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _request_body():
+    """
+    Return the request body, decompressed according to Content-Encoding.
+
+    Raises:
+        RequestBodyError: If the encoding is unsupported, the body is
+            corrupt or it decompresses to more than API_MAX_DECOMPRESSED_MB
+    """
+    return decode_body(request.get_data(), request.headers.get("Content-Encoding"))
 
 
 @app.route("/health", methods=["GET"])
@@ -27,60 +228,659 @@ def health_check():
     )
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Expose internal pipeline counters (write queue depth, flush latency, drops)."""
+    metrics = {
+        "writes": influx_client.get_write_stats(),
+        "query_cache": influx_client.get_cache_stats(),
+        "hot_tail": influx_client.get_hot_tail_stats(),
+    }
+    if aggregator:
+        metrics["aggregation"] = aggregator.stats()
+    metrics["watermarks"] = watermarks.stats()
+    metrics["sensor_registry"] = sensor_registry.stats()
+    if alert_engine:
+        metrics["alerts"] = alert_engine.stats()
+    metrics["live_stream"] = live_broker.stats()
+    async_client = app.extensions.get("async_influx_client")
+    if async_client:
+        metrics["async_reads"] = async_client.get_stats()
+    return jsonify(metrics), 200
+
+
+def _backpressure_response(error):
+    """Build a 503 response telling the sender when to retry a rejected write."""
+    response = jsonify(
+        {"error": "Write buffer full, retry later", "retry_after": error.retry_after}
+    )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
 @app.route("/measurements", methods=["POST"])
 def create_measurement():
     """Receive and store sensor measurements."""
     try:
-        data = request.get_json()
+        try:
+            data = loads(_request_body())
+        except RequestBodyError as e:
+            return jsonify({"error": str(e)}), e.status
+        except ValueError as e:
+            return jsonify({"error": "Invalid JSON", "details": str(e)}), 400
+        if not isinstance(data, dict):
+            return jsonify({"error": "measurement must be a JSON object"}), 400
 
         # Validate required fields
-        required_fields = ["sensor_id", "timestamp", "temperature", "conductivity"]
-        missing_fields = [field for field in required_fields if field not in data]
-
-        if missing_fields:
+        missing = missing_fields(data)
+        if missing:
             return (
-                jsonify(
-                    {"error": "Missing required fields", "missing": missing_fields}
-                ),
+                jsonify({"error": "Missing required fields", "missing": missing}),
                 400,
             )
 
-        # Validate data types
-        if not isinstance(data["temperature"], (int, float)):
-            return jsonify({"error": "temperature must be a number"}), 400
-
-        if not isinstance(data["conductivity"], (int, float)):
-            return jsonify({"error": "conductivity must be a number"}), 400
+        # Validate types and ranges; the timestamp becomes epoch nanoseconds
+        measurement, error = normalize_measurement(data, time.time_ns())
+        if error:
+            return jsonify({"error": error}), 400
 
         # Store measurement in InfluxDB
-        success = influx_client.write_measurement(
-            sensor_id=data["sensor_id"],
-            timestamp=data["timestamp"],
-            temperature=data["temperature"],
-            conductivity=data["conductivity"],
-        )
+        success = influx_client.write_measurement(**measurement)
 
         if success:
-            return jsonify({"message": "Success", "sensor_id": data["sensor_id"]}), 201
+            _record_ingested([measurement])
+            return (
+                jsonify({"message": "Success", "sensor_id": measurement["sensor_id"]}),
+                201,
+            )
         else:
             return jsonify({"error": "Failure"}), 500
 
+    except WriteBufferFullError as e:
+        return _backpressure_response(e)
     except Exception as e:
         logger.error(f"Error processing measurement: {e}")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
 
+def _record_ingested(measurements):
+    """
+    Feed accepted measurements to the watermarks, registry, inline aggregator,
+    alert engine and live subscribers.
+    """
+    watermarks.observe(measurements)
+    sensor_registry.observe(measurements)
+    if aggregator:
+        aggregator.add(measurements)
+    if alert_engine:
+        alert_engine.evaluate(measurements)
+    live_broker.publish(measurements)
+
+
+def _parse_batch_body():
+    """
+    Parse a batch request body as either a JSON array or NDJSON.
+
+    Returns:
+        list: The decoded items (may contain non-dict entries, or None for
+            NDJSON lines that failed to decode)
+
+    Raises:
+        RequestBodyError: If a compressed body cannot be decoded
+        ValueError: If a JSON body is not an array
+    """
+    content_type = request.content_type or ""
+    body = _request_body()
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+    try:
+        data = loads(body)
+    except ValueError:
+        data = None
+    if not isinstance(data, list):
+        raise ValueError("Request body must be a JSON array of measurements")
+    return data
+
+
+@app.route("/measurements/batch", methods=["POST"])
+def create_measurements_batch():
+    """
+    Receive and store many sensor measurements in a single request.
+
+    Accepts either a JSON array (application/json) or one JSON object per line
+    (application/x-ndjson). Valid measurements are written to InfluxDB in one
+    request; the response reports accept/reject per item, in request order.
+    """
+    try:
+        try:
+            items = _parse_batch_body()
+        except RequestBodyError as e:
+            return jsonify({"error": str(e)}), e.status
+        except ValueError as e:
+            return jsonify({"error": "Invalid request body", "details": str(e)}), 400
+
+        if len(items) > MAX_BATCH_SIZE:
+            return (
+                jsonify(
+                    {
+                        "error": "Batch too large",
+                        "max_batch_size": MAX_BATCH_SIZE,
+                        "received": len(items),
+                    }
+                ),
+                413,
+            )
+
+        results = []
+        valid_items = []
+        valid_indexes = []
+        now_ns = time.time_ns()
+        for index, item in enumerate(items):
+            if item is None:
+                measurement, error = None, "Invalid JSON"
+            else:
+                measurement, error = normalize_measurement(item, now_ns)
+            if error:
+                results.append({"index": index, "status": "rejected", "error": error})
+            else:
+                results.append({"index": index, "status": "accepted"})
+                valid_items.append(measurement)
+                valid_indexes.append(index)
+
+        if valid_items:
+            write_errors = influx_client.write_measurements_bulk(valid_items)
+            for index, error in zip(valid_indexes, write_errors):
+                if error:
+                    results[index] = {
+                        "index": index,
+                        "status": "rejected",
+                        "error": error,
+                    }
+            _record_ingested(
+                [item for item, error in zip(valid_items, write_errors) if not error]
+            )
+
+        accepted = sum(1 for result in results if result["status"] == "accepted")
+        rejected = len(results) - accepted
+
+        if rejected == 0:
+            status_code = 201
+        elif accepted > 0:
+            status_code = 207
+        elif any(result["error"] == "Failure" for result in results):
+            status_code = 500
+        else:
+            status_code = 400
+
+        return (
+            jsonify({"accepted": accepted, "rejected": rejected, "results": results}),
+            status_code,
+        )
+
+    except WriteBufferFullError as e:
+        return _backpressure_response(e)
+    except Exception as e:
+        logger.error(f"Error processing measurement batch: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
+def _stream_mode():
+    """
+    Return how the client asked for a chunked response, if at all.
+
+    - "ndjson": format=ndjson, one JSON object per line
+    - "json": stream=true, the usual JSON body written incrementally
+    - None: the buffered jsonify response
+    """
+    if request.args.get("format") == "ndjson":
+        return "ndjson"
+    if request.args.get("stream", "").lower() in ("1", "true"):
+        return "json"
+    return None
+
+
+def _streamed_response(mode, envelope, key, rows):
+    """Build the chunked response for a mode returned by _stream_mode()."""
+    if mode == "ndjson":
+        return ndjson_response(rows)
+    return json_stream_response(envelope, key, rows)
+
+
+def _downsampling():
+    """
+    Read the points= and downsample= parameters of a read.
+
+    Returns:
+        tuple: (points, method), or None if no points= was given
+
+    Raises:
+        ValueError: If points is not an integer of at least 3, the method is
+            unknown, or the request also asks for a chunked response or a cursor
+    """
+    points = request.args.get("points")
+    if points is None:
+        return None
+    try:
+        points = int(points)
+    except ValueError:
+        raise ValueError("points must be an integer")
+    if points < 3:
+        raise ValueError("points must be at least 3")
+
+    method = request.args.get("downsample", "lttb")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    if _stream_mode() or request.args.get("cursor"):
+        raise ValueError(
+            "points cannot be combined with stream, format=ndjson or cursor"
+        )
+    return points, method
+
+
+def _downsample_info(downsampling, source_count):
+    """Describe a downsampled response: method, target and rows read."""
+    points, method = downsampling
+    return {"method": method, "points": points, "source_count": source_count}
+
+
+def _downsampled_reader(read_columns, downsampling):
+    """Wrap a column reader so its result is downsampled, if requested."""
+    if not downsampling:
+        return read_columns
+    return lambda: downsample_columns(read_columns(), *downsampling)
+
+
+def _columnar_response(response_format, read_columns, metadata):
+    """
+    Build a column-oriented response for format=csv or format=arrow.
+
+    Args:
+        response_format (str): "csv" or "arrow"
+        read_columns: Callable returning the client's column arrays
+        metadata (dict): Request context stored in the Arrow schema metadata
+    """
+    if response_format == "arrow" and not ARROW_AVAILABLE:
+        return jsonify({"error": "format=arrow requires the pyarrow package"}), 406
+
+    columns = read_columns()
+    if response_format == "csv":
+        return csv_response(columns)
+    return arrow_response(columns, metadata)
+
+
+def _select_window(start_time, end_time, args=None):
+    """
+    Pick the rollup tier for an aggregated read.
+
+    An explicit window= is mapped onto the coarsest tier that satisfies it
+    (e.g. "10m" -> "5m"); otherwise the coarsest tier that still gives
+    enough windows for the requested time range is used.
+
+    Args:
+        args: Query parameters (default: the current request's)
+
+    Raises:
+        ValueError: If the window or a time bound cannot be parsed
+    """
+    requested = (request.args if args is None else args).get("window")
+    if requested:
+        return resolve_window(requested)
+    return select_window(start_time, end_time)
+
+
+def _open_windows(sensor_id, window, end_time, statistics=False):
+    """
+    Rows for a sensor's still-open windows from the inline aggregator.
+
+    Open windows are only added when the read range runs up to now (no end)
+    and the window is aggregated inline; they come first (newest first) and
+    are marked "partial": true.
+    """
+    if not aggregator or end_time:
+        return []
+    if statistics:
+        return aggregator.open_statistics(sensor_id, window)
+    return aggregator.open_aggregated(sensor_id, window)
+
+
+def _parse_sensor_ids(args=None):
+    """
+    Read the comma-separated sensor_ids query parameter.
+
+    Args:
+        args: Query parameters (default: the current request's)
+
+    Raises:
+        ValueError: If it is missing, empty or lists too many sensors
+    """
+    raw = (request.args if args is None else args).get("sensor_ids", "")
+    sensor_ids = list(dict.fromkeys(s.strip() for s in raw.split(",") if s.strip()))
+    if not sensor_ids:
+        raise ValueError("sensor_ids is required (comma-separated list)")
+    if len(sensor_ids) > MAX_SENSOR_IDS:
+        raise ValueError(f"At most {MAX_SENSOR_IDS} sensor_ids per request")
+    return sensor_ids
+
+
+@app.route("/measurements", methods=["GET"])
+def get_measurements_many():
+    """
+    Retrieve raw measurements for several sensors in one request.
+
+    Query parameters:
+    - sensor_ids: Comma-separated sensor IDs (required)
+    - start: Start time (ISO format or relative like "-1h")
+    - end: End time (ISO format, optional)
+    - limit: Maximum records per sensor (default: 100)
+    """
+    try:
+        try:
+            sensor_ids = _parse_sensor_ids()
+            limit = int(request.args.get("limit", 100))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        measurements = influx_client.read_measurements_many(
+            sensor_ids=sensor_ids,
+            start_time=request.args.get("start"),
+            end_time=request.args.get("end"),
+            limit=limit,
+        )
+
+        return (
+            jsonify(
+                {
+                    "sensor_ids": sensor_ids,
+                    "count": sum(len(rows) for rows in measurements.values()),
+                    "measurements": measurements,
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving measurements for multiple sensors: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
+@app.route("/measurements/aggregated", methods=["GET"])
+def get_aggregated_measurements_many():
+    """
+    Retrieve aggregated measurements for several sensors in one request.
+
+    Query parameters:
+    - sensor_ids: Comma-separated sensor IDs (required)
+    - start: Start time (ISO format or relative like "-1h", default: "-7d")
+    - end: End time (ISO format, optional)
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    """
+    try:
+        start_time = request.args.get("start", "-7d")
+        end_time = request.args.get("end")
+        try:
+            sensor_ids = _parse_sensor_ids()
+            window = _select_window(start_time, end_time)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        measurements = influx_client.read_aggregated_measurements_many(
+            sensor_ids=sensor_ids,
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+        )
+        for sensor_id, rows in measurements.items():
+            rows[:0] = _open_windows(sensor_id, window, end_time)
+
+        return (
+            jsonify(
+                {
+                    "sensor_ids": sensor_ids,
+                    "count": sum(len(rows) for rows in measurements.values()),
+                    "window": window,
+                    "measurements": measurements,
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving aggregated measurements: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
+@app.route("/measurements/statistics", methods=["GET"])
+def get_measurement_statistics_many():
+    """
+    Retrieve statistics for several sensors in one request.
+
+    Query parameters:
+    - sensor_ids: Comma-separated sensor IDs (required)
+    - start: Start time (ISO format or relative like "-1h", default: "-7d")
+    - end: End time (ISO format, optional)
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    """
+    try:
+        start_time = request.args.get("start", "-7d")
+        end_time = request.args.get("end")
+        try:
+            sensor_ids = _parse_sensor_ids()
+            window = _select_window(start_time, end_time)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        statistics = influx_client.read_aggregated_statistics_many(
+            sensor_ids=sensor_ids,
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+        )
+        for sensor_id, rows in statistics.items():
+            rows[:0] = _open_windows(sensor_id, window, end_time, statistics=True)
+
+        return (
+            jsonify(
+                {
+                    "sensor_ids": sensor_ids,
+                    "count": sum(len(rows) for rows in statistics.values()),
+                    "window": window,
+                    "statistics": statistics,
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving statistics: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
+def _percentile_args(args=None):
+    """
+    Read the range, rollup tier and percentiles of a percentile read.
+
+    Args:
+        args: Query parameters (default: the current request's)
+
+    Returns:
+        tuple: (start_time, end_time, window, ranks)
+
+    Raises:
+        ValueError: If a time, the window or a percentile cannot be parsed
+    """
+    args = request.args if args is None else args
+    start_time = args.get("start", "-7d")
+    end_time = args.get("end")
+    window = _select_window(start_time, end_time, args)
+    return start_time, end_time, window, parse_percentiles(args.get("percentiles"))
+
+
+def _percentiles_body(sketches, sensor_ids, window, end_time, ranks):
+    """
+    Estimate percentiles from stored sketches merged over a range.
+
+    The still-open windows of the inline aggregator are merged in when the
+    range runs up to now, like the open windows of the other rollup reads.
+
+    Args:
+        sketches (dict): field -> {bucket: count} from read_sketches()
+
+    Returns:
+        dict: Response fields "window", "relative_accuracy" and
+            "percentiles" (field -> count and "p<rank>" values)
+    """
+    if aggregator and not end_time:
+        for field, counts in aggregator.open_sketch(sensor_ids, window).items():
+            merge_counts(sketches[field], counts)
+    return {
+        "window": window,
+        "relative_accuracy": RELATIVE_ACCURACY,
+        "percentiles": {
+            field: percentiles(counts, ranks) for field, counts in sketches.items()
+        },
+    }
+
+
+@app.route("/measurements/percentiles", methods=["GET"])
+def get_percentiles_many():
+    """
+    Percentiles of the readings of several sensors taken together.
+
+    Query parameters:
+    - sensor_ids: Comma-separated sensor IDs (required)
+    - start: Start time (ISO format or relative like "-1h", default: "-7d")
+    - end: End time (ISO format, optional)
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    - percentiles: Comma-separated percentiles (default: "50,95,99")
+    """
+    try:
+        try:
+            sensor_ids = _parse_sensor_ids()
+            start_time, end_time, window, ranks = _percentile_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        sketches = influx_client.read_sketches(
+            sensor_ids=sensor_ids,
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+        )
+        return (
+            jsonify(
+                {
+                    "sensor_ids": sensor_ids,
+                    **_percentiles_body(sketches, sensor_ids, window, end_time, ranks),
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving percentiles: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
 @app.route("/measurements/<sensor_id>", methods=["GET"])
 def get_measurements(sensor_id):
-    """Retrieve measurements for a specific sensor."""
+    """
+    Retrieve measurements for a specific sensor.
+
+    JSON responses are paged: pass the returned next_cursor as cursor= to
+    read the next, older page (start and end are then taken from the cursor).
+
+    points=N returns at most N measurements from the whole range (up to
+    API_DOWNSAMPLE_MAX_ROWS unless limit is given), downsampled with
+    downsample=lttb (default) or minmax; it works with JSON, csv and arrow.
+
+    Add format=ndjson or stream=true to receive a chunked response that is
+    written while the query result is still being read, or format=csv /
+    format=arrow for column-oriented output.
+    """
     try:
         start_time = request.args.get("start")
         end_time = request.args.get("end")
-        limit = int(request.args.get("limit", 100))
+        cursor = request.args.get("cursor")
+        try:
+            downsampling = _downsampling()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        measurements = influx_client.read_measurements(
-            sensor_id=sensor_id, start_time=start_time, end_time=end_time, limit=limit
+        default_limit = DOWNSAMPLE_MAX_ROWS if downsampling else 100
+        limit = int(request.args.get("limit", default_limit))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+
+        response_format = request.args.get("format")
+        if cursor and (response_format or _stream_mode()):
+            return (
+                jsonify({"error": "cursor is only supported for JSON responses"}),
+                400,
+            )
+
+        read_columns = partial(
+            influx_client.read_measurement_columns,
+            sensor_id=sensor_id,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit,
         )
+        if response_format in COLUMNAR_FORMATS:
+            return _columnar_response(
+                response_format,
+                _downsampled_reader(read_columns, downsampling),
+                {"sensor_id": sensor_id},
+            )
+
+        if downsampling:
+            columns = read_columns()
+            source_count = len(columns["timestamp"])
+            measurements = to_rows(
+                downsample_columns(columns, *downsampling), sensor_id=sensor_id
+            )
+            return (
+                jsonify(
+                    {
+                        "sensor_id": sensor_id,
+                        "count": len(measurements),
+                        "measurements": measurements,
+                        "downsampled": _downsample_info(downsampling, source_count),
+                    }
+                ),
+                200,
+            )
+
+        stream_mode = _stream_mode()
+        if stream_mode:
+            rows = influx_client.iter_measurements(
+                sensor_id=sensor_id,
+                start_time=start_time,
+                end_time=end_time,
+                limit=limit,
+            )
+            return _streamed_response(
+                stream_mode, {"sensor_id": sensor_id}, "measurements", rows
+            )
+
+        try:
+            measurements, next_cursor = influx_client.read_measurements_page(
+                sensor_id=sensor_id,
+                start_time=start_time,
+                end_time=end_time,
+                limit=limit,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         return (
             jsonify(
@@ -88,6 +888,7 @@ def get_measurements(sensor_id):
                     "sensor_id": sensor_id,
                     "count": len(measurements),
                     "measurements": measurements,
+                    "next_cursor": next_cursor,
                 }
             ),
             200,
@@ -100,70 +901,218 @@ def get_measurements(sensor_id):
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
 
+def _seed_sensor_registry():
+    """
+    Add the sensors already stored in InfluxDB to a new registry.
+
+    Only their IDs are known (first/last seen are null, readings 0) until
+    they send again. Runs once per registry file; an empty bucket is checked
+    again on the next request.
+    """
+    if sensor_registry.get_meta("seeded_at"):
+        return
+    sensors = influx_client.list_sensors()
+    if sensors:
+        sensor_registry.register(sensors)
+        sensor_registry.set_meta("seeded_at", datetime.utcnow().isoformat() + "Z")
+        logger.info(f"Seeded sensor registry with {len(sensors)} sensors")
+
+
 @app.route("/sensors", methods=["GET"])
 def list_sensors():
-    """List all sensors that have sent measurements."""
+    """
+    List sensors that have sent measurements, in sensor_id order.
+
+    Query parameters:
+    - limit: Maximum sensors per page (default: API_SENSORS_PAGE_SIZE)
+    - after: Return sensors after this sensor_id (the previous page's "next_after")
+    - prefix: Only sensor IDs starting with this string
+    - seen_since: Only sensors with a reading at or after this time
+      (ISO format or relative like "-1h")
+    - details: "true" to return first_seen, last_seen and readings per sensor
+    """
     try:
-        sensors = influx_client.list_sensors()
-        return jsonify({"count": len(sensors), "sensors": sensors}), 200
+        try:
+            limit = int(request.args.get("limit", SENSORS_PAGE_SIZE))
+            if limit < 1:
+                raise ValueError("limit must be a positive integer")
+            seen_since = request.args.get("seen_since")
+            seen_since_ns = epoch_ns(parse_time(seen_since)) if seen_since else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        _seed_sensor_registry()
+        sensors = sensor_registry.list_sensors(
+            limit=limit + 1,
+            after=request.args.get("after"),
+            seen_since_ns=seen_since_ns,
+            prefix=request.args.get("prefix"),
+        )
+        next_after = None
+        if len(sensors) > limit:
+            sensors = sensors[:limit]
+            next_after = sensors[-1]["sensor_id"]
+
+        if request.args.get("details", "").lower() not in ("1", "true"):
+            sensors = [sensor["sensor_id"] for sensor in sensors]
+        return (
+            jsonify(
+                {"count": len(sensors), "sensors": sensors, "next_after": next_after}
+            ),
+            200,
+        )
     except Exception as e:
         logger.error(f"Error listing sensors: {e}")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
 
+@app.route("/alerts", methods=["GET"])
+def list_alerts():
+    """
+    Recent alerts raised by this API process, oldest first.
+
+    Query parameters:
+    - after: Only alerts with a larger id (the next_after of the previous call)
+    - limit: Maximum alerts to return (default: 100)
+    """
+    if not alert_engine:
+        return jsonify({"error": "Alerting is not enabled (ALERT_RULES_PATH)"}), 404
+    try:
+        after = int(request.args.get("after", 0))
+        limit = int(request.args.get("limit", 100))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "after and limit must be integers (limit >= 1)"}), 400
+
+    alerts = alert_engine.recent(after=after, limit=limit)
+    return (
+        jsonify(
+            {
+                "count": len(alerts),
+                "alerts": alerts,
+                "next_after": alerts[-1]["id"] if alerts else after,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/stream", methods=["GET"])
+def stream_measurements():
+    """
+    Push readings for a set of sensors as they are ingested (Server-Sent Events).
+
+    Query parameters:
+    - sensor_ids: Comma-separated list of sensor IDs (required)
+    - alerts: Also push the alerts raised for these sensors (default: true)
+
+    Events are "reading" (the accepted measurement), "alert" (as returned by
+    GET /alerts) and "dropped" ({"count": n} readings missed because the
+    client fell behind). Only readings accepted by this API process are
+    pushed.
+    """
+    try:
+        sensor_ids = _parse_sensor_ids()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    alerts = request.args.get("alerts", "true").lower() in ("1", "true")
+
+    try:
+        subscription = live_broker.subscribe(sensor_ids, alerts=alerts)
+    except TooManySubscribersError as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(int(LIVE_HEARTBEAT))
+        return response, 503
+    return sse_response(
+        subscription, LIVE_HEARTBEAT, live_broker.unsubscribe, encode=_live_event
+    )
+
+
+def _live_event(kind, payload):
+    """Format the epoch-nanosecond timestamp of a pushed reading like the reads do."""
+    if kind == "reading":
+        return {**payload, "timestamp": format_timestamp(payload["timestamp"])}
+    return payload
+
+
 @app.route("/measurements/<sensor_id>/aggregated", methods=["GET"])
 def get_aggregated_measurements(sensor_id):
     """
     Retrieve aggregated measurements for a specific sensor.
 
-    Automatically selects resolution based on time range:
-    - 1-minute windows for the most recent hour
-    - 5-minute windows for anything past that
+    Automatically selects the coarsest rollup tier (1m, 5m, 15m, 1h, 1d)
+    that still returns enough windows for the requested time range.
 
     Query parameters:
     - start: Start time (ISO format or relative like "-1h", default: "-7d")
     - end: End time (ISO format, optional)
-    - window: Override automatic window selection ("1m", "5m", "15m", "1h")
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    - format: "ndjson" to stream one JSON object per line, "csv" or "arrow"
+      for column-oriented output
+    - stream: "true" to stream the JSON body in chunks
+    - points: Return at most this many windows, chosen to keep the shape of
+      the series (JSON, csv and arrow only)
+    - downsample: "lttb" (default) or "minmax", how points= picks windows
     """
     try:
         start_time = request.args.get("start", "-7d")
         end_time = request.args.get("end")
-        window = request.args.get("window")
-
-        # Auto-select window based on time range if not specified
-        if not window:
-            # Parse relative time to determine appropriate window
-            if start_time.startswith("-"):
-                # Extract the time value
-                if "m" in start_time:  # minutes
-                    minutes = int(start_time.replace("-", "").replace("m", ""))
-                    window = "1m" if minutes <= 60 else "5m"
-                elif "h" in start_time:  # hours
-                    hours = int(start_time.replace("-", "").replace("h", ""))
-                    window = "1m" if hours <= 1 else "5m"
-                elif "d" in start_time:  # days
-                    window = "5m"
-                else:
-                    window = "5m"
-            else:
-                # Default to 5m for absolute timestamps
-                window = "5m"
 
-        measurements = influx_client.read_aggregated_measurements(
+        # Auto-select the rollup tier unless a window was requested
+        try:
+            window = _select_window(start_time, end_time)
+            downsampling = _downsampling()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response_format = request.args.get("format")
+        if response_format in COLUMNAR_FORMATS:
+            return _columnar_response(
+                response_format,
+                _downsampled_reader(
+                    partial(
+                        influx_client.read_aggregated_columns,
+                        sensor_id=sensor_id,
+                        start_time=start_time,
+                        end_time=end_time,
+                        window=window,
+                    ),
+                    downsampling,
+                ),
+                {"sensor_id": sensor_id, "window": window},
+            )
+
+        stream_mode = _stream_mode()
+        if stream_mode:
+            rows = itertools.chain(
+                _open_windows(sensor_id, window, end_time),
+                influx_client.iter_aggregated_measurements(
+                    sensor_id=sensor_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    window=window,
+                ),
+            )
+            return _streamed_response(
+                stream_mode,
+                {"sensor_id": sensor_id, "window": window},
+                "measurements",
+                rows,
+            )
+
+        measurements = _open_windows(
+            sensor_id, window, end_time
+        ) + influx_client.read_aggregated_measurements(
             sensor_id=sensor_id, start_time=start_time, end_time=end_time, window=window
         )
 
-        return (
-            jsonify(
-                {
-                    "sensor_id": sensor_id,
-                    "count": len(measurements),
-                    "window": window,
-                    "measurements": measurements,
-                }
-            ),
-            200,
-        )
+        body = {"sensor_id": sensor_id, "window": window}
+        if downsampling:
+            body["downsampled"] = _downsample_info(downsampling, len(measurements))
+            measurements = downsample_rows(measurements, *downsampling)
+        body.update(count=len(measurements), measurements=measurements)
+        return jsonify(body), 200
 
     except Exception as e:
         logger.error(f"Error retrieving aggregated measurements: {e}")
@@ -173,39 +1122,64 @@ def get_aggregated_measurements(sensor_id):
 @app.route("/measurements/<sensor_id>/statistics", methods=["GET"])
 def get_measurement_statistics(sensor_id):
     """
-    Retrieve detailed statistics (mean, min, max, count) for sensor measurements.
+    Retrieve detailed statistics (mean, min, max, count, stddev) for sensor measurements.
 
-    Automatically selects resolution based on time range:
-    - 1-minute windows for the most recent hour
-    - 5-minute windows for anything past that
+    Automatically selects the coarsest rollup tier (1m, 5m, 15m, 1h, 1d)
+    that still returns enough windows for the requested time range.
 
     Query parameters:
     - start: Start time (ISO format or relative like "-1h", default: "-7d")
     - end: End time (ISO format, optional)
-    - window: Override automatic window selection ("1m", "5m", "15m", "1h")
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    - format: "ndjson" to stream one JSON object per line, "csv" or "arrow"
+      for column-oriented output
+    - stream: "true" to stream the JSON body in chunks
     """
     try:
         start_time = request.args.get("start", "-7d")
         end_time = request.args.get("end")
-        window = request.args.get("window")
-
-        # Auto-select window based on time range if not specified
-        if not window:
-            if start_time.startswith("-"):
-                if "m" in start_time:
-                    minutes = int(start_time.replace("-", "").replace("m", ""))
-                    window = "1m" if minutes <= 60 else "5m"
-                elif "h" in start_time:
-                    hours = int(start_time.replace("-", "").replace("h", ""))
-                    window = "1m" if hours <= 1 else "5m"
-                elif "d" in start_time:
-                    window = "5m"
-                else:
-                    window = "5m"
-            else:
-                window = "5m"
 
-        statistics = influx_client.read_aggregated_statistics(
+        # Auto-select the rollup tier unless a window was requested
+        try:
+            window = _select_window(start_time, end_time)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response_format = request.args.get("format")
+        if response_format in COLUMNAR_FORMATS:
+            return _columnar_response(
+                response_format,
+                partial(
+                    influx_client.read_statistics_columns,
+                    sensor_id=sensor_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    window=window,
+                ),
+                {"sensor_id": sensor_id, "window": window},
+            )
+
+        stream_mode = _stream_mode()
+        if stream_mode:
+            rows = itertools.chain(
+                _open_windows(sensor_id, window, end_time, statistics=True),
+                influx_client.iter_aggregated_statistics(
+                    sensor_id=sensor_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    window=window,
+                ),
+            )
+            return _streamed_response(
+                stream_mode,
+                {"sensor_id": sensor_id, "window": window},
+                "statistics",
+                rows,
+            )
+
+        statistics = _open_windows(
+            sensor_id, window, end_time, statistics=True
+        ) + influx_client.read_aggregated_statistics(
             sensor_id=sensor_id, start_time=start_time, end_time=end_time, window=window
         )
 
@@ -226,7 +1200,56 @@ def get_measurement_statistics(sensor_id):
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
 
+@app.route("/measurements/<sensor_id>/percentiles", methods=["GET"])
+def get_percentiles(sensor_id):
+    """
+    Percentiles (e.g. p50/p95/p99) of a sensor's readings over any range.
+
+    Merges the quantile sketches stored with every rollup window, so the
+    cost depends on the number of sketch buckets rather than the number of
+    readings. Estimates are within RELATIVE_ACCURACY (1%) of the true
+    percentile value.
+
+    Query parameters:
+    - start: Start time (ISO format or relative like "-1h", default: "-7d")
+    - end: End time (ISO format, optional)
+    - window: Override automatic window selection ("1m", "5m", "15m", "1h", "1d")
+    - percentiles: Comma-separated percentiles (default: "50,95,99")
+    """
+    try:
+        try:
+            start_time, end_time, window, ranks = _percentile_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        sketches = influx_client.read_sketches(
+            sensor_ids=[sensor_id],
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+        )
+        return (
+            jsonify(
+                {
+                    "sensor_id": sensor_id,
+                    **_percentiles_body(sketches, [sensor_id], window, end_time, ranks),
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving percentiles: {e}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+
 if __name__ == "__main__":
+    # Development server; run `make serve` (gunicorn) in production
     logger.info("Starting Water Quality Monitoring API...")
     logger.info("API will be available at: http://localhost:8081")
-    app.run(host="0.0.0.0", port=8081, debug=True)
+    app.run(
+        host="0.0.0.0",
+        port=8081,
+        debug=os.getenv("API_DEBUG", "false").lower() in ("1", "true"),
+        threaded=True,
+    )
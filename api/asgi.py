@@ -0,0 +1,130 @@
+"""
+ASGI entry point for the API.
+Wraps the Flask app with asgiref's WSGI adapter so it can be served by an
+ASGI server (uvicorn). The JSON read endpoints are answered natively on the
+event loop by api/async_routes.py with AsyncInfluxDBClient, so waiting on
+InfluxDB does not hold a thread, and so are GET /stream subscriptions;
+everything else runs the synchronous Flask view on a pool of API_THREADS
+threads per worker.
+
+asgiref's adapter on its own runs every WSGI request on one shared thread
+per process (sync_to_async with thread_sensitive=True), which would
+serialize all ingest and other Flask requests of a worker. _WsgiToAsgi runs
+them on the worker's own pool instead.
+
+Usage:
+gunicorn -c api/gunicorn_conf.py    (with API_WORKER_MODEL=async)
+uvicorn api.asgi:application --port 8081
+Requirements:
+pip install asgiref uvicorn "influxdb-client[async]"
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+import api.app as api_app
+from api import async_routes
+from storage.async_influx_client import ASYNC_AVAILABLE, AsyncInfluxDBClient
+from utils.logger_config import setup_logging
+
+logger = setup_logging("api")
+
+# Serve the JSON reads on the event loop (needs the async InfluxDB extras)
+ASYNC_READS = os.getenv("API_ASYNC_READS", "true").lower() in ("1", "true")
+
+# Threads running synchronous Flask views, per worker
+WSGI_THREADS = int(os.getenv("API_THREADS", "8"))
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    """One WSGI request, run on the worker's thread pool."""
+
+    # The adapter's own run_wsgi_app, re-wrapped without thread sensitivity
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+        thread_sensitive=False,
+        executor=_wsgi_executor,
+    )
+
+
+class _WsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi whose requests run concurrently on _wsgi_executor."""
+
+    async def __call__(self, scope, receive, send):
+        await _WsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+_wsgi_application = _WsgiToAsgi(api_app.app)
+
+# This worker's async client, created on lifespan startup
+_async_client = None
+
+
+async def _startup():
+    global _async_client
+
+    if not ASYNC_READS:
+        return
+    if not ASYNC_AVAILABLE:
+        logger.warning("influxdb-client[async] is not installed; reads use Flask")
+        return
+    # Share the sync client's query cache so both paths reuse settled blocks,
+    # and its hot tail, which the Flask write path fills
+    _async_client = AsyncInfluxDBClient(
+        query_cache=api_app.influx_client.query_cache,
+        hot_tail=api_app.influx_client.hot_tail,
+    )
+    api_app.app.extensions["async_influx_client"] = _async_client
+
+
+async def _shutdown():
+    global _async_client
+
+    if _async_client:
+        await _async_client.close()
+        _async_client = None
+        api_app.app.extensions.pop("async_influx_client", None)
+    await asyncio.to_thread(api_app.shutdown_worker)
+
+
+async def application(scope, receive, send):
+    """
+    ASGI application: routes HTTP requests and handles lifespan events.
+
+    uvicorn re-raises the termination signal once it has stopped, so the
+    process never reaches atexit or gunicorn's worker_exit; pending writes
+    are flushed on lifespan shutdown instead.
+    """
+    if scope["type"] == "http" and async_routes.is_stream(scope):
+        await async_routes.stream(
+            scope, receive, send, async_routes.accept_encoding(scope)
+        )
+        return
+
+    if scope["type"] == "http" and _async_client:
+        route = async_routes.match(scope)
+        if route:
+            await async_routes.respond(
+                _async_client, send, *route, async_routes.accept_encoding(scope)
+            )
+            return
+
+    if scope["type"] != "lifespan":
+        await _wsgi_application(scope, receive, send)
+        return
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await _startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await _shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,375 @@
+"""
+Native asyncio handlers for the JSON read endpoints, used by api/asgi.py.
+Requests are answered on the event loop with AsyncInfluxDBClient instead of
+a thread-pool thread running the Flask view, so one worker can wait on
+hundreds of Flux queries at once. Responses match the Flask endpoints'
+bodies and status codes. Streaming (stream=true, format=...), downsampled
+reads (points=N) and every other route are still served by Flask.
+
+GET /stream is also served here (stream()): a live subscription waits on
+the event loop instead of holding a pool thread for the whole connection.
+"""
+
+import asyncio
+import json
+import re
+from urllib.parse import parse_qsl
+import api.app as api_app
+from api.compression import MIN_BYTES, StreamCompressor, compress, negotiate
+from api.responses import SSE_HEADERS, SSE_MIMETYPE, SseFormatter
+from operations.live_stream import TooManySubscribersError
+from utils.logger_config import setup_logging
+
+logger = setup_logging("api")
+
+# Parameters whose responses are built by the Flask streaming, columnar and
+# downsampling helpers
+FLASK_ONLY_PARAMS = ("format", "stream", "points")
+
+
+def _error(message, status, details=None):
+    body = {"error": message}
+    if details is not None:
+        body["details"] = details
+    return body, status
+
+
+def _with_open_windows(rows_by_sensor, window, end_time, statistics=False):
+    for sensor_id, rows in rows_by_sensor.items():
+        rows[:0] = api_app._open_windows(sensor_id, window, end_time, statistics)
+    return rows_by_sensor
+
+
+async def get_measurements(client, args, sensor_id):
+    """GET /measurements/<sensor_id>"""
+    try:
+        limit = int(args.get("limit", 100))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError:
+        return _error("Invalid limit parameter", 400)
+
+    try:
+        measurements, next_cursor = await client.read_measurements_page(
+            sensor_id=sensor_id,
+            start_time=args.get("start"),
+            end_time=args.get("end"),
+            limit=limit,
+            cursor=args.get("cursor"),
+        )
+    except ValueError as e:
+        return _error(str(e), 400)
+    return {
+        "sensor_id": sensor_id,
+        "count": len(measurements),
+        "measurements": measurements,
+        "next_cursor": next_cursor,
+    }, 200
+
+
+async def get_measurements_many(client, args):
+    """GET /measurements?sensor_ids=..."""
+    try:
+        sensor_ids = api_app._parse_sensor_ids(args)
+        limit = int(args.get("limit", 100))
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    measurements = await client.read_measurements_many(
+        sensor_ids=sensor_ids,
+        start_time=args.get("start"),
+        end_time=args.get("end"),
+        limit=limit,
+    )
+    return {
+        "sensor_ids": sensor_ids,
+        "count": sum(len(rows) for rows in measurements.values()),
+        "measurements": measurements,
+    }, 200
+
+
+async def _rollup_read(client, args, sensor_id, statistics):
+    """GET /measurements/<sensor_id>/aggregated and .../statistics"""
+    start_time = args.get("start", "-7d")
+    end_time = args.get("end")
+    try:
+        window = api_app._select_window(start_time, end_time, args)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    read = (
+        client.read_aggregated_statistics
+        if statistics
+        else client.read_aggregated_measurements
+    )
+    rows = api_app._open_windows(sensor_id, window, end_time, statistics) + (
+        await read(
+            sensor_id=sensor_id, start_time=start_time, end_time=end_time, window=window
+        )
+    )
+    key = "statistics" if statistics else "measurements"
+    return {
+        "sensor_id": sensor_id,
+        "count": len(rows),
+        "window": window,
+        key: rows,
+    }, 200
+
+
+async def _rollup_read_many(client, args, statistics):
+    """GET /measurements/aggregated and /measurements/statistics"""
+    start_time = args.get("start", "-7d")
+    end_time = args.get("end")
+    try:
+        sensor_ids = api_app._parse_sensor_ids(args)
+        window = api_app._select_window(start_time, end_time, args)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    read = (
+        client.read_aggregated_statistics_many
+        if statistics
+        else client.read_aggregated_measurements_many
+    )
+    rows = _with_open_windows(
+        await read(
+            sensor_ids=sensor_ids,
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+        ),
+        window,
+        end_time,
+        statistics,
+    )
+    key = "statistics" if statistics else "measurements"
+    return {
+        "sensor_ids": sensor_ids,
+        "count": sum(len(sensor_rows) for sensor_rows in rows.values()),
+        "window": window,
+        key: rows,
+    }, 200
+
+
+async def get_aggregated(client, args, sensor_id):
+    return await _rollup_read(client, args, sensor_id, statistics=False)
+
+
+async def get_statistics(client, args, sensor_id):
+    return await _rollup_read(client, args, sensor_id, statistics=True)
+
+
+async def get_aggregated_many(client, args):
+    return await _rollup_read_many(client, args, statistics=False)
+
+
+async def get_statistics_many(client, args):
+    return await _rollup_read_many(client, args, statistics=True)
+
+
+async def get_percentiles(client, args, sensor_id):
+    """GET /measurements/<sensor_id>/percentiles"""
+    return await _percentiles_read(client, args, [sensor_id], {"sensor_id": sensor_id})
+
+
+async def get_percentiles_many(client, args):
+    """GET /measurements/percentiles?sensor_ids=..."""
+    try:
+        sensor_ids = api_app._parse_sensor_ids(args)
+    except ValueError as e:
+        return _error(str(e), 400)
+    return await _percentiles_read(client, args, sensor_ids, {"sensor_ids": sensor_ids})
+
+
+async def _percentiles_read(client, args, sensor_ids, body):
+    try:
+        start_time, end_time, window, ranks = api_app._percentile_args(args)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    sketches = await client.read_sketches(
+        sensor_ids=sensor_ids, start_time=start_time, end_time=end_time, window=window
+    )
+    body.update(
+        api_app._percentiles_body(sketches, sensor_ids, window, end_time, ranks)
+    )
+    return body, 200
+
+
+# (path pattern, handler); the fixed paths come before /measurements/<sensor_id>
+ROUTES = [
+    (re.compile(r"/measurements"), get_measurements_many),
+    (re.compile(r"/measurements/aggregated"), get_aggregated_many),
+    (re.compile(r"/measurements/statistics"), get_statistics_many),
+    (re.compile(r"/measurements/percentiles"), get_percentiles_many),
+    (re.compile(r"/measurements/(?P<sensor_id>[^/]+)"), get_measurements),
+    (re.compile(r"/measurements/(?P<sensor_id>[^/]+)/aggregated"), get_aggregated),
+    (re.compile(r"/measurements/(?P<sensor_id>[^/]+)/statistics"), get_statistics),
+    (re.compile(r"/measurements/(?P<sensor_id>[^/]+)/percentiles"), get_percentiles),
+]
+
+
+def _query_args(scope):
+    args = {}
+    for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1")):
+        args.setdefault(key, value)
+    return args
+
+
+def match(scope):
+    """
+    Find the async handler for an HTTP request scope.
+
+    Returns:
+        tuple: (handler, path parameters, query parameters), or None if the
+            request should be served by Flask
+    """
+    if scope["method"] != "GET":
+        return None
+
+    args = _query_args(scope)
+    if any(param in args for param in FLASK_ONLY_PARAMS):
+        return None
+
+    for pattern, handler in ROUTES:
+        path_match = pattern.fullmatch(scope["path"])
+        if path_match:
+            return handler, path_match.groupdict(), args
+    return None
+
+
+def accept_encoding(scope):
+    """Response encoding negotiated from a request scope's Accept-Encoding."""
+    for name, value in scope.get("headers", ()):
+        if name == b"accept-encoding":
+            return negotiate(value.decode("latin-1"))
+    return None
+
+
+async def respond(client, send, handler, path_params, args, encoding=None):
+    """
+    Run a handler and send its JSON body the way Flask's jsonify would.
+
+    Bodies of at least API_COMPRESS_MIN_BYTES are compressed with `encoding`
+    (see accept_encoding()) off the event loop.
+    """
+    try:
+        body, status = await handler(client, args, **path_params)
+    except Exception as e:
+        logger.error(f"Error in async {handler.__name__}: {e}")
+        body, status = _error("Internal server error", 500, str(e))
+
+    payload = (json.dumps(body, sort_keys=True, separators=(",", ":")) + "\n").encode()
+    headers = [(b"content-type", b"application/json"), (b"vary", b"Accept-Encoding")]
+    if encoding and len(payload) >= MIN_BYTES:
+        payload = await asyncio.to_thread(compress, payload, encoding)
+        headers.append((b"content-encoding", encoding.encode()))
+    headers.append((b"content-length", str(len(payload)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+def is_stream(scope):
+    """Whether a request scope is a GET /stream subscription."""
+    return scope["method"] == "GET" and scope["path"] == "/stream"
+
+
+def _waker(loop, wake):
+    """Thread-safe callback setting an asyncio.Event on `loop`."""
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            # Loop already closed (worker shutting down)
+            pass
+
+    return notify
+
+
+async def _send_json(send, body, status, extra_headers=()):
+    payload = (json.dumps(body, sort_keys=True, separators=(",", ":")) + "\n").encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(payload)).encode()),
+        *extra_headers,
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def stream(scope, receive, send, encoding=None):
+    """
+    GET /stream on the event loop, with the same events as the Flask view.
+
+    Publishers (ingest threads) wake the handler through the subscription's
+    notify hook; a keep-alive comment is sent after LIVE_HEARTBEAT seconds
+    without events, and the subscription ends when the client disconnects.
+    """
+    args = _query_args(scope)
+    try:
+        sensor_ids = api_app._parse_sensor_ids(args)
+    except ValueError as e:
+        await _send_json(send, {"error": str(e)}, 400)
+        return
+    alerts = args.get("alerts", "true").lower() in ("1", "true")
+
+    broker = api_app.live_broker
+    heartbeat = api_app.LIVE_HEARTBEAT
+    wake = asyncio.Event()
+    try:
+        subscription = broker.subscribe(
+            sensor_ids,
+            alerts=alerts,
+            notify=_waker(asyncio.get_running_loop(), wake),
+        )
+    except TooManySubscribersError as e:
+        retry_after = (b"retry-after", str(int(heartbeat)).encode())
+        await _send_json(send, {"error": str(e)}, 503, (retry_after,))
+        return
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        subscription.close()
+
+    headers = [(b"content-type", SSE_MIMETYPE.encode()), (b"vary", b"Accept-Encoding")]
+    headers += [(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()]
+    compressor = None
+    if encoding:
+        compressor = StreamCompressor(encoding)
+        headers.append((b"content-encoding", encoding.encode()))
+
+    async def write(text):
+        body = compressor.compress(text, flush=True) if compressor else text.encode()
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    formatter = SseFormatter(subscription, heartbeat, encode=api_app._live_event)
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await write(formatter.opening())
+        while not subscription.closed:
+            event = subscription.get_nowait()
+            if event is None:
+                wake.clear()
+                # Re-check: an event may have arrived before clear()
+                event = subscription.get_nowait()
+            if event is None and not subscription.closed:
+                try:
+                    await asyncio.wait_for(wake.wait(), heartbeat)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            text = formatter.format(event)
+            if text:
+                await write(text)
+        await send(
+            {
+                "type": "http.response.body",
+                "body": compressor.finish() if compressor else b"",
+            }
+        )
+    finally:
+        watcher.cancel()
+        broker.unsubscribe(subscription)
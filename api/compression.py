@@ -0,0 +1,226 @@
+"""
+Compressed request and response bodies.
+Sensors on cellular links upload batches and dashboards download large JSON
+arrays, so bandwidth rather than CPU sets the latency for remote sites:
+
+- Ingest bodies sent with Content-Encoding gzip, deflate or zstd are
+  decompressed (up to API_MAX_DECOMPRESSED_MB) before they are parsed
+- Responses are compressed with the best encoding the client accepts
+  (zstd, then gzip) once they are at least API_COMPRESS_MIN_BYTES long.
+  Streamed responses are compressed as they are written: the compressor is
+  flushed every STREAM_FLUSH_BYTES of body, and after every event of a
+  Server-Sent Events stream, so rows and events are not held back
+
+zstd needs the optional zstandard package (pip install zstandard); without
+it zstd bodies are refused with 415 and responses use gzip.
+"""
+
+import os
+import zlib
+from werkzeug.http import parse_accept_header
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_AVAILABLE = zstandard is not None
+
+# Responses smaller than this are sent uncompressed
+MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
+
+# Compression levels: fast settings, since most bodies are JSON that
+# compresses well already at low levels
+GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("API_ZSTD_LEVEL", "3"))
+
+# Largest request body accepted after decompression
+MAX_DECOMPRESSED_BYTES = int(
+    float(os.getenv("API_MAX_DECOMPRESSED_MB", "64")) * 1024 * 1024
+)
+
+# Uncompressed bytes of a streamed response after which the compressor is
+# flushed to the client
+STREAM_FLUSH_BYTES = 64 * 1024
+
+# Response encodings in order of preference
+ENCODINGS = ("zstd", "gzip") if ZSTD_AVAILABLE else ("gzip",)
+
+# Content types sent as they are (already compressed)
+_INCOMPRESSIBLE = ("image/", "video/", "application/zip", "application/gzip")
+
+
+class RequestBodyError(Exception):
+    """Raised when a request body cannot be decoded; carries the HTTP status."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _gzip_compressobj():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def decode_body(data, content_encoding):
+    """
+    Decompress a request body according to its Content-Encoding.
+
+    Args:
+        data (bytes): The raw body
+        content_encoding (str): Header value (None or "identity" for none)
+
+    Returns:
+        bytes: The decoded body
+
+    Raises:
+        RequestBodyError: 415 for an unsupported encoding, 413 if the
+            decoded body exceeds MAX_DECOMPRESSED_BYTES, 400 if it is corrupt
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return data
+    too_large = RequestBodyError(
+        f"Decompressed body exceeds {MAX_DECOMPRESSED_BYTES} bytes", 413
+    )
+
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        # A gzip body may be several concatenated members (RFC 1952); each
+        # one is decoded in turn against the same size limit
+        chunks, size, remaining = [], 0, data
+        while True:
+            # 32 + MAX_WBITS detects gzip and zlib headers
+            decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+            try:
+                # max_length 0 would mean unlimited, so ask for one byte more
+                # than the remaining budget
+                chunk = decompressor.decompress(
+                    remaining, MAX_DECOMPRESSED_BYTES - size + 1
+                )
+                if len(chunk) + size > MAX_DECOMPRESSED_BYTES:
+                    raise too_large
+                chunk += decompressor.flush()
+            except zlib.error as e:
+                raise RequestBodyError(f"Invalid {encoding} body: {e}", 400) from None
+            if not decompressor.eof:
+                raise RequestBodyError(f"Truncated {encoding} body", 400)
+            chunks.append(chunk)
+            size += len(chunk)
+            remaining = decompressor.unused_data
+            if not remaining:
+                return b"".join(chunks)
+            if encoding == "deflate":
+                raise RequestBodyError("Trailing data after deflate body", 400)
+
+    if encoding == "zstd" and ZSTD_AVAILABLE:
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(data)
+            body = reader.read(MAX_DECOMPRESSED_BYTES + 1)
+        except zstandard.ZstdError as e:
+            raise RequestBodyError(f"Invalid zstd body: {e}", 400) from None
+        if len(body) > MAX_DECOMPRESSED_BYTES:
+            raise too_large
+        return body
+
+    raise RequestBodyError(f"Unsupported Content-Encoding: {encoding}", 415)
+
+
+def negotiate(accept_encoding):
+    """
+    Pick the response encoding from an Accept-Encoding header value.
+
+    Returns:
+        str: "zstd" or "gzip", or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for value, quality in parse_accept_header(accept_encoding):
+        qualities.setdefault(value.lower(), quality)
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(content_type):
+    """Whether a body of this Content-Type is worth compressing."""
+    return not (content_type or "").startswith(_INCOMPRESSIBLE)
+
+
+def compress(data, encoding):
+    """Compress a whole body with a negotiated encoding."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    compressor = _gzip_compressobj()
+    return compressor.compress(data) + compressor.flush()
+
+
+class StreamCompressor:
+    """Incremental compressor for one streamed body."""
+
+    def __init__(self, encoding):
+        """
+        Args:
+            encoding (str): "zstd" or "gzip"
+        """
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._sync_flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            self._finish = zstandard.COMPRESSOBJ_FLUSH_FINISH
+        else:
+            self._compressor = _gzip_compressobj()
+            self._sync_flush, self._finish = zlib.Z_SYNC_FLUSH, zlib.Z_FINISH
+
+    def compress(self, chunk, flush=False):
+        """
+        Compress a chunk (str or bytes); with flush, also emit everything
+        buffered so the client can decode it now.
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = self._compressor.compress(chunk)
+        if flush:
+            data += self._compressor.flush(self._sync_flush)
+        return data
+
+    def finish(self):
+        """Return the end of the compressed body."""
+        return self._compressor.flush(self._finish)
+
+
+def compress_stream(chunks, encoding, flush_every_chunk=False):
+    """
+    Compress a streamed body chunk by chunk.
+
+    Output is flushed every STREAM_FLUSH_BYTES of input, or after every
+    chunk with flush_every_chunk (event streams), so the client can decode
+    what has been sent so far. Closing the returned generator closes
+    `chunks`, which lets streaming views run their cleanup.
+
+    Args:
+        chunks: Iterable of str or bytes
+        encoding (str): "zstd" or "gzip"
+        flush_every_chunk (bool): Flush after every chunk
+
+    Yields:
+        bytes: Compressed data
+    """
+    compressor = StreamCompressor(encoding)
+    pending = 0
+    try:
+        for chunk in chunks:
+            pending += len(chunk)
+            flush = flush_every_chunk or pending >= STREAM_FLUSH_BYTES
+            data = compressor.compress(chunk, flush)
+            if flush:
+                pending = 0
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
@@ -0,0 +1,91 @@
+"""
+Gunicorn configuration for serving the API in production.
+
+The worker model is chosen with API_WORKER_MODEL:
+- "thread" (default): a few processes, each with a pool of threads (gthread).
+  Reads mostly wait on InfluxDB, so threads give most of the concurrency
+  at a fraction of the memory of extra processes.
+- "process": pre-forked single-threaded workers (sync), for CPU-heavy loads.
+- "async": uvicorn workers serving the ASGI adapter in api/asgi.py.
+
+Usage:
+gunicorn -c api/gunicorn_conf.py
+API_WORKER_MODEL=process API_WORKERS=8 gunicorn -c api/gunicorn_conf.py
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+
+# Loaded by gunicorn before the project is importable; log through its logger
+logger = logging.getLogger("gunicorn.error")
+
+WORKER_MODEL = os.getenv("API_WORKER_MODEL", "thread")
+
+_CPUS = multiprocessing.cpu_count()
+
+# Worker class, application and default process count per worker model
+_MODELS = {
+    "thread": ("gthread", "api.app:app", _CPUS),
+    "process": ("sync", "api.app:app", 2 * _CPUS + 1),
+    "async": ("uvicorn.workers.UvicornWorker", "api.asgi:application", _CPUS),
+}
+if WORKER_MODEL not in _MODELS:
+    raise ValueError(
+        f"API_WORKER_MODEL must be one of {', '.join(_MODELS)}, got {WORKER_MODEL!r}"
+    )
+worker_class, wsgi_app, _default_workers = _MODELS[WORKER_MODEL]
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8081')}"
+workers = int(os.getenv("API_WORKERS", str(_default_workers)))
+threads = int(os.getenv("API_THREADS", "8")) if WORKER_MODEL == "thread" else 1
+
+# Open inline windows live in one process's memory; several workers would
+# each emit partial rollups for the same windows
+if os.getenv("AGGREGATION_MODE", "tasks") == "inline" and workers > 1:
+    logger.warning("AGGREGATION_MODE=inline needs a single worker; using 1")
+    workers = 1
+
+# The hot tail only answers reads correctly if it saw every write
+if int(os.getenv("HOT_TAIL_READINGS", "0")) > 0 and workers > 1:
+    logger.warning("HOT_TAIL_READINGS needs a single worker; using 1")
+    workers = 1
+
+# Importing the app once in the master shares its memory between workers;
+# post_fork then gives every worker its own client and threads
+preload_app = os.getenv("API_PRELOAD", "false").lower() in ("1", "true")
+
+# Recycle workers periodically to bound memory growth (0 disables)
+max_requests = int(os.getenv("API_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+keepalive = int(os.getenv("API_KEEPALIVE", "5"))
+timeout = int(os.getenv("API_TIMEOUT", "60"))
+
+# Seconds a worker gets after SIGTERM to finish requests and flush writes
+graceful_timeout = int(os.getenv("API_GRACEFUL_TIMEOUT", "30"))
+
+accesslog = os.getenv("API_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    server.log.info(
+        f"API serving on {bind}: {workers} {WORKER_MODEL} worker(s)"
+        + (f" x {threads} threads" if threads > 1 else "")
+    )
+
+
+def post_fork(server, worker):
+    """Replace the state inherited from a preloading master."""
+    app_module = sys.modules.get("api.app")
+    if app_module:
+        app_module.init_worker()
+
+
+def worker_exit(server, worker):
+    """Flush buffered writes, open windows and late ranges before exiting."""
+    app_module = sys.modules.get("api.app")
+    if app_module:
+        app_module.shutdown_worker()
@@ -0,0 +1,177 @@
+"""
+Validation and normalization of ingested measurements.
+Every reading posted to the API goes through normalize_measurement() once,
+before anything else sees it:
+
+- Required fields and types are checked against a field table built at
+  import time, with exact type tests instead of per-field isinstance chains
+- Temperature and conductivity must be finite and within plausible ranges
+  (INGEST_TEMPERATURE_RANGE, INGEST_CONDUCTIVITY_RANGE)
+- The timestamp (RFC3339/ISO-8601 string or integer epoch nanoseconds) is
+  parsed once into epoch nanoseconds, and rejected if it lies more than
+  INGEST_MAX_FUTURE_SKEW_SECONDS ahead of the server clock
+
+Bad readings are rejected with a 400 (or per item in a batch) instead of
+failing later in the InfluxDB write. The normalized measurement carries an
+integer timestamp, so the writer, watermarks, registry, aggregator and
+alert engine no longer parse the string again.
+
+Bodies are decoded with orjson when it is installed (pip install orjson),
+otherwise with the standard json module.
+"""
+
+import json
+import math
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from utils.windows import NS_PER_SECOND
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+REQUIRED_FIELDS = ("sensor_id", "timestamp", "temperature", "conductivity")
+
+JSON_PARSER = "orjson" if orjson else "json"
+
+
+def _value_range(name, default):
+    low, high = (float(part) for part in os.getenv(name, default).split(","))
+    return low, high
+
+
+# Plausible (low, high) of every numeric field; readings outside are rejected
+FIELD_RANGES = {
+    "temperature": _value_range("INGEST_TEMPERATURE_RANGE", "-50,150"),
+    "conductivity": _value_range("INGEST_CONDUCTIVITY_RANGE", "0,1000000"),
+}
+
+# How far ahead of the server clock a timestamp may be
+MAX_FUTURE_SKEW_NS = int(
+    float(os.getenv("INGEST_MAX_FUTURE_SKEW_SECONDS", "300")) * NS_PER_SECOND
+)
+
+# (field, low, high) checked for every reading, in order
+_NUMBER_CHECKS = tuple((field, *FIELD_RANGES[field]) for field in FIELD_RANGES)
+_NUMBER_TYPES = (int, float)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Fraction of the seconds in the extended (10:30:00.5) and basic (T103000.5)
+# time layouts
+_FRACTION = re.compile(r"(?:(?<=\d\d:\d\d:\d\d)|(?<=[Tt ]\d{6}))[.,](\d+)")
+
+
+def loads(data):
+    """
+    Decode a JSON document (bytes or str).
+
+    Raises:
+        ValueError: If it is not valid JSON
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_timestamp(value):
+    """
+    Convert a posted timestamp to integer nanoseconds since the epoch.
+
+    Strings are ISO-8601 (a missing offset means UTC) and keep up to
+    nanosecond precision; integers are taken as epoch nanoseconds.
+
+    Raises:
+        ValueError: If the value is not a valid timestamp
+    """
+    if type(value) is int:
+        if value < 0:
+            raise ValueError("timestamp must not be before 1970")
+        return value
+    if type(value) is not str:
+        raise ValueError("timestamp must be an ISO-8601 string or epoch nanoseconds")
+
+    text = value.strip()
+    fraction_ns = 0
+    match = _FRACTION.search(text)
+    if match:
+        digits = match.group(1)
+        fraction_ns = int(digits[:9].ljust(9, "0"))
+        text = text[: match.start()] + text[match.end() :]
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value!r}") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    delta = parsed - _EPOCH
+    if delta.days < 0:
+        raise ValueError("timestamp must not be before 1970")
+    # delta.microseconds is 0 unless fromisoformat() found a fraction the
+    # search above did not
+    return (
+        (delta.days * 86400 + delta.seconds) * NS_PER_SECOND
+        + delta.microseconds * 1000
+        + fraction_ns
+    )
+
+
+def format_timestamp(time_ns):
+    """Format epoch nanoseconds like the read endpoints do (microsecond ISO-8601)."""
+    return (_EPOCH + timedelta(microseconds=time_ns // 1000)).isoformat()
+
+
+def missing_fields(item):
+    """Return the required fields absent from a measurement object."""
+    return [field for field in REQUIRED_FIELDS if field not in item]
+
+
+def normalize_measurement(item, now_ns):
+    """
+    Validate a posted measurement and return its normalized form.
+
+    Args:
+        item: Decoded JSON value of one measurement
+        now_ns (int): Current time in epoch nanoseconds (for the skew check)
+
+    Returns:
+        tuple: (measurement, None) with sensor_id (str), timestamp (int epoch
+            ns), temperature and conductivity (float), or (None, error
+            message) if the item is rejected
+    """
+    if type(item) is not dict:
+        return None, "measurement must be a JSON object"
+    missing = missing_fields(item)
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    sensor_id = item["sensor_id"]
+    if type(sensor_id) is not str or not sensor_id.strip():
+        return None, "sensor_id must be a non-empty string"
+    if sensor_id.endswith("\\"):
+        # Line protocol cannot store a tag value ending in a backslash as is
+        return None, "sensor_id must not end with a backslash"
+
+    measurement = {"sensor_id": sensor_id}
+    try:
+        time_ns = parse_timestamp(item["timestamp"])
+    except ValueError as e:
+        return None, str(e)
+    if time_ns > now_ns + MAX_FUTURE_SKEW_NS:
+        return None, "timestamp is too far in the future"
+    measurement["timestamp"] = time_ns
+
+    for field, low, high in _NUMBER_CHECKS:
+        value = item[field]
+        if type(value) not in _NUMBER_TYPES:
+            return None, f"{field} must be a number"
+        if type(value) is float and not math.isfinite(value):
+            return None, f"{field} must be finite"
+        if not low <= value <= high:
+            return None, f"{field} must be between {low:g} and {high:g}"
+        measurement[field] = float(value)
+    return measurement, None
@@ -0,0 +1,253 @@
+"""
+Streaming and columnar response helpers for the read endpoints.
+Rows are serialized and sent as they come off the query stream instead of
+being collected into a list and passed to jsonify, and column-oriented
+results are written as CSV or Apache Arrow without per-row dicts. Live
+subscriptions are sent as Server-Sent Events.
+"""
+
+import itertools
+import json
+from flask import Response, stream_with_context
+from utils.logger_config import setup_logging
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+logger = setup_logging("api")
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+SSE_MIMETYPE = "text/event-stream"
+ARROW_AVAILABLE = pyarrow is not None
+
+# Rows formatted per CSV chunk written to the client
+CSV_CHUNK_ROWS = 8192
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def prime(rows):
+    """
+    Start a row generator before the response headers are sent.
+
+    Pulling the first row runs the query, so connection or Flux errors are
+    raised here (and can become a 500) rather than half-way through a 200.
+    """
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return iter(())
+    return itertools.chain((first,), rows)
+
+
+def ndjson_response(rows):
+    """
+    Stream rows as newline-delimited JSON, one object per line.
+
+    If the query fails mid-stream, a final {"error": ...} line is written
+    since the status code has already been sent.
+    """
+    rows = prime(rows)
+
+    def generate():
+        try:
+            for row in rows:
+                yield _dumps(row) + "\n"
+        except Exception as e:
+            logger.error(f"Error while streaming rows: {e}")
+            yield _dumps({"error": "Stream interrupted", "details": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def json_stream_response(envelope, key, rows):
+    """
+    Stream a JSON object whose `key` member is an array of rows.
+
+    The body matches the buffered endpoints ({**envelope, key: [...],
+    "count": n}); `count` is written last because it is only known once
+    the stream is exhausted.
+    """
+    rows = prime(rows)
+    head = _dumps(envelope)[:-1]
+    head += "," if envelope else ""
+    head += _dumps(key) + ":["
+
+    def generate():
+        count = 0
+        yield head
+        try:
+            for row in rows:
+                yield ("," if count else "") + _dumps(row)
+                count += 1
+        except Exception as e:
+            logger.error(f"Error while streaming rows: {e}")
+            yield '],"error":' + _dumps(str(e)) + ',"count":' + str(count) + "}"
+            return
+        yield '],"count":' + str(count) + "}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def _csv_cell(value):
+    """Format one CSV cell; NaN (a null in the query result) becomes empty."""
+    if value != value:
+        return ""
+    return repr(value)
+
+
+def csv_response(columns):
+    """
+    Stream column arrays as CSV with a header row.
+
+    Args:
+        columns (dict): Column name -> NumPy array, "timestamp" first, as
+            returned by the client's read_*_columns methods
+    """
+    names = list(columns)
+    timestamps = columns["timestamp"]
+    value_names = [name for name in names if name != "timestamp"]
+
+    def generate():
+        yield ",".join(names) + "\n"
+        for start in range(0, len(timestamps), CSV_CHUNK_ROWS):
+            stop = start + CSV_CHUNK_ROWS
+            chunk_columns = [timestamps[start:stop].tolist()] + [
+                [_csv_cell(value) for value in columns[name][start:stop].tolist()]
+                for name in value_names
+            ]
+            yield "".join(
+                str(row[0]) + "," + ",".join(row[1:]) + "\n"
+                for row in zip(*chunk_columns)
+            )
+
+    return Response(generate(), mimetype="text/csv")
+
+
+def arrow_response(columns, metadata=None):
+    """
+    Serialize column arrays as an Apache Arrow IPC stream.
+
+    Timestamps are int64 epoch nanoseconds; NaN values become Arrow nulls.
+    Requires the optional pyarrow package (check ARROW_AVAILABLE first).
+
+    Args:
+        columns (dict): Column name -> NumPy array
+        metadata (dict): String key/values stored in the schema metadata
+    """
+    table = pyarrow.table(
+        {
+            name: pyarrow.array(values, from_pandas=True)
+            for name, values in columns.items()
+        }
+    )
+    if metadata:
+        table = table.replace_schema_metadata(
+            {key: str(value) for key, value in metadata.items()}
+        )
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE)
+
+
+def _sse_event(kind, data):
+    return f"event: {kind}\ndata: {_dumps(data)}\n\n"
+
+
+# Headers of an event stream; X-Accel-Buffering tells nginx-style proxies
+# not to buffer it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class SseFormatter:
+    """
+    Turns the events of a live subscription into Server-Sent Events text.
+
+    Each reading or alert is one event ("reading"/"alert") with a JSON
+    payload. When readings were dropped because the client fell behind, a
+    "dropped" event with the number missed precedes the next one. Shared by
+    the Flask view (sse_response()) and the event-loop handler in
+    api/async_routes.py.
+    """
+
+    def __init__(self, subscription, heartbeat, encode=None):
+        """
+        Args:
+            subscription: operations.live_stream.Subscription being drained
+            heartbeat (float): Seconds between keep-alive comments
+            encode (callable): Maps (kind, payload) to the data sent (optional)
+        """
+        self.subscription = subscription
+        self.heartbeat = heartbeat
+        self.encode = encode
+        self._reported = 0
+
+    def opening(self):
+        """Text sent first: the reconnect delay and a comment."""
+        return f"retry: {int(self.heartbeat * 1000)}\n: subscribed\n\n"
+
+    def format(self, event):
+        """
+        Format the next event taken from the subscription.
+
+        Args:
+            event: (kind, payload), or None if nothing arrived within the
+                heartbeat (or the subscription was closed)
+
+        Returns:
+            str: Text to send, a keep-alive comment for None, or "" once the
+                subscription is closed
+        """
+        subscription = self.subscription
+        text = ""
+        if subscription.dropped > self._reported:
+            missed = subscription.dropped - self._reported
+            self._reported += missed
+            text = _sse_event("dropped", {"count": missed})
+        if event is None:
+            if not subscription.closed:
+                text += ": keep-alive\n\n"
+            return text
+        kind, payload = event
+        data = self.encode(kind, payload) if self.encode else payload
+        return text + _sse_event(kind, data)
+
+
+def sse_response(subscription, heartbeat, on_close, encode=None):
+    """
+    Stream a live subscription as Server-Sent Events (see SseFormatter).
+
+    A comment line is written every `heartbeat` seconds without events,
+    which keeps proxies from closing the connection and lets the server
+    notice a client that went away.
+
+    Args:
+        subscription: operations.live_stream.Subscription to drain
+        heartbeat (float): Seconds between keep-alive comments
+        on_close (callable): Called with the subscription when the stream ends
+        encode (callable): Maps (kind, payload) to the data sent (optional)
+    """
+    formatter = SseFormatter(subscription, heartbeat, encode)
+
+    def generate():
+        try:
+            yield formatter.opening()
+            while not subscription.closed:
+                text = formatter.format(subscription.get(timeout=heartbeat))
+                if text:
+                    yield text
+        finally:
+            on_close(subscription)
+
+    response = Response(generate(), mimetype=SSE_MIMETYPE)
+    response.headers.update(SSE_HEADERS)
+    return response
@@ -0,0 +1,401 @@
+"""
+In-memory stand-in for the InfluxDB 2.x HTTP API, for benchmarks.
+
+Implements just enough of /api/v2/write and /api/v2/query for the queries
+built by storage/influx_client.py: points are kept per series in memory and
+Flux is interpreted by pattern-matching the filters, range, pivot, sort,
+limit and sketch group/sum the client uses. Anything else (tasks, to(), arbitrary Flux) returns
+400. Results are written as annotated CSV or, for the CSV dialect without
+annotations used by the columnar reads, as plain CSV.
+"""
+
+import bisect
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from utils.windows import NS_PER_SECOND, epoch_ns
+
+_PRECISION_NS = {"ns": 1, "us": 1000, "ms": 1_000_000, "s": NS_PER_SECOND}
+
+_MEASUREMENT_RE = re.compile(r'r(?:\["_measurement"\]|\._measurement) == "([^"]+)"')
+_SENSOR_RE = re.compile(r'r(?:\["sensor_id"\]|\.sensor_id) == "([^"]+)"')
+_FIELD_RE = re.compile(r'r(?:\["_field"\]|\._field) == "([^"]+)"')
+_STAT_RE = re.compile(r'r(?:\["stat_type"\]|\.stat_type) == "([^"]+)"')
+_RANGE_RE = re.compile(r"range\(start: ([^,)]+)(?:, stop: ([^)]+))?\)")
+_COLUMN_KEY_RE = re.compile(r"columnKey: \[([^\]]*)\]")
+_TAG_VALUES_START_RE = re.compile(r"start: ([^,)\s]+)")
+_LIMIT_RE = re.compile(r"limit\(n: (\d+)\)")
+_PARAM_RE = re.compile(r"\b(p_\w+)\b")
+_DURATION_PART_RE = re.compile(r"(\d+)(ns|us|ms|s|m|h|d|w)")
+_DURATION_NS = {
+    "ns": 1,
+    "us": 1000,
+    "ms": 1_000_000,
+    "s": NS_PER_SECOND,
+    "m": 60 * NS_PER_SECOND,
+    "h": 3600 * NS_PER_SECOND,
+    "d": 86400 * NS_PER_SECOND,
+    "w": 604800 * NS_PER_SECOND,
+}
+
+
+def _format_time(ns):
+    """Format epoch nanoseconds as RFC3339 with nanosecond precision."""
+    seconds, fraction = divmod(ns, NS_PER_SECOND)
+    text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+    if fraction:
+        text += "." + f"{fraction:09d}".rstrip("0")
+    return text + "Z"
+
+
+def _parse_line(line, precision_ns):
+    """Parse one line-protocol line into (measurement, tags, fields, time_ns)."""
+    head, field_text, *timestamp = line.split(" ")
+    measurement, *tag_pairs = head.split(",")
+    tags = dict(pair.split("=", 1) for pair in tag_pairs)
+    fields = {}
+    for pair in field_text.split(","):
+        key, value = pair.split("=", 1)
+        fields[key] = float(value.rstrip("i"))
+    time_ns = int(timestamp[0]) * precision_ns if timestamp else time.time_ns()
+    return measurement, tags, fields, time_ns
+
+
+def _literal(value):
+    """Render an extern AST expression as Flux literal text."""
+    if value["type"] == "StringLiteral":
+        return json.dumps(value["value"])
+    if value["type"] == "DurationLiteral":
+        return "".join(f"{d['magnitude']}{d['unit']}" for d in value["values"])
+    if value["type"] == "UnaryExpression":
+        return value["operator"] + _literal(value["argument"])
+    if value["type"] == "ArrayExpression":
+        return "[" + ", ".join(_literal(v) for v in value["elements"]) + "]"
+    if value["type"] == "BooleanLiteral":
+        return str(value["value"]).lower()
+    return str(value["value"])
+
+
+def _extern_params(extern):
+    """Map the option statements of a query's extern AST to Flux literal text."""
+    params = {}
+    for statement in (extern or {}).get("body", []):
+        assignment = statement.get("assignment", {})
+        params[assignment["id"]["name"]] = _literal(assignment["init"])
+    return params
+
+
+class _Series:
+    """Points of one series, kept sorted by time."""
+
+    def __init__(self):
+        self.points = {}
+        self.times = []
+        self.dirty = False
+
+    def add(self, time_ns, fields):
+        if time_ns not in self.points:
+            self.dirty = True
+            self.points[time_ns] = {}
+        self.points[time_ns].update(fields)
+
+    def between(self, start_ns, stop_ns):
+        """Return the sorted timestamps in [start_ns, stop_ns)."""
+        if self.dirty:
+            self.times = sorted(self.points)
+            self.dirty = False
+        lo = bisect.bisect_left(self.times, start_ns)
+        hi = bisect.bisect_left(self.times, stop_ns)
+        return self.times[lo:hi]
+
+
+class FakeInfluxDB:
+    """
+    In-memory point store plus the Flux subset used by the storage client.
+
+    Series are keyed by (measurement, sensor_id, stat_type, bucket);
+    stat_type is None for raw measurements and sketches, bucket is only set
+    for sketches.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+        self.stats = {"writes": 0, "points_written": 0, "queries": 0}
+
+    def write_lines(self, body, precision="ns"):
+        """Store newline-separated line protocol."""
+        precision_ns = _PRECISION_NS[precision]
+        count = 0
+        with self.lock:
+            for line in body.splitlines():
+                if not line.strip():
+                    continue
+                measurement, tags, fields, time_ns = _parse_line(line, precision_ns)
+                key = (
+                    measurement,
+                    tags.get("sensor_id"),
+                    tags.get("stat_type"),
+                    tags.get("bucket"),
+                )
+                self.series.setdefault(key, _Series()).add(time_ns, fields)
+                count += 1
+            self.stats["writes"] += 1
+            self.stats["points_written"] += count
+
+    def add_point(
+        self, measurement, sensor_id, time_ns, fields, stat_type=None, bucket=None
+    ):
+        """Store one point directly (used to seed benchmark data)."""
+        key = (measurement, sensor_id, stat_type, bucket)
+        self.series.setdefault(key, _Series()).add(time_ns, fields)
+
+    def query(self, flux, params=None):
+        """
+        Run a supported Flux query.
+
+        Returns:
+            tuple: (columns, tables) where each table is a list of row lists
+                and columns holds (name, datatype, is_group_key) triples
+
+        Raises:
+            ValueError: If the query is outside the supported subset
+        """
+        if params:
+            flux = _PARAM_RE.sub(lambda m: params.get(m.group(1), m.group(0)), flux)
+        with self.lock:
+            self.stats["queries"] += 1
+        if "schema.tagValues(" in flux:
+            return self._tag_values(flux)
+        if "to(" in flux or "from(" not in flux:
+            raise ValueError("unsupported query")
+
+        measurement_match = _MEASUREMENT_RE.search(flux)
+        range_match = _RANGE_RE.search(flux)
+        if not measurement_match or not range_match:
+            raise ValueError("query needs a range and a _measurement filter")
+
+        now = time.time_ns()
+        start_ns = self._time_ns(range_match.group(1), now)
+        stop_ns = (
+            self._time_ns(range_match.group(2), now) if range_match.group(2) else now
+        )
+        measurement = measurement_match.group(1)
+        sensors = set(_SENSOR_RE.findall(flux))
+        fields = _FIELD_RE.findall(flux)
+        stat_types = _STAT_RE.findall(flux)
+        if "|> sum()" in flux:
+            return self._bucket_sums(measurement, sensors, fields, start_ns, stop_ns)
+
+        column_key = [
+            key.strip().strip('"')
+            for key in (_COLUMN_KEY_RE.search(flux) or [None, ""])[1].split(",")
+            if key.strip()
+        ]
+        limit_match = _LIMIT_RE.search(flux)
+        limit = int(limit_match.group(1)) if limit_match else None
+        descending = "desc: true" in flux
+
+        # One output table per sensor; rows are pivoted on the column key
+        tables = {}
+        value_columns = []
+        with self.lock:
+            for (m, sensor_id, stat_type, _), series in self.series.items():
+                if m != measurement or (sensors and sensor_id not in sensors):
+                    continue
+                if stat_types and stat_type not in stat_types:
+                    continue
+                rows = tables.setdefault(sensor_id, {})
+                for time_ns in series.between(start_ns, stop_ns):
+                    row = rows.setdefault(time_ns, {})
+                    for field, value in series.points[time_ns].items():
+                        if fields and field not in fields:
+                            continue
+                        column = field
+                        if "stat_type" in column_key:
+                            column = f"{field}_{stat_type}"
+                        row[column] = value
+                        if column not in value_columns:
+                            value_columns.append(column)
+
+        value_columns.sort()
+        group_stat = "stat_type" not in column_key and bool(stat_types)
+        columns = [
+            ("result", "string", False),
+            ("table", "long", False),
+            ("_start", "dateTime:RFC3339", True),
+            ("_stop", "dateTime:RFC3339", True),
+            ("_time", "dateTime:RFC3339", False),
+            ("_measurement", "string", True),
+            ("sensor_id", "string", True),
+        ]
+        if group_stat:
+            columns.append(("stat_type", "string", True))
+        columns += [(column, "double", False) for column in value_columns]
+
+        output = []
+        start_text, stop_text = _format_time(start_ns), _format_time(stop_ns)
+        for index, sensor_id in enumerate(sorted(tables)):
+            rows = tables[sensor_id]
+            times = sorted(rows, reverse=descending)
+            if limit is not None:
+                times = times[:limit]
+            table = []
+            for time_ns in times:
+                row = ["", "", index, start_text, stop_text, _format_time(time_ns)]
+                row += [measurement, sensor_id]
+                if group_stat:
+                    row.append(stat_types[0])
+                row += [rows[time_ns].get(column, "") for column in value_columns]
+                table.append(row)
+            output.append(table)
+        return columns, output
+
+    def _time_ns(self, text, now_ns):
+        text = text.strip()
+        if text.startswith("-"):
+            parts = _DURATION_PART_RE.findall(text[1:])
+            return now_ns - sum(int(n) * _DURATION_NS[unit] for n, unit in parts)
+        if text.startswith("now"):
+            return now_ns
+        return epoch_ns(text.strip('"'))
+
+    def _bucket_sums(self, measurement, sensors, fields, start_ns, stop_ns):
+        """Sum sketch bucket counts per (_field, bucket) over matching series."""
+        sums = {}
+        with self.lock:
+            for (m, sensor_id, _, bucket), series in self.series.items():
+                if m != measurement or (sensors and sensor_id not in sensors):
+                    continue
+                for time_ns in series.between(start_ns, stop_ns):
+                    for field, value in series.points[time_ns].items():
+                        if not fields or field in fields:
+                            sums[field, bucket] = sums.get((field, bucket), 0.0) + value
+        columns = [
+            ("result", "string", False),
+            ("table", "long", False),
+            ("_field", "string", True),
+            ("bucket", "string", True),
+            ("_value", "double", False),
+        ]
+        tables = [
+            [["", "", index, field, bucket, total]]
+            for index, ((field, bucket), total) in enumerate(sorted(sums.items()))
+        ]
+        return columns, tables
+
+    def _tag_values(self, flux):
+        measurement_match = _MEASUREMENT_RE.search(flux)
+        start_match = _TAG_VALUES_START_RE.search(flux)
+        if not measurement_match or not start_match:
+            raise ValueError("tagValues needs a start and a _measurement predicate")
+        start_ns = self._time_ns(start_match.group(1), time.time_ns())
+        with self.lock:
+            sensors = sorted(
+                {
+                    sensor_id
+                    for (m, sensor_id, _, _), series in self.series.items()
+                    if m == measurement_match.group(1)
+                    and series.between(start_ns, time.time_ns())
+                }
+            )
+        columns = [
+            ("result", "string", False),
+            ("table", "long", False),
+            ("_value", "string", False),
+        ]
+        return columns, [[["", "", 0, s] for s in sensors]]
+
+
+def _to_csv(columns, tables, annotations):
+    """Serialize query output as (optionally annotated) Flux CSV."""
+    lines = []
+    if "datatype" in annotations:
+        lines.append("#datatype," + ",".join(c[1] for c in columns))
+    if "group" in annotations:
+        lines.append("#group," + ",".join(str(c[2]).lower() for c in columns))
+    if "default" in annotations:
+        lines.append("#default,_result" + "," * (len(columns) - 1))
+    lines.append("," + ",".join(c[0] for c in columns))
+    for table in tables:
+        for row in table:
+            lines.append(",".join(str(value) for value in row))
+    return "\r\n".join(lines) + "\r\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add
+    # ~40ms to every small response
+    disable_nagle_algorithm = True
+    db = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith(("/health", "/ping")):
+            self._reply(200, b'{"status":"pass"}')
+        else:
+            self._reply(404, b'{"message":"not found"}')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        try:
+            if url.path == "/api/v2/write":
+                precision = query.get("precision", ["ns"])[0]
+                self.db.write_lines(body.decode(), precision)
+                self._reply(204)
+            elif url.path == "/api/v2/query":
+                request = json.loads(body)
+                dialect = request.get("dialect") or {}
+                annotations = dialect.get(
+                    "annotations", ["datatype", "group", "default"]
+                )
+                columns, tables = self.db.query(
+                    request["query"], _extern_params(request.get("extern"))
+                )
+                csv = _to_csv(columns, tables, annotations or [])
+                self._reply(200, csv.encode(), "text/csv; charset=utf-8")
+            else:
+                self._reply(404, b'{"message":"not found"}')
+        except (ValueError, KeyError) as e:
+            self._reply(
+                400, json.dumps({"code": "invalid", "message": str(e)}).encode()
+            )
+
+
+class FakeInfluxServer:
+    """Runs a FakeInfluxDB behind a threaded HTTP server on a local port."""
+
+    def __init__(self, port=0):
+        self.db = FakeInfluxDB()
+        handler = type("Handler", (_Handler,), {"db": self.db})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,412 @@
+"""
+run_benchmarks.py
+End-to-end benchmarks of the API against an in-memory InfluxDB stand-in.
+
+The Flask app in api/app.py is driven through its test client (no network
+hop to the API) while the storage client talks real HTTP to a FakeInfluxServer
+on a local port, so ingest and read paths run unchanged. Measures:
+
+- ingest throughput and latency (single readings and batches)
+- p50/p99 latency of every read endpoint at several data sizes
+- JSON serialization cost (jsonify vs the streaming helpers)
+- memory high-water marks (tracemalloc peak per request, process max RSS)
+
+Results are written as JSON; --compare diffs two result files.
+
+Usage:
+python -m benchmarks.run_benchmarks --sizes 100,1000,10000 --output bench.json
+python -m benchmarks.run_benchmarks --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+from benchmarks.fake_influx import FakeInfluxServer
+from storage.sketch import bucket_codes, bucket_tag, sketch_measurement
+from utils.windows import NS_PER_SECOND
+
+DEFAULT_SIZES = "100,1000,10000"
+
+# Latency metrics compared by --compare (lower is better)
+COMPARED_METRICS = ("p50_ms", "p99_ms")
+
+# Sensors read together by the multi-sensor endpoints
+MANY_SENSORS = 10
+
+
+def _timings(samples):
+    """Summarize a list of durations in seconds as millisecond percentiles."""
+    ms = np.array(samples) * 1000.0
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _measure(fn, iterations, warmup=2):
+    """Call fn repeatedly and return its latency percentiles."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return _timings(samples)
+
+
+def _peak_kb(fn):
+    """Return the tracemalloc peak (KiB) of one call of fn."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024.0, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def _max_rss_kb():
+    """Return the process's maximum resident set size in KiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(db, sizes, now_ns):
+    """
+    Store raw readings and 1m rollups for one sensor per data size.
+
+    Sensor "bench_<size>" gets `size` raw readings one second apart and
+    `size` 1m windows (every stored statistic and a quantile sketch), all
+    ending a few minutes before now so that reads of the whole range are
+    served from settled data. MANY_SENSORS
+    further sensors "many_<i>" get size/MANY_SENSORS of each for the
+    multi-sensor reads of the largest size.
+    """
+    minute_ns = 60 * NS_PER_SECOND
+    end_ns = now_ns - now_ns % minute_ns - 5 * minute_ns
+    rng = np.random.default_rng(0)
+
+    def add(sensor_id, count):
+        temperatures = rng.uniform(10.0, 30.0, count)
+        conductivities = rng.uniform(100.0, 2000.0, count)
+        for i in range(count):
+            fields = {
+                "temperature": float(temperatures[i]),
+                "conductivity": float(conductivities[i]),
+            }
+            db.add_point("water_quality", sensor_id, end_ns - i * NS_PER_SECOND, fields)
+            window_ns = end_ns - (i + 1) * minute_ns
+            # 60 readings per window with a spread of 0.5 around the mean
+            stats = {
+                "mean": lambda mean: mean,
+                "min": lambda mean: mean - 1.0,
+                "max": lambda mean: mean + 1.0,
+                "count": lambda mean: 60.0,
+                "sum": lambda mean: 60.0 * mean,
+                "sumsq": lambda mean: 60.0 * (mean * mean + 0.25),
+            }
+            for stat_type, value_of in stats.items():
+                db.add_point(
+                    "water_quality_1m",
+                    sensor_id,
+                    window_ns,
+                    {name: value_of(value) for name, value in fields.items()},
+                    stat_type,
+                )
+            # The same 60 readings as 15/30/15 at mean - 0.5, mean, mean + 0.5
+            for name, value in fields.items():
+                buckets = {}
+                offsets = np.array([-0.5, 0.0, 0.5])
+                for code, count in zip(bucket_codes(value + offsets), (15, 30, 15)):
+                    buckets[code] = buckets.get(code, 0) + count
+                for code, count in buckets.items():
+                    db.add_point(
+                        sketch_measurement("1m"),
+                        sensor_id,
+                        window_ns,
+                        {name: float(count)},
+                        bucket=bucket_tag(code),
+                    )
+
+    for size in sizes:
+        add(f"bench_{size}", size)
+    for i in range(MANY_SENSORS):
+        add(f"many_{i}", max(sizes) // MANY_SENSORS)
+
+
+def bench_ingest(client, iterations):
+    """Measure POST /measurements and POST /measurements/batch."""
+    results = {}
+    counter = iter(range(10**9))
+
+    def reading():
+        return {
+            "sensor_id": f"ingest_{next(counter) % 100}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "temperature": 20.5,
+            "conductivity": 1500.0,
+        }
+
+    def post_single():
+        response = client.post("/measurements", json=reading())
+        assert response.status_code == 201, response.get_data(as_text=True)
+
+    timings = _measure(post_single, iterations * 5)
+    timings["readings_per_second"] = round(1000.0 / timings["mean_ms"], 1)
+    results["single"] = timings
+
+    for batch_size in (100, 1000):
+
+        def post_batch():
+            body = [reading() for _ in range(batch_size)]
+            response = client.post("/measurements/batch", json=body)
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+        timings = _measure(post_batch, iterations)
+        timings["readings_per_second"] = round(
+            batch_size * 1000.0 / timings["mean_ms"], 1
+        )
+        results[f"batch_{batch_size}"] = timings
+    return results
+
+
+def read_endpoints(size):
+    """Return (name, path) pairs for every read endpoint at one data size."""
+    sensor_id = f"bench_{size}"
+    raw = f"/measurements/{sensor_id}?start=-{size + 600}s&limit={size}"
+    rollup = f"start=-{size + 10}m&window=1m"
+    many = ",".join(f"many_{i}" for i in range(MANY_SENSORS))
+    per_sensor = max(size // MANY_SENSORS, 1)
+    return [
+        ("raw_json", raw),
+        ("raw_json_stream", raw + "&stream=true"),
+        ("raw_ndjson", raw + "&format=ndjson"),
+        ("raw_csv", raw + "&format=csv"),
+        ("raw_points", f"/measurements/{sensor_id}?start=-{size + 600}s&points=100"),
+        ("aggregated", f"/measurements/{sensor_id}/aggregated?{rollup}"),
+        ("statistics", f"/measurements/{sensor_id}/statistics?{rollup}"),
+        ("statistics_csv", f"/measurements/{sensor_id}/statistics?{rollup}&format=csv"),
+        ("percentiles", f"/measurements/{sensor_id}/percentiles?{rollup}"),
+        (
+            "raw_many",
+            f"/measurements?sensor_ids={many}&start=-{size + 600}s&limit={per_sensor}",
+        ),
+        (
+            "statistics_many",
+            f"/measurements/statistics?sensor_ids={many}"
+            f"&start=-{per_sensor + 10}m&window=1m",
+        ),
+        (
+            "percentiles_many",
+            f"/measurements/percentiles?sensor_ids={many}"
+            f"&start=-{per_sensor + 10}m&window=1m",
+        ),
+        ("sensors", "/sensors?details=true"),
+    ]
+
+
+def bench_reads(client, sizes, iterations):
+    """Measure latency, response size and allocation peak of the read endpoints."""
+    results = {}
+    for size in sizes:
+        for name, path in read_endpoints(size):
+
+            def get():
+                response = client.get(path)
+                assert response.status_code == 200, response.get_data(as_text=True)
+                return response.get_data()
+
+            timings = _measure(get, iterations)
+            timings["response_bytes"] = len(get())
+            timings["peak_kb"] = _peak_kb(get)
+            results[f"{name}/{size}"] = timings
+    return results
+
+
+def bench_serialization(app, sizes, iterations):
+    """Measure turning rows into a JSON body, buffered and streamed."""
+    from flask import jsonify
+    from api.responses import json_stream_response, ndjson_response
+
+    results = {}
+    for size in sizes:
+        rows = [
+            {
+                "timestamp": "2026-01-01T00:00:00+00:00",
+                "sensor_id": "bench",
+                "temperature": 20.0 + i * 1e-3,
+                "conductivity": 1500.0 + i * 1e-2,
+            }
+            for i in range(size)
+        ]
+        cases = {
+            "jsonify": lambda: jsonify({"measurements": rows}).get_data(),
+            "json_stream": lambda: "".join(
+                json_stream_response({}, "measurements", rows).response
+            ),
+            "ndjson": lambda: "".join(ndjson_response(rows).response),
+        }
+        with app.test_request_context():
+            for name, fn in cases.items():
+                timings = _measure(fn, iterations)
+                timings["peak_kb"] = _peak_kb(fn)
+                results[f"{name}/{size}"] = timings
+    return results
+
+
+def run(args):
+    """Start the fake InfluxDB, import the app against it and run every benchmark."""
+    sizes = [int(size) for size in args.sizes.split(",")]
+    server = FakeInfluxServer().start()
+    state_dir = tempfile.TemporaryDirectory()
+
+    # The app reads its configuration at import time
+    os.environ["INFLUXDB_URL"] = server.url
+    os.environ["INFLUXDB_WRITE_MODE"] = "sync"
+    os.environ["AGGREGATION_STATE_PATH"] = os.path.join(state_dir.name, "state.json")
+    os.environ["SENSOR_REGISTRY_PATH"] = os.path.join(state_dir.name, "sensors.db")
+    os.environ.setdefault("QUERY_CACHE_MB", "64" if args.cache else "0")
+    from api.app import app, influx_client
+
+    started = time.perf_counter()
+    seed(server.db, sizes, time.time_ns())
+    points = sum(len(series.points) for series in server.db.series.values())
+    print(f"Seeded {points} points in {time.perf_counter() - started:.1f}s")
+
+    client = app.test_client()
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "sizes": sizes,
+            "iterations": args.iterations,
+            "query_cache": influx_client.query_cache is not None,
+        }
+    }
+    try:
+        print("Ingest...")
+        results["ingest"] = bench_ingest(client, args.iterations)
+        print("Reads...")
+        results["reads"] = bench_reads(client, sizes, args.iterations)
+        print("Serialization...")
+        results["serialization"] = bench_serialization(app, sizes, args.iterations)
+        results["memory"] = {"max_rss_kb": _max_rss_kb()}
+    finally:
+        influx_client.close()
+        server.stop()
+        state_dir.cleanup()
+
+    for section in ("ingest", "reads", "serialization"):
+        for name, timings in results[section].items():
+            print(
+                f"  {section:<13} {name:<26} p50 {timings['p50_ms']:>9.3f} ms"
+                f"  p99 {timings['p99_ms']:>9.3f} ms"
+            )
+    print(f"  max RSS {results['memory']['max_rss_kb']} KiB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Print the latency change of every benchmark present in both result files.
+
+    Returns:
+        int: 1 if any p50 got slower by more than `threshold` percent, else 0
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    regressions = 0
+    for section in ("ingest", "reads", "serialization"):
+        for name, new_timings in new.get(section, {}).items():
+            old_timings = old.get(section, {}).get(name)
+            if not old_timings:
+                continue
+            changes = []
+            for metric in COMPARED_METRICS:
+                before, after = old_timings[metric], new_timings[metric]
+                change = (after - before) / before * 100.0 if before else 0.0
+                changes.append(f"{metric} {before:.3f} -> {after:.3f} ({change:+.1f}%)")
+                if metric == "p50_ms" and change > threshold:
+                    regressions += 1
+                    changes[-1] += " REGRESSION"
+            print(f"  {section:<13} {name:<26} " + "  ".join(changes))
+
+    print(f"{regressions} regression(s) above {threshold:.0f}%")
+    return 1 if regressions else 0
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help=f"Comma-separated rows per read (default: {DEFAULT_SIZES})",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=20, help="Timed calls per benchmark"
+    )
+    parser.add_argument(
+        "--output", default="logs/benchmarks.json", help="Result JSON file"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the query cache enabled (default: disabled, every read queries)",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two result files instead of running",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="p50 slowdown in percent reported as a regression by --compare",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from operations.aggregation_tasks import AggregationTaskManager
 from utils.logger_config import setup_logging
+from utils.windows import ROLLUP_WINDOWS, rollup_tiers
 
 logger = setup_logging("setup")
 
@@ -30,13 +31,16 @@ def main():
             logger.info("=" * 60)
             logger.info("")
             logger.info("Background tasks are now running:")
-            logger.info("  • 1-minute aggregations: Runs every 1 minute")
-            logger.info("  • 5-minute aggregations: Runs every 5 minutes")
+            for window, source_window in rollup_tiers():
+                source = f"water_quality_{source_window}" if source_window else "raw"
+                logger.info(
+                    f"  • {window} aggregations: Runs every {window} (from {source})"
+                )
             logger.info("")
             logger.info("Data will be stored in:")
             logger.info("  • water_quality (raw measurements)")
-            logger.info("  • water_quality_1m (1-minute aggregations)")
-            logger.info("  • water_quality_5m (5-minute aggregations)")
+            for window in ROLLUP_WINDOWS:
+                logger.info(f"  • water_quality_{window} ({window} aggregations)")
             logger.info("")
             logger.info("You can now start the API server and simulator.")
         else:
@@ -1,10 +1,43 @@
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from influxdb_client import InfluxDBClient as InfluxClient
+from operations.incremental_aggregator import AGGREGATION_MODE, INLINE_WINDOWS
 from utils.logger_config import setup_logging
+from operations.watermarks import WatermarkTracker, merge_ranges
+from storage.sketch import FLUX_BUCKET, sketch_measurement
+from utils.windows import (
+    NS_PER_SECOND,
+    ROLLUP_WINDOWS,
+    format_duration,
+    parse_duration,
+    parse_time,
+    rollup_tiers,
+)
 from influxdb_client.domain.task_create_request import TaskCreateRequest
 
 logger = setup_logging("aggregation_tasks")
 
+# Task names used before the per-window tasks computed every statistic at once
+LEGACY_TASK_NAMES = [
+    "aggregate_1m_mean",
+    "aggregate_1m_min",
+    "aggregate_1m_max",
+    "aggregate_1m_count",
+    "aggregate_5m_mean",
+    "aggregate_5m_min",
+    "aggregate_5m_max",
+    "aggregate_5m_count",
+    "aggregate_1m_windows",
+    "aggregate_5m_windows",
+]
+
+
+def task_name(window):
+    """Name of the aggregation task for a rollup tier."""
+    return f"aggregate_{window}_stats"
+
 
 class AggregationTaskManager:
     """Manages InfluxDB tasks for automatic data aggregation and downsampling."""
@@ -17,54 +50,199 @@ class AggregationTaskManager:
 
         self.client = InfluxClient(url=self.url, token=self.token, org=self.org)
         self.tasks_api = self.client.tasks_api()
+        self.query_api = self.client.query_api()
 
         logger.info("Aggregation Task Manager initialized")
 
-    def _create_aggregation_task(self, task_name, window, stat_fn, stat_type):
+    def _flux_time(self, value):
+        """Format a range bound: negative seconds (relative to now) or a datetime."""
+        if isinstance(value, datetime):
+            return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if value == 0:
+            return "now()"
+        return f"-{format_duration(-value)}"
+
+    def build_rollup_flux(
+        self, window, source_window, start, stop, sensor_ids=None, task_option=""
+    ):
         """
-        Helper to create a single aggregation task.
+        Build the Flux pipelines that compute one rollup tier over [start, stop).
+
+        The first tier (source_window None) reduces raw measurements to count,
+        sum, sum of squares, min and max per window. Higher tiers merge the
+        rows of the tier below instead of touching raw data: counts, sums and
+        sums of squares are added, min/max taken over the lower min/max, and
+        the mean recomputed as sum / count. Every tier writes one series per
+        statistic (mean, min, max, count, sum, sumsq) tagged with stat_type.
+
+        A second pipeline writes the tier's quantile sketches to
+        water_quality_<window>_sketch (see storage/sketch.py): the first
+        tier counts raw readings per logarithmic bucket, higher tiers add up
+        the bucket counts of the tier below.
+
+        Args:
+            window: Tier window (e.g., "5m")
+            source_window: Window of the tier it is computed from, or None for raw
+            start: Start of the first target window, as negative seconds
+                relative to now or an aligned datetime
+            stop: End of the last target window (same form as start)
+            sensor_ids: Restrict the computation to these sensors (optional);
+                run the script with params=rollup_params(sensor_ids)
+            task_option: "option task = ..." block, placed after the imports
+
+        Returns:
+            str: Flux script whose pipelines end in to()
+        """
+        if source_window is None:
+            range_start, range_stop = start, stop
+            measurement = "water_quality"
+            sketch_source_measurement = measurement
+            source = f"""
+  |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
+  |> window(every: {window})
+  |> reduce(
+      identity: {{count: 0.0, sum: 0.0, sumsq: 0.0, min: 0.0, max: 0.0}},
+      fn: (r, accumulator) => ({{
+        count: accumulator.count + 1.0,
+        sum: accumulator.sum + r._value,
+        sumsq: accumulator.sumsq + r._value * r._value,
+        min: if accumulator.count == 0.0 or r._value < accumulator.min then r._value else accumulator.min,
+        max: if accumulator.count == 0.0 or r._value > accumulator.max then r._value else accumulator.max,
+      }}),
+  )"""
+            sketch_source = f"""
+  |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
+  |> map(fn: (r) => ({{r with bucket: {FLUX_BUCKET}}}))
+  |> group(columns: ["sensor_id", "_field", "bucket"])
+  |> aggregateWindow(every: {window}, fn: count, createEmpty: false)
+  |> map(fn: (r) => ({{r with _value: float(v: r._value)}}))"""
+        else:
+            # Lower-tier rows are timestamped at the end of their window, so
+            # shift the range forward by one source window and shift the rows
+            # back to their window start before re-windowing.
+            shift = parse_duration(source_window)
+            if isinstance(start, datetime):
+                range_start = start + timedelta(seconds=shift)
+                range_stop = stop + timedelta(seconds=shift)
+            else:
+                range_start, range_stop = start + shift, stop + shift
+            measurement = f"water_quality_{source_window}"
+            sketch_source_measurement = sketch_measurement(source_window)
+            source = f"""
+  |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
+  |> filter(
+      fn: (r) => r["stat_type"] == "count" or r["stat_type"] == "sum" or r["stat_type"] == "sumsq"
+        or r["stat_type"] == "min" or r["stat_type"] == "max",
+  )
+  |> timeShift(duration: -{source_window})
+  |> pivot(rowKey: ["_time"], columnKey: ["stat_type"], valueColumn: "_value")
+  |> window(every: {window})
+  |> reduce(
+      identity: {{count: 0.0, sum: 0.0, sumsq: 0.0, min: 0.0, max: 0.0}},
+      fn: (r, accumulator) => ({{
+        count: accumulator.count + r.count,
+        sum: accumulator.sum + r.sum,
+        sumsq: accumulator.sumsq + r.sumsq,
+        min: if accumulator.count == 0.0 or r.min < accumulator.min then r.min else accumulator.min,
+        max: if accumulator.count == 0.0 or r.max > accumulator.max then r.max else accumulator.max,
+      }}),
+  )"""
+            sketch_source = f"""
+  |> timeShift(duration: -{source_window})
+  |> group(columns: ["sensor_id", "_field", "bucket"])
+  |> aggregateWindow(every: {window}, fn: sum, createEmpty: false)"""
+
+        sensor_filter = ""
+        if sensor_ids:
+            # The IDs are sent as query params (rollup_params()), never spliced in
+            predicate = " or ".join(
+                f'r["sensor_id"] == p_sensor_{i}' for i in range(len(sensor_ids))
+            )
+            sensor_filter = f"\n  |> filter(fn: (r) => {predicate})"
+
+        time_range = (
+            f"start: {self._flux_time(range_start)}, "
+            f"stop: {self._flux_time(range_stop)}"
+        )
+        return f"""import "math"
+{task_option}
+stat = (tables=<-, name, fn) => tables
+  |> map(fn: (r) => ({{r with _value: fn(r: r), stat_type: name}}))
+
+windows = from(bucket: "{self.bucket}")
+  |> range({time_range})
+  |> filter(fn: (r) => r["_measurement"] == "{measurement}"){sensor_filter}{source}
+  |> duplicate(column: "_stop", as: "_time")
+  |> window(every: inf)
+
+union(tables: [
+    windows |> stat(name: "mean", fn: (r) => r.sum / r.count),
+    windows |> stat(name: "min", fn: (r) => r.min),
+    windows |> stat(name: "max", fn: (r) => r.max),
+    windows |> stat(name: "count", fn: (r) => r.count),
+    windows |> stat(name: "sum", fn: (r) => r.sum),
+    windows |> stat(name: "sumsq", fn: (r) => r.sumsq),
+  ])
+  |> drop(columns: ["count", "sum", "sumsq", "min", "max"])
+  |> set(key: "_measurement", value: "water_quality_{window}")
+  |> to(bucket: "{self.bucket}")
+
+from(bucket: "{self.bucket}")
+  |> range({time_range})
+  |> filter(fn: (r) => r["_measurement"] == "{sketch_source_measurement}"){sensor_filter}{sketch_source}
+  |> set(key: "_measurement", value: "{sketch_measurement(window)}")
+  |> to(bucket: "{self.bucket}")
+"""
+
+    @staticmethod
+    def rollup_params(sensor_ids):
+        """Query params carrying the sensor IDs of a build_rollup_flux() script."""
+        if not sensor_ids:
+            return None
+        return {f"p_sensor_{i}": sensor_id for i, sensor_id in enumerate(sensor_ids)}
+
+    def _create_aggregation_task(self, task_name, window, source_window, offset):
+        """
+        Helper to create (or update) the aggregation task for one rollup tier.
+
+        Each run processes the window that closed one window ago, i.e.
+        [now - 2 * window, now - window), which gives the tier below time
+        to write its own rows first.
 
         Args:
             task_name: Name of the task
             window: Time window (e.g., "1m", "5m")
-            stat_fn: Aggregation function (mean, min, max, count)
-            stat_type: Type label (mean, min, max, count)
+            source_window: Tier it is computed from, or None for raw data
+            offset: Delay after each scheduled run time (e.g., "10s")
         """
-        existing_tasks = self.tasks_api.find_tasks(name=task_name)
-        if existing_tasks:
-            logger.info(f"Task '{task_name}' already exists")
-            return existing_tasks[0]
-
-        # Determine time range based on window
-        if window == "1m":
-            start_time = "-2m"
-            stop_time = "-1m"
-            every = "1m"
-            offset = "10s"
-        else:  # 5m
-            start_time = "-70m"
-            stop_time = "-65m"
-            every = "5m"
-            offset = "30s"
-
-        flux_script = f"""
+        window_seconds = parse_duration(window)
+        flux_script = self.build_rollup_flux(
+            window,
+            source_window,
+            -2 * window_seconds,
+            -window_seconds,
+            task_option=f"""
 option task = {{
   name: "{task_name}",
-  every: {every},
+  every: {window},
   offset: {offset}
 }}
-
-from(bucket: "{self.bucket}")
-  |> range(start: {start_time}, stop: {stop_time})
-  |> filter(fn: (r) => r["_measurement"] == "water_quality")
-  |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
-  |> aggregateWindow(every: {window}, fn: {stat_fn}, createEmpty: false)
-  |> set(key: "stat_type", value: "{stat_type}")
-  |> set(key: "_measurement", value: "water_quality_{window}")
-  |> to(bucket: "{self.bucket}")
-"""
+""",
+        )
 
         try:
+            existing_tasks = self.tasks_api.find_tasks(name=task_name)
+            if existing_tasks:
+                task = existing_tasks[0]
+                if task.flux.strip() == flux_script.strip():
+                    logger.info(f"Task '{task_name}' already exists")
+                    return task
+
+                task.flux = flux_script
+                task = self.tasks_api.update_task(task)
+                logger.info(f"Updated task: {task_name}")
+                return task
+
             task_request = TaskCreateRequest(
                 org=self.org, flux=flux_script, status="active"
             )
@@ -76,51 +254,180 @@ from(bucket: "{self.bucket}")
             logger.error(f"Error creating task {task_name}: {e}")
             return None
 
-    def create_one_minute_aggregation_task(self):
-        """Create all 1-minute aggregation tasks (mean, min, max)."""
-        tasks = []
-        tasks.append(
-            self._create_aggregation_task("aggregate_1m_mean", "1m", "mean", "mean")
-        )
-        tasks.append(
-            self._create_aggregation_task("aggregate_1m_min", "1m", "min", "min")
-        )
-        tasks.append(
-            self._create_aggregation_task("aggregate_1m_max", "1m", "max", "max")
-        )
-        return all(t is not None for t in tasks)
+    def create_rollup_tasks(self):
+        """
+        Create one aggregation task per rollup tier (see utils.windows.ROLLUP_WINDOWS).
+
+        With AGGREGATION_MODE=inline, tiers in INLINE_WINDOWS are computed by
+        the API process instead, so their tasks are skipped (and removed).
 
-    def create_five_minute_aggregation_task(self):
-        """Create all 5-minute aggregation tasks (mean, min, max)."""
+        Returns:
+            bool: True if every tier's task exists and is up to date
+        """
         tasks = []
-        tasks.append(
-            self._create_aggregation_task("aggregate_5m_mean", "5m", "mean", "mean")
-        )
-        tasks.append(
-            self._create_aggregation_task("aggregate_5m_min", "5m", "min", "min")
-        )
-        tasks.append(
-            self._create_aggregation_task("aggregate_5m_max", "5m", "max", "max")
-        )
+        for index, (window, source_window) in enumerate(rollup_tiers()):
+            if AGGREGATION_MODE == "inline" and window in INLINE_WINDOWS:
+                # Written by the API's incremental aggregator instead
+                logger.info(f"Skipping {window} aggregation task (computed inline)")
+                if self.tasks_api.find_tasks(name=task_name(window)):
+                    self.delete_task(task_name(window))
+                continue
+            source = f"water_quality_{source_window}" if source_window else "raw data"
+            logger.info(f"Creating {window} aggregation task (from {source})...")
+            tasks.append(
+                self._create_aggregation_task(
+                    task_name(window),
+                    window,
+                    source_window,
+                    format_duration(10 + 20 * index),
+                )
+            )
         return all(t is not None for t in tasks)
 
-    def setup_all_tasks(self):
-        """Set up all aggregation tasks (6 total: 3 for 1m, 3 for 5m)."""
-        logger.info("Setting up aggregation tasks...")
-        logger.info("Creating 1-minute aggregation tasks (mean, min, max)...")
+    def delete_legacy_tasks(self):
+        """Delete the old one-task-per-statistic aggregation tasks, if present."""
+        for name in LEGACY_TASK_NAMES:
+            if self.tasks_api.find_tasks(name=name):
+                self.delete_task(name)
 
-        task_1m = self.create_one_minute_aggregation_task()
+    def setup_all_tasks(self):
+        """
+        Set up all aggregation tasks (one per rollup tier).
 
-        logger.info("Creating 5-minute aggregation tasks (mean, min, max)...")
-        task_5m = self.create_five_minute_aggregation_task()
+        Older deployments ran a separate task per statistic; those are removed
+        once the replacement tasks exist, so there is no gap in the rollups.
+        """
+        logger.info("Setting up aggregation tasks...")
 
-        if task_1m and task_5m:
-            logger.info("All aggregation tasks configured successfully (6 tasks)")
+        if self.create_rollup_tasks():
+            logger.info("Removing legacy per-statistic tasks...")
+            self.delete_legacy_tasks()
+            logger.info(
+                f"All aggregation tasks configured successfully "
+                f"({len(ROLLUP_WINDOWS)} tasks)"
+            )
             return True
         else:
             logger.error("Failed to configure some aggregation tasks")
             return False
 
+    def _run_backfill_chunk(self, window, source_window, start, stop, sensor_ids):
+        """Recompute one tier over [start, stop); returns True on success."""
+        flux_script = self.build_rollup_flux(
+            window, source_window, start, stop, sensor_ids
+        )
+        try:
+            self.query_api.query(
+                flux_script, org=self.org, params=self.rollup_params(sensor_ids)
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling {window} windows {start} to {stop}: {e}")
+            return False
+
+    def backfill(self, start, stop, sensor_ids=None, chunk="6h", workers=4):
+        """
+        Recompute every rollup tier for the windows overlapping [start, stop).
+
+        Tiers are recomputed finest first, since each tier is rolled up from
+        the one below. Within a tier the range is widened to whole windows,
+        split into chunks of at most `chunk` and the chunks run in parallel.
+
+        Args:
+            start (datetime): Start of the affected range
+            stop (datetime): End of the affected range
+            sensor_ids (list): Only recompute these sensors (optional)
+            chunk (str): Maximum time range per query (e.g., "6h")
+            workers (int): Chunks queried concurrently
+
+        Returns:
+            bool: True if every chunk of every tier was recomputed
+        """
+        chunk_seconds = parse_duration(chunk)
+        start_s = int(start.timestamp())
+        stop_s = int(stop.timestamp())
+
+        for window, source_window in rollup_tiers():
+            window_seconds = parse_duration(window)
+            tier_start = start_s - start_s % window_seconds
+            tier_stop = -(-stop_s // window_seconds) * window_seconds
+            step = max(window_seconds, chunk_seconds - chunk_seconds % window_seconds)
+
+            chunks = [
+                (
+                    datetime.fromtimestamp(t, tz=timezone.utc),
+                    datetime.fromtimestamp(min(t + step, tier_stop), tz=timezone.utc),
+                )
+                for t in range(tier_start, tier_stop, step)
+            ]
+            logger.info(f"Backfilling {window} windows in {len(chunks)} chunks...")
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(
+                    pool.map(
+                        lambda c: self._run_backfill_chunk(
+                            window, source_window, c[0], c[1], sensor_ids
+                        ),
+                        chunks,
+                    )
+                )
+            if not all(results):
+                # Coarser tiers would be rolled up from incomplete data
+                logger.error(f"Backfill of {window} windows failed, stopping")
+                return False
+
+        # Let the API drop cached copies of the rewritten windows
+        try:
+            WatermarkTracker().bump_generation()
+        except Exception as e:
+            logger.error(f"Error recording backfill in aggregation state: {e}")
+        return True
+
+    def backfill_pending(self, tracker=None, chunk="6h", workers=4):
+        """
+        Recompute the windows of late readings recorded by the API.
+
+        Overlapping late ranges of different sensors are backfilled together
+        with one sensor filter. Ranges that fail are put back for the next run.
+
+        Returns:
+            bool: True if every recorded range was recomputed
+        """
+        tracker = tracker or WatermarkTracker()
+        pending = tracker.take_pending()
+        if not pending:
+            logger.info("No late data recorded, nothing to backfill")
+            return True
+
+        # Group sensors whose late ranges overlap into one backfill each
+        spans = []
+        for start, end in merge_ranges(
+            [r for ranges in pending.values() for r in ranges]
+        ):
+            sensors = [
+                sensor_id
+                for sensor_id, ranges in pending.items()
+                if any(r[0] < end and r[1] > start for r in ranges)
+            ]
+            spans.append((start, end, sensors))
+
+        failed = {}
+        for start, end, sensors in spans:
+            start_dt = datetime.fromtimestamp(start / NS_PER_SECOND, tz=timezone.utc)
+            stop_dt = datetime.fromtimestamp(end / NS_PER_SECOND, tz=timezone.utc)
+            logger.info(
+                f"Backfilling {start_dt.isoformat()} to {stop_dt.isoformat()} "
+                f"for {len(sensors)} sensors"
+            )
+            if not self.backfill(start_dt, stop_dt, sensors, chunk, workers):
+                for sensor_id in sensors:
+                    failed.setdefault(sensor_id, []).append([start, end])
+
+        if failed:
+            tracker.restore_pending(failed)
+            return False
+        return True
+
     def list_tasks(self):
         """List all existing aggregation tasks."""
         try:
@@ -153,19 +460,10 @@ from(bucket: "{self.bucket}")
     def delete_all_aggregation_tasks(self):
         """Delete all aggregation tasks (useful for cleanup/reset)."""
         logger.info("Deleting all aggregation tasks...")
-        # Delete 1-minute tasks
-        self.delete_task("aggregate_1m_mean")
-        self.delete_task("aggregate_1m_min")
-        self.delete_task("aggregate_1m_max")
-        self.delete_task("aggregate_1m_count")
-        # Delete 5-minute tasks
-        self.delete_task("aggregate_5m_mean")
-        self.delete_task("aggregate_5m_min")
-        self.delete_task("aggregate_5m_max")
-        self.delete_task("aggregate_5m_count")
+        for window in ROLLUP_WINDOWS:
+            self.delete_task(task_name(window))
         # Delete old task names if they exist
-        self.delete_task("aggregate_1m_windows")
-        self.delete_task("aggregate_5m_windows")
+        self.delete_legacy_tasks()
         logger.info("Cleanup complete")
 
     def close(self):
@@ -174,25 +472,74 @@ from(bucket: "{self.bucket}")
             self.client.close()
 
 
+def _parse_args():
+    """Parse command line arguments for the task management CLI."""
+    parser = argparse.ArgumentParser(description="Manage InfluxDB aggregation tasks")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("setup", help="Create or update the rollup tasks")
+    subparsers.add_parser("list", help="List existing tasks")
+    subparsers.add_parser("delete", help="Delete all aggregation tasks")
+
+    backfill = subparsers.add_parser(
+        "backfill", help="Recompute rollups for late or corrected data"
+    )
+    backfill.add_argument(
+        "--since", help='Start of the affected range ("-6h" or ISO timestamp)'
+    )
+    backfill.add_argument(
+        "--until", default="now()", help="End of the affected range (default: now)"
+    )
+    backfill.add_argument(
+        "--sensor",
+        action="append",
+        dest="sensor_ids",
+        help="Only recompute this sensor (repeatable)",
+    )
+    backfill.add_argument(
+        "--pending",
+        action="store_true",
+        help="Recompute the late ranges recorded by the API instead of --since",
+    )
+    backfill.add_argument(
+        "--chunk", default="6h", help="Maximum time range per query (default: 6h)"
+    )
+    backfill.add_argument(
+        "--workers", type=int, default=4, help="Chunks queried in parallel"
+    )
+
+    args = parser.parse_args()
+    if args.command == "backfill" and not (args.since or args.pending):
+        parser.error("backfill requires --since or --pending")
+    return args
+
+
 if __name__ == "__main__":
-    """Setup aggregation tasks when run directly."""
-    import sys
+    """Manage aggregation tasks when run directly (default: setup)."""
+    args = _parse_args()
 
     manager = AggregationTaskManager()
 
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
-
-        if command == "setup":
-            manager.setup_all_tasks()
-        elif command == "list":
+    try:
+        if args.command == "list":
             manager.list_tasks()
-        elif command == "delete":
+        elif args.command == "delete":
             manager.delete_all_aggregation_tasks()
+        elif args.command == "backfill":
+            if args.pending:
+                success = manager.backfill_pending(
+                    chunk=args.chunk, workers=args.workers
+                )
+            else:
+                success = manager.backfill(
+                    parse_time(args.since),
+                    parse_time(args.until),
+                    args.sensor_ids,
+                    args.chunk,
+                    args.workers,
+                )
+            logger.info("Backfill complete" if success else "Backfill failed")
         else:
-            print("Usage: python aggregation_tasks.py [setup|list|delete]")
-    else:
-        # Default: setup tasks
-        manager.setup_all_tasks()
-
-    manager.close()
+            # Default: setup tasks
+            manager.setup_all_tasks()
+    finally:
+        manager.close()
@@ -0,0 +1,469 @@
+"""
+Threshold and anomaly alerting on the ingest stream.
+Operators used to poll the statistics endpoints to spot conductivity spikes,
+which cost queries and found them minutes late. The alert engine evaluates
+every accepted reading against a set of rules as it is ingested:
+
+- "threshold": the value is above `above` or below `below`
+- "rate": the value changed faster than `max_rate` units per second since
+  the sensor's previous reading
+- "zscore": the value is more than `threshold` standard deviations from the
+  mean of the sensor's last `window` readings (a fixed-size ring buffer)
+
+Every rule costs O(1) per reading. Alerts are handed to a background thread
+that appends them to a JSON-lines file, POSTs them to a webhook and keeps
+the most recent ones for GET /alerts, so a slow sink never delays ingest.
+
+Rules are read from the JSON file named by ALERT_RULES_PATH, e.g.:
+
+    [
+      {"name": "conductivity_high", "type": "threshold",
+       "field": "conductivity", "above": 2500},
+      {"name": "conductivity_jump", "type": "rate",
+       "field": "conductivity", "max_rate": 50},
+      {"name": "conductivity_anomaly", "type": "zscore",
+       "field": "conductivity", "window": 120, "threshold": 4}
+    ]
+
+A rule may also set "sensor_prefix" to only watch matching sensors.
+"""
+
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime, timezone
+from storage.flux_queries import FIELDS
+from utils.logger_config import setup_logging
+from utils.windows import NS_PER_SECOND, epoch_ns
+
+logger = setup_logging("alerting")
+
+# JSON file with the alert rules; alerting is off when unset
+RULES_PATH = os.getenv("ALERT_RULES_PATH", "")
+
+# JSON-lines file every alert is appended to (empty disables)
+LOG_PATH = os.getenv("ALERT_LOG_PATH", "logs/alerts.jsonl")
+
+# URL alerts are POSTed to as a JSON array (empty disables)
+WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+
+# Seconds a (rule, sensor) pair stays quiet after it fired
+COOLDOWN = float(os.getenv("ALERT_COOLDOWN_SECONDS", "60"))
+
+# Alerts kept in memory for GET /alerts
+RECENT_ALERTS = 1000
+
+# Alerts waiting for the delivery thread; beyond this new alerts are dropped
+MAX_QUEUED_ALERTS = 10000
+
+RULE_TYPES = ("threshold", "rate", "zscore")
+
+
+def _isoformat(ns):
+    seconds, ns = divmod(ns, NS_PER_SECOND)
+    moment = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    return moment.replace(microsecond=ns // 1000).isoformat()
+
+
+class _RingStats:
+    """
+    Mean and standard deviation of the last `size` values.
+
+    Values live in a fixed-size ring; the running sum and sum of squares
+    are updated as values enter and leave it, and recomputed exactly once
+    per pass around the ring so rounding errors cannot build up.
+    """
+
+    __slots__ = ("values", "index", "count", "total", "total_sq")
+
+    def __init__(self, size):
+        self.values = [0.0] * size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, value):
+        size = len(self.values)
+        if self.count == size:
+            old = self.values[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % size
+        if self.index == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    def mean_stddev(self):
+        """Return (mean, sample standard deviation); needs at least two values."""
+        mean = self.total / self.count
+        variance = max(self.total_sq - self.total * mean, 0.0) / (self.count - 1)
+        return mean, math.sqrt(variance)
+
+
+class Rule:
+    """
+    One alert rule, parsed from its JSON definition.
+
+    Attributes:
+        name (str): Unique rule name, reported with every alert
+        type (str): "threshold", "rate" or "zscore"
+        field (str): "temperature" or "conductivity"
+        sensor_prefix (str): Only sensors whose ID starts with this
+    """
+
+    def __init__(self, spec):
+        """
+        Args:
+            spec (dict): Rule definition (see the module docstring)
+
+        Raises:
+            ValueError: If the definition is incomplete or invalid
+        """
+        if not isinstance(spec, dict):
+            raise ValueError("Alert rules must be JSON objects")
+        self.name = spec.get("name")
+        self.type = spec.get("type")
+        self.field = spec.get("field")
+        self.sensor_prefix = spec.get("sensor_prefix", "")
+        if not self.name:
+            raise ValueError("Alert rule without a name")
+        if self.type not in RULE_TYPES:
+            raise ValueError(
+                f"Alert rule {self.name}: type must be one of {', '.join(RULE_TYPES)}"
+            )
+        if self.field not in FIELDS:
+            raise ValueError(
+                f"Alert rule {self.name}: field must be one of {', '.join(FIELDS)}"
+            )
+
+        try:
+            if self.type == "threshold":
+                self.above = _optional_float(spec.get("above"))
+                self.below = _optional_float(spec.get("below"))
+                if self.above is None and self.below is None:
+                    raise ValueError("needs above and/or below")
+            elif self.type == "rate":
+                self.max_rate = float(spec["max_rate"])
+                if self.max_rate <= 0:
+                    raise ValueError("max_rate must be positive")
+            else:
+                self.window = int(spec.get("window", 60))
+                self.threshold = float(spec.get("threshold", 4.0))
+                self.min_samples = int(spec.get("min_samples", self.window // 2))
+                if self.window < 2 or self.threshold <= 0:
+                    raise ValueError("needs window >= 2 and a positive threshold")
+                self.min_samples = min(max(self.min_samples, 2), self.window)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Alert rule {self.name}: {e}") from None
+
+    def applies_to(self, sensor_id):
+        return sensor_id.startswith(self.sensor_prefix)
+
+    def check(self, state, value, time_ns):
+        """
+        Evaluate one reading and update the rule's per-sensor state.
+
+        Args:
+            state (dict): This sensor's state, keyed by rule name
+            value (float): The reading's value of the rule's field
+            time_ns (int): The reading's time (epoch nanoseconds)
+
+        Returns:
+            dict: Details of the violation, or None
+        """
+        if self.type == "threshold":
+            if self.above is not None and value > self.above:
+                return {"above": self.above}
+            if self.below is not None and value < self.below:
+                return {"below": self.below}
+            return None
+
+        if self.type == "rate":
+            previous = state.get(self.name)
+            if previous is not None and time_ns <= previous[0]:
+                # Out-of-order reading; rates are taken between newer readings
+                return None
+            state[self.name] = (time_ns, value)
+            if previous is None:
+                return None
+            rate = (value - previous[1]) * NS_PER_SECOND / (time_ns - previous[0])
+            if abs(rate) > self.max_rate:
+                return {"rate": rate, "max_rate": self.max_rate}
+            return None
+
+        ring = state.get(self.name)
+        if ring is None:
+            ring = state[self.name] = _RingStats(self.window)
+        violation = None
+        if ring.count >= self.min_samples:
+            mean, stddev = ring.mean_stddev()
+            if stddev > 0:
+                zscore = (value - mean) / stddev
+                if abs(zscore) > self.threshold:
+                    violation = {
+                        "zscore": zscore,
+                        "mean": mean,
+                        "stddev": stddev,
+                        "threshold": self.threshold,
+                    }
+        ring.add(value)
+        return violation
+
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+
+def load_rules(path=RULES_PATH):
+    """
+    Read alert rules from a JSON file holding a list of rule objects.
+
+    Returns:
+        list: Rule objects (empty if no path is configured)
+
+    Raises:
+        ValueError: If the file cannot be read or a rule is invalid
+    """
+    if not path:
+        return []
+    try:
+        with open(path) as f:
+            specs = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read alert rules from {path}: {e}") from None
+    if not isinstance(specs, list):
+        raise ValueError(f"{path} must contain a JSON array of alert rules")
+
+    rules = [Rule(spec) for spec in specs]
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Alert rule names in {path} must be unique")
+    return rules
+
+
+class AlertEngine:
+    """
+    Evaluates ingested readings against alert rules and delivers the alerts.
+
+    Each process keeps its own per-sensor state (previous reading, z-score
+    rings), so like inline aggregation the engine expects all readings of
+    a sensor to reach the same API process.
+    """
+
+    def __init__(
+        self,
+        rules,
+        log_path=LOG_PATH,
+        webhook_url=WEBHOOK_URL,
+        cooldown=COOLDOWN,
+    ):
+        """
+        Args:
+            rules (list): Rule objects, e.g. from load_rules()
+            log_path (str): JSON-lines file alerts are appended to (optional)
+            webhook_url (str): URL alerts are POSTed to (optional)
+            cooldown (float): Seconds a (rule, sensor) pair stays quiet after
+                firing
+        """
+        self.rules_by_field = {field: [] for field in FIELDS}
+        for rule in rules:
+            self.rules_by_field[rule.field].append(rule)
+        self.rule_count = len(rules)
+        self.log_path = log_path
+        self.webhook_url = webhook_url
+        self.cooldown_ns = int(cooldown * NS_PER_SECOND)
+
+        # sensor_id -> {rule name: state}; (rule, sensor) -> last fired (ns)
+        self._states = {}
+        self._last_fired = {}
+        self._sequence = itertools.count(1)
+        self._recent = deque(maxlen=RECENT_ALERTS)
+        self._listeners = []
+        self._queue = queue.Queue(maxsize=MAX_QUEUED_ALERTS)
+        self._lock = threading.Lock()
+        self._stats = {
+            "readings": 0,
+            "alerts": 0,
+            "suppressed": 0,
+            "dropped": 0,
+            "delivery_errors": 0,
+        }
+
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._deliver_loop, name="alert-delivery", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Alerting enabled with {self.rule_count} rules")
+
+    def add_listener(self, listener):
+        """Call listener(alert) from the delivery thread for every alert."""
+        self._listeners.append(listener)
+
+    def evaluate(self, measurements):
+        """
+        Check accepted measurements against every rule.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id, timestamp,
+                temperature and conductivity keys
+        """
+        alerts = []
+        now_ns = time.time_ns()
+        with self._lock:
+            for measurement in measurements:
+                try:
+                    sensor_id = measurement["sensor_id"]
+                    time_ns = epoch_ns(measurement["timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self._stats["readings"] += 1
+                state = self._states.get(sensor_id)
+                if state is None:
+                    state = self._states[sensor_id] = {}
+
+                for field, rules in self.rules_by_field.items():
+                    if not rules:
+                        continue
+                    value = measurement.get(field)
+                    if not isinstance(value, (int, float)) or value != value:
+                        continue
+                    for rule in rules:
+                        if not rule.applies_to(sensor_id):
+                            continue
+                        violation = rule.check(state, float(value), time_ns)
+                        if violation is not None:
+                            alert = self._fire(rule, sensor_id, value, time_ns, now_ns)
+                            if alert:
+                                alert["detail"] = violation
+                                alerts.append(alert)
+
+        for alert in alerts:
+            try:
+                self._queue.put_nowait(alert)
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped"] += 1
+
+    def _fire(self, rule, sensor_id, value, time_ns, now_ns):
+        """Build an alert unless the (rule, sensor) pair is cooling down."""
+        key = (rule.name, sensor_id)
+        last = self._last_fired.get(key)
+        if last is not None and now_ns - last < self.cooldown_ns:
+            self._stats["suppressed"] += 1
+            return None
+        self._last_fired[key] = now_ns
+        self._stats["alerts"] += 1
+        return {
+            "id": next(self._sequence),
+            "rule": rule.name,
+            "type": rule.type,
+            "sensor_id": sensor_id,
+            "field": rule.field,
+            "value": value,
+            "timestamp": _isoformat(time_ns),
+            "detected_at": _isoformat(now_ns),
+        }
+
+    def _deliver_loop(self):
+        """Hand queued alerts to the sinks, batching whatever has piled up."""
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                return
+            while len(batch) < 1000:
+                try:
+                    alert = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if alert is None:
+                    self._deliver(batch)
+                    return
+                batch.append(alert)
+            self._deliver(batch)
+
+    def _deliver(self, alerts):
+        """Write alerts to the log file, webhook, recent list and listeners."""
+        with self._lock:
+            self._recent.extend(alerts)
+        for alert in alerts:
+            logger.warning(
+                f"Alert {alert['rule']}: {alert['sensor_id']} "
+                f"{alert['field']}={alert['value']} at {alert['timestamp']}"
+            )
+
+        if self.log_path:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.writelines(json.dumps(alert) + "\n" for alert in alerts)
+            except OSError as e:
+                self._delivery_error(f"Error writing alerts to {self.log_path}: {e}")
+
+        if self.webhook_url:
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=json.dumps(alerts).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            except Exception as e:
+                self._delivery_error(f"Error posting alerts to webhook: {e}")
+
+        for listener in self._listeners:
+            for alert in alerts:
+                try:
+                    listener(alert)
+                except Exception as e:
+                    self._delivery_error(f"Error in alert listener: {e}")
+
+    def _delivery_error(self, message):
+        logger.error(message)
+        with self._lock:
+            self._stats["delivery_errors"] += 1
+
+    def recent(self, after=0, limit=100):
+        """
+        Return delivered alerts with an id greater than `after`, oldest first.
+
+        Returns:
+            list: At most `limit` alert dictionaries
+        """
+        with self._lock:
+            alerts = [alert for alert in self._recent if alert["id"] > after]
+        return alerts[:limit]
+
+    def stats(self):
+        """Return alerting counters and the number of sensors with state."""
+        with self._lock:
+            return {
+                **self._stats,
+                "rules": self.rule_count,
+                "sensors": len(self._states),
+                "queued": self._queue.qsize(),
+            }
+
+    def close(self):
+        """Deliver the queued alerts and stop the delivery thread."""
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=10)
@@ -0,0 +1,492 @@
+"""
+In-process incremental aggregation.
+Keeps running per-sensor statistics and quantile sketches for the open
+windows of the finest rollup tiers as readings are ingested, writes each
+window to water_quality_<window> (and water_quality_<window>_sketch) once it
+closes, and serves the still-open windows directly, so fresh statistics need
+neither a task run nor a raw-data scan.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from influxdb_client import Point, WritePrecision
+from storage.flux_queries import FIELDS
+from storage.sketch import bucket_codes, bucket_tag, sketch_measurement
+from storage.statistics import field_statistics
+from utils.logger_config import setup_logging
+from utils.windows import NS_PER_SECOND, epoch_ns, parse_duration
+
+logger = setup_logging("incremental_aggregator")
+
+# "tasks" computes every rollup tier with InfluxDB tasks; "inline" computes
+# the tiers in INLINE_WINDOWS in the API process and leaves the rest to tasks
+AGGREGATION_MODE = os.getenv("AGGREGATION_MODE", "tasks")
+INLINE_WINDOWS = [
+    window.strip()
+    for window in os.getenv("AGGREGATION_INLINE_WINDOWS", "1m,5m").split(",")
+    if window.strip()
+]
+
+# Statistics written per closed window, matching the rollup tasks
+EMITTED_STATS = ("mean", "min", "max", "count", "sum", "sumsq")
+
+# Upper bound on emitted lines kept for retry while InfluxDB is unavailable
+MAX_PENDING_LINES = 100000
+
+
+def _isoformat(ns):
+    """Format epoch nanoseconds the way query results format window times."""
+    return datetime.fromtimestamp(ns // NS_PER_SECOND, tz=timezone.utc).isoformat()
+
+
+class _WindowState:
+    """
+    Accumulators for every open window of one length.
+
+    Each (sensor_id, window start) pair owns one row of a set of NumPy
+    arrays holding the reading count and, per field, the running mean, M2
+    (sum of squared deviations from the mean), min and max. Rows of closed
+    windows are reset and reused. Quantile sketches are kept per row as
+    {bucket code: [count per field]} (see storage/sketch.py).
+    """
+
+    def __init__(self, window, capacity=1024):
+        self.window = window
+        self.width_ns = parse_duration(window) * NS_PER_SECOND
+        self.slots = {}
+        self.free_rows = []
+        # Windows starting before this have been emitted and are closed
+        self.closed_before_ns = 0
+
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros((capacity, len(FIELDS)))
+        self.m2 = np.zeros((capacity, len(FIELDS)))
+        self.min = np.full((capacity, len(FIELDS)), np.inf)
+        self.max = np.full((capacity, len(FIELDS)), -np.inf)
+        self.sketches = {}
+
+    def _grow(self):
+        """Double the number of rows."""
+        extra = len(self.count)
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros((extra, len(FIELDS)))])
+        self.m2 = np.concatenate([self.m2, np.zeros((extra, len(FIELDS)))])
+        self.min = np.concatenate([self.min, np.full((extra, len(FIELDS)), np.inf)])
+        self.max = np.concatenate([self.max, np.full((extra, len(FIELDS)), -np.inf)])
+
+    def _row(self, key):
+        """Return the row of an open window, allocating one if needed."""
+        row = self.slots.get(key)
+        if row is None:
+            if self.free_rows:
+                row = self.free_rows.pop()
+            else:
+                row = len(self.slots)
+                if row == len(self.count):
+                    self._grow()
+            self.slots[key] = row
+        return row
+
+    def add(self, sensor_ids, times_ns, values):
+        """
+        Fold readings into their windows.
+
+        Readings are grouped by window and merged with the existing
+        accumulators using the parallel form of Welford's algorithm, so a
+        batch costs a handful of vectorized operations.
+
+        Args:
+            sensor_ids (list): Sensor ID per reading
+            times_ns (np.ndarray): int64 epoch nanoseconds per reading
+            values (np.ndarray): float64 array of shape (readings, fields)
+
+        Returns:
+            int: Number of readings dropped because their window was closed
+        """
+        starts = times_ns - times_ns % self.width_ns
+        open_mask = starts >= self.closed_before_ns
+        late = int(len(starts) - np.count_nonzero(open_mask))
+        if late:
+            starts = starts[open_mask]
+            values = values[open_mask]
+            sensor_ids = [s for s, keep in zip(sensor_ids, open_mask) if keep]
+        if not len(starts):
+            return late
+
+        rows = np.fromiter(
+            (self._row(key) for key in zip(sensor_ids, starts.tolist())),
+            dtype=np.int64,
+            count=len(starts),
+        )
+        unique, inverse = np.unique(rows, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        batch_count = np.bincount(inverse).astype(np.float64)
+        batch_mean = (
+            np.column_stack(
+                [np.bincount(inverse, weights=values[:, i]) for i in range(len(FIELDS))]
+            )
+            / batch_count[:, None]
+        )
+        deviations = values - batch_mean[inverse]
+        batch_m2 = np.column_stack(
+            [
+                np.bincount(inverse, weights=deviations[:, i] ** 2)
+                for i in range(len(FIELDS))
+            ]
+        )
+        batch_min = np.full(batch_mean.shape, np.inf)
+        batch_max = np.full(batch_mean.shape, -np.inf)
+        np.minimum.at(batch_min, inverse, values)
+        np.maximum.at(batch_max, inverse, values)
+
+        count = self.count[unique].astype(np.float64)
+        total = count + batch_count
+        delta = batch_mean - self.mean[unique]
+        self.mean[unique] += delta * (batch_count / total)[:, None]
+        self.m2[unique] += batch_m2 + delta**2 * (count * batch_count / total)[:, None]
+        self.count[unique] += batch_count.astype(np.int64)
+        self.min[unique] = np.minimum(self.min[unique], batch_min)
+        self.max[unique] = np.maximum(self.max[unique], batch_max)
+        self._add_to_sketches(rows, values)
+        return late
+
+    def _add_to_sketches(self, rows, values):
+        """Count readings into the bucket histograms of their rows."""
+        codes = bucket_codes(values)
+        finite = np.isfinite(values)
+        for field_index in range(len(FIELDS)):
+            keep = finite[:, field_index]
+            pairs, counts = np.unique(
+                np.column_stack([rows[keep], codes[keep, field_index]]),
+                axis=0,
+                return_counts=True,
+            )
+            for (row, code), count in zip(pairs.tolist(), counts.tolist()):
+                buckets = self.sketches.setdefault(row, {})
+                buckets.setdefault(code, [0] * len(FIELDS))[field_index] += count
+
+    def sketch(self, rows):
+        """Merge the sketches of the given rows into field -> {bucket tag: count}."""
+        merged = {field: {} for field in FIELDS}
+        for row in rows:
+            for code, counts in self.sketches.get(row, {}).items():
+                tag = bucket_tag(code)
+                for field, count in zip(FIELDS, counts):
+                    if count:
+                        merged[field][tag] = merged[field].get(tag, 0) + count
+        return merged
+
+    def statistics(self, rows):
+        """
+        Return every emitted statistic for the given rows.
+
+        Returns:
+            dict: stat_type -> float64 array of shape (rows, fields)
+        """
+        count = self.count[rows].astype(np.float64)[:, None]
+        mean = self.mean[rows]
+        return {
+            "mean": mean,
+            "min": self.min[rows],
+            "max": self.max[rows],
+            "count": np.repeat(count, len(FIELDS), axis=1),
+            "sum": mean * count,
+            "sumsq": self.m2[rows] + count * mean**2,
+        }
+
+    def close_before(self, boundary_ns):
+        """
+        Close every window that ends at or before boundary_ns.
+
+        Returns:
+            tuple: (keys, statistics, sketches) for the closed windows, where
+                keys are (sensor_id, start_ns) pairs, statistics is as
+                returned by statistics() and sketches holds each window's
+                {bucket code: [count per field]}
+        """
+        cutoff = boundary_ns - boundary_ns % self.width_ns
+        self.closed_before_ns = max(self.closed_before_ns, cutoff)
+
+        keys = [key for key in self.slots if key[1] < self.closed_before_ns]
+        rows = np.array([self.slots.pop(key) for key in keys], dtype=np.int64)
+        statistics = self.statistics(rows)
+        sketches = [self.sketches.pop(row, {}) for row in rows.tolist()]
+
+        self.count[rows] = 0
+        self.mean[rows] = 0.0
+        self.m2[rows] = 0.0
+        self.min[rows] = np.inf
+        self.max[rows] = -np.inf
+        self.free_rows.extend(rows.tolist())
+        return keys, statistics, sketches
+
+
+class IncrementalAggregator:
+    """
+    Streaming rollups for the finest aggregation tiers.
+
+    Readings are added as they are ingested. A background thread closes
+    windows once their end is `grace` seconds in the past and writes one
+    point per statistic (mean, min, max, count, sum, sumsq) to
+    water_quality_<window> and one point per sketch bucket to
+    water_quality_<window>_sketch, timestamped with the window end exactly
+    like the rollup tasks. Readings that arrive after their window was written
+    are counted as late and left to the backfill.
+
+    Each process keeps its own accumulators, so inline aggregation expects
+    all readings to reach a single API process.
+    """
+
+    def __init__(self, write_fn, windows=None, grace=2.0, tick_interval=0.5):
+        """
+        Args:
+            write_fn: Callable taking a list of line-protocol strings
+            windows (list): Windows to aggregate (default INLINE_WINDOWS)
+            grace (float): Seconds after a window ends before it is written
+            tick_interval (float): Seconds between checks for closed windows
+        """
+        self.write_fn = write_fn
+        self.grace = grace
+        self.tick_interval = tick_interval
+        self.states = {
+            window: _WindowState(window) for window in (windows or INLINE_WINDOWS)
+        }
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stats = {
+            "points": 0,
+            "late_points": 0,
+            "invalid_points": 0,
+            "windows_emitted": 0,
+            "emit_errors": 0,
+            "dropped_lines": 0,
+            "last_emit_latency_ms": None,
+        }
+
+        self._thread = threading.Thread(
+            target=self._run, name="incremental-aggregator", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f"Incremental aggregation enabled for windows: {', '.join(self.states)}"
+        )
+
+    def add(self, measurements):
+        """
+        Fold ingested measurements into the open windows.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id, timestamp,
+                temperature and conductivity keys
+        """
+        sensor_ids = []
+        times_ns = []
+        values = []
+        invalid = 0
+        for measurement in measurements:
+            try:
+                time_ns = epoch_ns(measurement["timestamp"])
+                row = [float(measurement[field]) for field in FIELDS]
+            except (KeyError, TypeError, ValueError):
+                invalid += 1
+                continue
+            sensor_ids.append(measurement["sensor_id"])
+            times_ns.append(time_ns)
+            values.append(row)
+
+        times_ns = np.array(times_ns, dtype=np.int64)
+        values = np.array(values, dtype=np.float64).reshape(-1, len(FIELDS))
+
+        with self._lock:
+            self._stats["invalid_points"] += invalid
+            if not sensor_ids:
+                return
+            self._stats["points"] += len(sensor_ids)
+            for state in self.states.values():
+                self._stats["late_points"] += state.add(sensor_ids, times_ns, values)
+
+    def _statistics_rows(self, sensor_id, window):
+        """Return (end_ns, statistics) for a sensor's open windows, newest first."""
+        state = self.states.get(window)
+        if state is None:
+            return []
+
+        with self._lock:
+            keys = sorted(
+                (key for key in state.slots if key[0] == sensor_id),
+                key=lambda key: key[1],
+                reverse=True,
+            )
+            rows = np.array([state.slots[key] for key in keys], dtype=np.int64)
+            statistics = state.statistics(rows)
+
+        return [
+            (
+                start_ns + state.width_ns,
+                {stat: statistics[stat][index].tolist() for stat in statistics},
+            )
+            for index, (_, start_ns) in enumerate(keys)
+        ]
+
+    def open_statistics(self, sensor_id, window):
+        """
+        Statistics for a sensor's still-open windows, newest first.
+
+        Rows have the same shape as stored statistics, timestamped with the
+        window end, plus "partial": True.
+        """
+        rows = []
+        for end_ns, statistics in self._statistics_rows(sensor_id, window):
+            row = {
+                "timestamp": _isoformat(end_ns),
+                "sensor_id": sensor_id,
+                "window": window,
+                "partial": True,
+            }
+            for index, field in enumerate(FIELDS):
+                row[field] = field_statistics(
+                    {
+                        f"{field}_{stat}": values[index]
+                        for stat, values in statistics.items()
+                    },
+                    field,
+                )
+            rows.append(row)
+        return rows
+
+    def open_aggregated(self, sensor_id, window):
+        """Mean values for a sensor's still-open windows, newest first."""
+        rows = []
+        for end_ns, statistics in self._statistics_rows(sensor_id, window):
+            row = {"timestamp": _isoformat(end_ns), "sensor_id": sensor_id}
+            for index, field in enumerate(FIELDS):
+                row[field] = statistics["mean"][index]
+            row["window"] = window
+            row["partial"] = True
+            rows.append(row)
+        return rows
+
+    def open_sketch(self, sensor_ids, window):
+        """
+        Quantile sketch of the given sensors' still-open windows, merged.
+
+        Returns:
+            dict: field -> {bucket tag: count}; empty counts if the window
+                is not aggregated inline
+        """
+        state = self.states.get(window)
+        if state is None:
+            return {field: {} for field in FIELDS}
+
+        sensor_ids = set(sensor_ids)
+        with self._lock:
+            rows = [row for key, row in state.slots.items() if key[0] in sensor_ids]
+            return state.sketch(rows)
+
+    def _lines(self, window, keys, statistics, sketches):
+        """
+        Serialize closed windows as line protocol: one point per statistic
+        and one point per sketch bucket.
+        """
+        width_ns = self.states[window].width_ns
+        lines = []
+        for index, (sensor_id, start_ns) in enumerate(keys):
+            for code, counts in sketches[index].items():
+                point = (
+                    Point(sketch_measurement(window))
+                    .tag("sensor_id", sensor_id)
+                    .tag("bucket", bucket_tag(code))
+                    .time(start_ns + width_ns, WritePrecision.NS)
+                )
+                for field, count in zip(FIELDS, counts):
+                    if count:
+                        point.field(field, float(count))
+                lines.append(point.to_line_protocol())
+            for stat in EMITTED_STATS:
+                point = (
+                    Point(f"water_quality_{window}")
+                    .tag("sensor_id", sensor_id)
+                    .tag("stat_type", stat)
+                    .time(start_ns + width_ns, WritePrecision.NS)
+                )
+                for field_index, field in enumerate(FIELDS):
+                    point.field(field, float(statistics[stat][index, field_index]))
+                lines.append(point.to_line_protocol())
+        return lines
+
+    def emit_closed(self, now=None, close_all=False):
+        """
+        Write every window that has closed (or all windows, when shutting down).
+
+        Lines that fail to write are kept and retried on the next call, up to
+        MAX_PENDING_LINES.
+        """
+        now = time.time() if now is None else now
+        boundary_ns = int((now - self.grace) * NS_PER_SECOND)
+
+        with self._lock:
+            lines = self._pending
+            self._pending = []
+            emitted = 0
+            for window, state in self.states.items():
+                if close_all:
+                    boundary_ns = max(
+                        [key[1] + state.width_ns for key in state.slots] or [0]
+                    )
+                keys, statistics, sketches = state.close_before(boundary_ns)
+                lines.extend(self._lines(window, keys, statistics, sketches))
+                emitted += len(keys)
+            self._stats["windows_emitted"] += emitted
+
+        if not lines:
+            return
+
+        started = time.monotonic()
+        try:
+            self.write_fn(lines)
+        except Exception as e:
+            logger.error(f"Error writing {len(lines)} aggregated points: {e}")
+            with self._lock:
+                self._stats["emit_errors"] += 1
+                self._pending = lines + self._pending
+                overflow = len(self._pending) - MAX_PENDING_LINES
+                if overflow > 0:
+                    self._pending = self._pending[overflow:]
+                    self._stats["dropped_lines"] += overflow
+            return
+
+        with self._lock:
+            self._stats["last_emit_latency_ms"] = round(
+                (time.monotonic() - started) * 1000, 2
+            )
+
+    def _run(self):
+        """Background loop closing windows every tick_interval seconds."""
+        while not self._stopped.wait(self.tick_interval):
+            try:
+                self.emit_closed()
+            except Exception as e:
+                logger.error(f"Error closing aggregation windows: {e}")
+
+    def stats(self):
+        """Return aggregation counters and the number of open windows per tier."""
+        with self._lock:
+            return {
+                **self._stats,
+                "open_windows": {
+                    window: len(state.slots) for window, state in self.states.items()
+                },
+                "pending_lines": len(self._pending),
+            }
+
+    def close(self):
+        """Stop the background thread and write every window, open or not."""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+        self.emit_closed(close_all=True)
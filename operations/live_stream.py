@@ -0,0 +1,202 @@
+"""
+In-process publish/subscribe for live readings and alerts.
+Dashboards used to poll GET /measurements/<sensor_id> for the latest
+readings. GET /stream instead subscribes to the sensors it wants and is
+pushed every reading this API process accepts for them, straight from the
+ingest path, plus the alerts raised for those sensors.
+
+Publishing only hands references to each matching subscriber's queue, so
+ingest pays one dictionary lookup per reading (nothing when no one is
+subscribed); JSON encoding happens on the subscriber's own thread. Each
+subscriber has a bounded queue: when a client reads slower than readings
+arrive, the readings that do not fit are dropped for that client only and
+it is told how many it missed, instead of buffering without limit or
+slowing down ingest.
+
+Subscribers only see readings posted to the same process, so with several
+API workers each stream carries that worker's share of the traffic.
+"""
+
+import os
+import queue
+import threading
+
+# Events buffered per subscriber before new ones are dropped for it
+QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "1000"))
+
+# Concurrent subscribers per process (each holds a server thread)
+MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "100"))
+
+
+class TooManySubscribersError(Exception):
+    """Raised when a process already serves MAX_SUBSCRIBERS streams."""
+
+
+class Subscription:
+    """
+    One subscriber's bounded event queue.
+
+    Events are (kind, payload) tuples, kind being "reading" or "alert".
+    """
+
+    def __init__(self, sensor_ids, alerts=True, queue_size=QUEUE_SIZE, notify=None):
+        self.sensor_ids = frozenset(sensor_ids)
+        self.alerts = alerts
+        self.closed = False
+        self.dropped = 0
+        # Called (on the publishing thread) after an event is queued, for
+        # consumers that wait on an event loop rather than in get()
+        self.notify = notify
+        self._queue = queue.Queue(maxsize=queue_size)
+
+    def offer(self, event):
+        """Queue an event without blocking; count it as dropped if full."""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self.notify:
+            self.notify()
+        return True
+
+    def get(self, timeout):
+        """
+        Wait for the next event.
+
+        Returns:
+            tuple: (kind, payload), or None if nothing arrived within
+                `timeout` seconds or the subscription was closed
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_nowait(self):
+        """Return the next event, or None if there is none (or it was closed)."""
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Wake a waiting get() and mark the subscription finished."""
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.notify:
+            self.notify()
+
+
+class LiveBroker:
+    """
+    Fans accepted readings and alerts out to the subscribers of each sensor.
+
+    The sensor -> subscribers index is replaced (copy-on-write) when a
+    client subscribes or leaves, so publish() reads it without locking.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscriptions = ()
+        self._by_sensor = {}
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, sensor_ids, alerts=True, notify=None):
+        """
+        Register a subscriber for the given sensors.
+
+        Args:
+            sensor_ids (list): Sensors whose readings (and alerts) to receive
+            alerts (bool): Also receive the alerts raised for these sensors
+            notify (callable): Called whenever an event is queued (optional)
+
+        Returns:
+            Subscription: The subscriber's queue; pass it to unsubscribe()
+
+        Raises:
+            TooManySubscribersError: If max_subscribers streams are open
+        """
+        subscription = Subscription(sensor_ids, alerts, self.queue_size, notify)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribersError(
+                    f"At most {self.max_subscribers} live subscribers per process"
+                )
+            self._subscriptions += (subscription,)
+            self._reindex()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber and fold its drop count into the totals."""
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+            self._stats["dropped"] += subscription.dropped
+            self._reindex()
+
+    def _reindex(self):
+        by_sensor = {}
+        for subscription in self._subscriptions:
+            for sensor_id in subscription.sensor_ids:
+                by_sensor[sensor_id] = by_sensor.get(sensor_id, ()) + (subscription,)
+        self._by_sensor = by_sensor
+
+    def publish(self, measurements):
+        """
+        Offer accepted readings to the subscribers of their sensors.
+
+        Args:
+            measurements (list): Validated measurement dictionaries; they are
+                shared with the subscribers and must not be modified afterwards
+        """
+        by_sensor = self._by_sensor
+        if not by_sensor:
+            return
+        published = delivered = 0
+        for measurement in measurements:
+            subscribers = by_sensor.get(measurement["sensor_id"])
+            if subscribers:
+                published += 1
+                event = ("reading", measurement)
+                for subscription in subscribers:
+                    delivered += subscription.offer(event)
+        if published:
+            with self._lock:
+                self._stats["published"] += published
+                self._stats["delivered"] += delivered
+
+    def publish_alert(self, alert):
+        """Offer an alert to the subscribers of its sensor (AlertEngine listener)."""
+        event = ("alert", alert)
+        for subscription in self._by_sensor.get(alert["sensor_id"], ()):
+            if subscription.alerts:
+                subscription.offer(event)
+
+    def stats(self):
+        """Return subscriber and fan-out counters."""
+        with self._lock:
+            subscriptions = self._subscriptions
+            return {
+                **self._stats,
+                "dropped": self._stats["dropped"]
+                + sum(s.dropped for s in subscriptions),
+                "subscribers": len(subscriptions),
+                "sensors": len(self._by_sensor),
+            }
+
+    def close(self):
+        """End every open stream (on worker shutdown)."""
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, ()
+            self._by_sensor = {}
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,234 @@
+"""
+Per-sensor ingest watermarks and late-data tracking.
+Rollups only see readings that arrive before their window is aggregated,
+so sensors that buffer offline and upload hours of data at once never
+reach them. The tracker records, per sensor, the newest reading seen (its
+watermark) and the time ranges of readings that arrived too late, so that
+`aggregation_tasks.py backfill --pending` can recompute exactly those windows.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from utils.logger_config import setup_logging
+from utils.windows import NS_PER_SECOND, ROLLUP_WINDOWS, epoch_ns, parse_duration
+
+logger = setup_logging("watermarks")
+
+# Shared by every API process and the backfill command
+STATE_PATH = os.getenv("AGGREGATION_STATE_PATH", "logs/aggregation_state.json")
+
+# Seconds between writes of newly recorded late ranges to the state file
+SAVE_INTERVAL = 5.0
+
+# Late ranges kept per sensor; beyond this the closest ranges are merged
+MAX_RANGES_PER_SENSOR = 64
+
+
+def merge_ranges(ranges, max_ranges=None):
+    """
+    Merge overlapping or touching [start_ns, end_ns) ranges.
+
+    Args:
+        ranges (list): [start_ns, end_ns] pairs in any order
+        max_ranges (int): If given, keep merging the ranges separated by the
+            smallest gap until at most this many remain
+
+    Returns:
+        list: Sorted, non-overlapping [start_ns, end_ns] pairs
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    while max_ranges and len(merged) > max_ranges:
+        gaps = [merged[i + 1][0] - merged[i][1] for i in range(len(merged) - 1)]
+        i = gaps.index(min(gaps))
+        merged[i : i + 2] = [[merged[i][0], merged[i + 1][1]]]
+    return merged
+
+
+class WatermarkTracker:
+    """
+    Tracks per-sensor watermarks and the ranges of late readings.
+
+    A reading is late when its rollup window (of the finest tier) ended
+    more than `lateness` seconds before it was ingested, i.e. after the
+    aggregation task or inline aggregator has already written that window.
+
+    Late ranges are kept in memory and merged into the state file at most
+    every SAVE_INTERVAL seconds (and on save()). The file is updated under
+    an exclusive lock, so several API processes and the backfill command
+    can share it.
+    """
+
+    def __init__(self, path=STATE_PATH, window=None, lateness=None):
+        """
+        Args:
+            path (str): JSON state file
+            window (str): Window late ranges are aligned to (default: finest tier)
+            lateness (float): Seconds after a window ends before readings for
+                it are late (default: one window, the lag of the rollup task)
+        """
+        self.path = path
+        window_seconds = parse_duration(window or ROLLUP_WINDOWS[0])
+        self.width_ns = window_seconds * NS_PER_SECOND
+        self.lateness_ns = int(
+            (window_seconds if lateness is None else lateness) * NS_PER_SECOND
+        )
+
+        self.watermarks = {}
+        self._late_ranges = {}
+        self._generation = (None, 0)
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"observed": 0, "late_points": 0, "save_errors": 0}
+
+    def observe(self, measurements, now=None):
+        """
+        Record ingested measurements, advancing watermarks and noting late ones.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id and timestamp keys
+            now (float): Ingest time in epoch seconds (default: current time)
+        """
+        now_ns = int((time.time() if now is None else now) * NS_PER_SECOND)
+        cutoff_ns = now_ns - self.lateness_ns
+        save = False
+
+        with self._lock:
+            for measurement in measurements:
+                try:
+                    sensor_id = measurement["sensor_id"]
+                    time_ns = epoch_ns(measurement["timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                self._stats["observed"] += 1
+                if time_ns > self.watermarks.get(sensor_id, 0):
+                    self.watermarks[sensor_id] = time_ns
+
+                start_ns = time_ns - time_ns % self.width_ns
+                if start_ns + self.width_ns <= cutoff_ns:
+                    self._stats["late_points"] += 1
+                    ranges = self._late_ranges.setdefault(sensor_id, [])
+                    if not ranges or ranges[-1] != [start_ns, start_ns + self.width_ns]:
+                        ranges.append([start_ns, start_ns + self.width_ns])
+
+            for sensor_id, ranges in self._late_ranges.items():
+                if len(ranges) > MAX_RANGES_PER_SENSOR:
+                    self._late_ranges[sensor_id] = merge_ranges(
+                        ranges, MAX_RANGES_PER_SENSOR
+                    )
+
+            if self._late_ranges and (
+                time.monotonic() - self._last_save >= SAVE_INTERVAL
+            ):
+                save = True
+
+        if save:
+            self.save()
+
+    @contextmanager
+    def _locked_state(self):
+        """Load the state file under an exclusive lock; yields a dict to update."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = {"watermarks": {}, "late_ranges": {}}
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        state.update(json.load(f))
+                yield state
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        """Merge watermarks and recorded late ranges into the state file."""
+        with self._lock:
+            late_ranges = self._late_ranges
+            watermarks = dict(self.watermarks)
+            self._late_ranges = {}
+            self._last_save = time.monotonic()
+
+        try:
+            with self._locked_state() as state:
+                for sensor_id, time_ns in watermarks.items():
+                    state["watermarks"][sensor_id] = max(
+                        time_ns, state["watermarks"].get(sensor_id, 0)
+                    )
+                for sensor_id, ranges in late_ranges.items():
+                    state["late_ranges"][sensor_id] = merge_ranges(
+                        state["late_ranges"].get(sensor_id, []) + ranges,
+                        MAX_RANGES_PER_SENSOR,
+                    )
+        except Exception as e:
+            logger.error(f"Error saving aggregation state to {self.path}: {e}")
+            with self._lock:
+                self._stats["save_errors"] += 1
+                for sensor_id, ranges in late_ranges.items():
+                    self._late_ranges.setdefault(sensor_id, []).extend(ranges)
+
+    def take_pending(self):
+        """
+        Remove and return every recorded late range from the state file.
+
+        Returns:
+            dict: sensor_id -> list of [start_ns, end_ns] ranges
+        """
+        self.save()
+        with self._locked_state() as state:
+            pending = state["late_ranges"]
+            state["late_ranges"] = {}
+        return pending
+
+    def restore_pending(self, late_ranges):
+        """Put late ranges back (e.g. after a failed backfill)."""
+        with self._lock:
+            for sensor_id, ranges in late_ranges.items():
+                self._late_ranges.setdefault(sensor_id, []).extend(ranges)
+        self.save()
+
+    def generation(self):
+        """
+        Return the rollup generation, bumped whenever a backfill rewrites windows.
+
+        The state file is only re-read when it has been modified.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime != self._generation[0]:
+            with open(self.path) as f:
+                self._generation = (mtime, json.load(f).get("generation", 0))
+        return self._generation[1]
+
+    def bump_generation(self):
+        """Record that stored rollups were rewritten (invalidates query caches)."""
+        with self._locked_state() as state:
+            state["generation"] = state.get("generation", 0) + 1
+
+    def stats(self):
+        """Return watermark counters and the number of unsaved late ranges."""
+        with self._lock:
+            return {
+                **self._stats,
+                "sensors": len(self.watermarks),
+                "unsaved_late_ranges": sum(map(len, self._late_ranges.values())),
+            }
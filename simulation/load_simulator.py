@@ -0,0 +1,412 @@
+"""
+load_simulator.py
+Drives thousands of virtual water quality sensors against the ingest API at a
+fixed aggregate rate, for load-testing before a release.
+
+Readings are scheduled by a token bucket, so the send rate stays at --rate no
+matter how many sensors are simulated, and are sent over a pool of keep-alive
+connections, either one per request or in batches. Each sensor follows a
+profile (drift, noise, dropouts, offline buffering with burst upload).
+Sent/acked/failed counts and latency percentiles are printed every second.
+
+Usage:
+python -m simulation.load_simulator --sensors 10000 --rate 5000 --batch-size 100
+Requirements:
+pip install aiohttp numpy
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+import aiohttp
+import numpy as np
+from utils.logger_config import setup_logging
+from utils.config import (
+    API_URL,
+    CONDUCTIVITY_RANGE,
+    LOAD_CONNECTIONS,
+    LOAD_RATE,
+    LOAD_SENSORS,
+    TEMP_RANGE,
+)
+
+logger = setup_logging("load_simulator")
+
+# Per-profile behaviour:
+# - noise: standard deviation as a fraction of the value range
+# - drift: change per hour as a fraction of the value range
+# - dropout: probability that a reading is silently lost
+# - offline_rate: probability per second of going offline
+# - offline_seconds: (min, max) length of an offline period; readings are
+#   buffered on the sensor and uploaded in one burst when it reconnects
+PROFILES = {
+    "steady": {
+        "noise": 0.01,
+        "drift": 0.0,
+        "dropout": 0.0,
+        "offline_rate": 0.0,
+        "offline_seconds": (0, 0),
+    },
+    "drifting": {
+        "noise": 0.02,
+        "drift": 0.05,
+        "dropout": 0.0,
+        "offline_rate": 0.0,
+        "offline_seconds": (0, 0),
+    },
+    "flaky": {
+        "noise": 0.05,
+        "drift": 0.0,
+        "dropout": 0.05,
+        "offline_rate": 0.0,
+        "offline_seconds": (0, 0),
+    },
+    "offline": {
+        "noise": 0.02,
+        "drift": 0.0,
+        "dropout": 0.0,
+        "offline_rate": 0.002,
+        "offline_seconds": (30, 600),
+    },
+}
+
+# Share of sensors per profile for --profile mixed
+MIXED_WEIGHTS = {"steady": 0.7, "drifting": 0.1, "flaky": 0.1, "offline": 0.1}
+
+# Seconds between scheduler ticks
+TICK_SECONDS = 0.01
+
+# Readings per request when a reconnecting sensor uploads its buffer
+BURST_BATCH_SIZE = 1000
+
+
+class SensorFleet:
+    """
+    State of every virtual sensor, held in NumPy arrays.
+
+    Sensors are read round-robin, so with S sensors and an aggregate rate R
+    each sensor reports every S / R seconds.
+    """
+
+    def __init__(self, count, profile):
+        names = list(PROFILES)
+        if profile == "mixed":
+            weights = [MIXED_WEIGHTS[name] for name in names]
+            self.profile_index = np.random.choice(len(names), size=count, p=weights)
+        else:
+            self.profile_index = np.full(count, names.index(profile))
+
+        def param(key):
+            return np.array([PROFILES[name][key] for name in names])[self.profile_index]
+
+        self.sensor_ids = [f"load_{i:06d}" for i in range(count)]
+        self.noise = param("noise")
+        self.drift = param("drift") * np.random.choice([-1.0, 1.0], size=count)
+        self.dropout = param("dropout")
+        self.offline_rate = param("offline_rate")
+        self.offline_min = param("offline_seconds")[:, 0]
+        self.offline_max = param("offline_seconds")[:, 1]
+
+        self.temp_base = np.random.uniform(*TEMP_RANGE, size=count)
+        self.cond_base = np.random.uniform(*CONDUCTIVITY_RANGE, size=count)
+        self.offline_until = np.zeros(count)
+        self.buffers = {}
+        self.cursor = 0
+        self.started = time.time()
+
+    def __len__(self):
+        return len(self.sensor_ids)
+
+    def update_connectivity(self, now, elapsed):
+        """
+        Take sensors offline at random and collect the buffers of those back online.
+
+        Returns:
+            list: Buffered readings lists, one per reconnected sensor
+        """
+        online = self.offline_until <= now
+        going_offline = online & (
+            np.random.random(len(self)) < self.offline_rate * elapsed
+        )
+        for i in np.flatnonzero(going_offline):
+            self.offline_until[i] = now + random.uniform(
+                self.offline_min[i], self.offline_max[i]
+            )
+
+        bursts = []
+        for i in list(self.buffers):
+            if self.offline_until[i] <= now:
+                bursts.append(self.buffers.pop(i))
+        return bursts
+
+    def readings(self, n, now):
+        """
+        Generate the next n readings in round-robin order.
+
+        Returns:
+            tuple: (measurement dicts to send now, number of dropped-out
+                readings); readings of offline sensors are buffered instead
+        """
+        index = (self.cursor + np.arange(n)) % len(self)
+        self.cursor = int((self.cursor + n) % len(self))
+
+        hours = (now - self.started) / 3600.0
+        temp_span = TEMP_RANGE[1] - TEMP_RANGE[0]
+        cond_span = CONDUCTIVITY_RANGE[1] - CONDUCTIVITY_RANGE[0]
+        noise = np.random.standard_normal((2, n)) * self.noise[index]
+        temperature = self.temp_base[index] + temp_span * (
+            self.drift[index] * hours + noise[0]
+        )
+        conductivity = self.cond_base[index] + cond_span * (
+            self.drift[index] * hours + noise[1]
+        )
+
+        kept = np.random.random(n) >= self.dropout[index]
+        offline = self.offline_until[index] > now
+        timestamp = datetime.fromtimestamp(now, tz=timezone.utc).strftime(
+            "%Y-%m-%dT%H:%M:%S.%fZ"
+        )
+
+        readings = []
+        for sensor, temp, cond, keep, away in zip(
+            index.tolist(),
+            temperature.round(2).tolist(),
+            conductivity.round(1).tolist(),
+            kept.tolist(),
+            offline.tolist(),
+        ):
+            if not keep:
+                continue
+            reading = {
+                "sensor_id": self.sensor_ids[sensor],
+                "timestamp": timestamp,
+                "temperature": temp,
+                "conductivity": cond,
+            }
+            if away:
+                self.buffers.setdefault(sensor, []).append(reading)
+            else:
+                readings.append(reading)
+        return readings, n - int(np.count_nonzero(kept))
+
+
+class LoadStats:
+    """Counters and latency samples for the live readout."""
+
+    def __init__(self):
+        self.generated = 0
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.throttled = 0
+        self.dropped = 0
+        self.latencies = []
+        self.started = time.monotonic()
+        self._last = (self.started, 0, 0)
+
+    def readout(self, queue_depth, offline_sensors):
+        """Format one status line and reset the latency samples."""
+        now = time.monotonic()
+        last_time, last_sent, last_acked = self._last
+        interval = max(now - last_time, 1e-9)
+        self._last = (now, self.sent, self.acked)
+
+        if self.latencies:
+            p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99])
+            latency = f"p50 {p50:.1f}ms p95 {p95:.1f}ms p99 {p99:.1f}ms"
+        else:
+            latency = "no responses"
+        self.latencies = []
+
+        return (
+            f"sent {(self.sent - last_sent) / interval:,.0f}/s "
+            f"acked {(self.acked - last_acked) / interval:,.0f}/s | "
+            f"total sent {self.sent:,} acked {self.acked:,} failed {self.failed:,} "
+            f"throttled {self.throttled:,} dropped {self.dropped:,} | "
+            f"{latency} | queue {queue_depth} offline {offline_sensors}"
+        )
+
+
+async def produce(fleet, queue, stats, rate, batch_size, duration):
+    """
+    Token-bucket scheduler: generate exactly `rate` readings per second.
+
+    Readings are grouped into payloads of `batch_size` and put on the send
+    queue. When the senders cannot keep up the queue fills and the producer
+    waits, so the readout shows the achieved rather than the target rate.
+    """
+    started = time.monotonic()
+    last_tick = started
+    pending = []
+
+    while duration is None or time.monotonic() - started < duration:
+        now = time.monotonic()
+        due = int(rate * (now - started)) - stats.generated
+        wall_clock = time.time()
+
+        for burst in fleet.update_connectivity(wall_clock, now - last_tick):
+            for i in range(0, len(burst), BURST_BATCH_SIZE):
+                await queue.put(burst[i : i + BURST_BATCH_SIZE])
+        last_tick = now
+
+        if due > 0:
+            stats.generated += due
+            readings, dropped = fleet.readings(due, wall_clock)
+            stats.dropped += dropped
+            pending.extend(readings)
+            while len(pending) >= batch_size:
+                await queue.put(pending[:batch_size])
+                pending = pending[batch_size:]
+
+        await asyncio.sleep(TICK_SECONDS)
+
+    if pending:
+        await queue.put(pending)
+
+
+async def post_payload(session, payload, stats, url, batch_url):
+    """
+    Post one payload, waiting out 503 backpressure responses.
+
+    Returns:
+        int: Number of readings the API accepted
+    """
+    single = len(payload) == 1
+    while True:
+        started = time.perf_counter()
+        async with session.post(
+            url if single else batch_url,
+            json=payload[0] if single else payload,
+        ) as response:
+            body = await response.json(content_type=None)
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+
+            if response.status != 503:
+                if single:
+                    return 1 if response.status == 201 else 0
+                return body.get("accepted", 0) if isinstance(body, dict) else 0
+
+            stats.throttled += len(payload)
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+
+async def send(session, queue, stats, url, batch_url):
+    """Sender worker: post payloads from the queue over the shared session."""
+    while True:
+        payload = await queue.get()
+        try:
+            accepted = await post_payload(session, payload, stats, url, batch_url)
+            stats.acked += accepted
+            stats.failed += len(payload) - accepted
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            stats.failed += len(payload)
+            logger.debug(f"Request failed: {e}")
+        finally:
+            stats.sent += len(payload)
+            queue.task_done()
+
+
+async def report(fleet, queue, stats, interval):
+    """Print the live readout every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        offline = int(np.count_nonzero(fleet.offline_until > time.time()))
+        logger.info(stats.readout(queue.qsize(), offline))
+
+
+async def run(args):
+    """Run the simulator until --duration elapses or it is interrupted."""
+    fleet = SensorFleet(args.sensors, args.profile)
+    stats = LoadStats()
+    queue = asyncio.Queue(maxsize=args.connections * 4)
+
+    connector = aiohttp.TCPConnector(limit=args.connections, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        senders = [
+            asyncio.create_task(
+                send(session, queue, stats, args.url, args.url + "/batch")
+            )
+            for _ in range(args.connections)
+        ]
+        reporter = asyncio.create_task(
+            report(fleet, queue, stats, args.report_interval)
+        )
+        try:
+            await produce(
+                fleet, queue, stats, args.rate, args.batch_size, args.duration
+            )
+            await queue.join()
+        finally:
+            for task in senders + [reporter]:
+                task.cancel()
+
+    logger.info("-" * 60)
+    logger.info(stats.readout(0, 0))
+    elapsed = time.monotonic() - stats.started
+    logger.info(
+        f"Finished: {stats.acked:,} readings acknowledged in {elapsed:.1f}s "
+        f"({stats.acked / elapsed:,.0f}/s)"
+    )
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Load-test the ingest API")
+    parser.add_argument(
+        "--sensors", type=int, default=LOAD_SENSORS, help="Virtual sensors"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=LOAD_RATE, help="Aggregate readings per second"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Readings per request (1 uses POST /measurements, more uses /batch)",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=LOAD_CONNECTIONS,
+        help="Concurrent keep-alive connections",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES) + ["mixed"],
+        default="mixed",
+        help="Sensor behaviour profile",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=None, help="Seconds to run (default: forever)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="Request timeout in seconds"
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=1.0, help="Seconds between readouts"
+    )
+    parser.add_argument("--url", default=API_URL, help="Measurements endpoint")
+    return parser.parse_args()
+
+
+def main():
+    """Run the load simulator from the command line."""
+    args = parse_args()
+    logger.info("Starting load simulator...")
+    logger.info(f"Sending data to: {args.url}")
+    logger.info(
+        f"Simulating {args.sensors:,} sensors ({args.profile}) at {args.rate:,.0f} "
+        f"readings/s, batch size {args.batch_size}, {args.connections} connections"
+    )
+    logger.info("-" * 60)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        logger.info("Stopping load simulator...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""
+Asyncio client for InfluxDB, mirroring the reads and writes of InfluxDBClient.
+Queries and writes go through the library's async APIs over one shared
+aiohttp connection pool, so a single event loop can keep hundreds of
+queries in flight without a thread per request. A semaphore bounds how many
+run at once (INFLUXDB_ASYNC_MAX_CONCURRENCY); the rest wait on the loop.
+
+Requirements:
+pip install "influxdb-client[async]"
+"""
+
+import asyncio
+import os
+from storage.columnar import to_rows
+from storage.flux_queries import FIELDS
+from storage.influx_client import (
+    FluxQueries,
+    _add_sketch_record,
+    _aggregated_row,
+    _measurement_line,
+    _measurement_row,
+    _statistics_row,
+)
+from storage.pagination import page_bounds, read_page_async
+from storage.query_cache import QueryCache
+from utils.logger_config import setup_logging
+
+try:
+    from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+except ImportError:
+    InfluxDBClientAsync = None
+
+logger = setup_logging("influx_db_client")
+
+ASYNC_AVAILABLE = InfluxDBClientAsync is not None
+
+
+class AsyncInfluxDBClient(FluxQueries):
+    """
+    Async client for interacting with InfluxDB.
+
+    The underlying connection pool is bound to an event loop, so it is
+    created on first use inside the loop that will run the queries; use one
+    instance per loop and `await close()` before the loop stops.
+    """
+
+    def __init__(self, query_cache=None, hot_tail=None):
+        """
+        Args:
+            query_cache (QueryCache): Cache for aggregated/statistics reads,
+                e.g. the sync client's so both share hits. If None, one is
+                created from QUERY_CACHE_MB (0 disables).
+            hot_tail (HotTail): Recent raw readings to answer raw reads from,
+                e.g. the sync client's, which the API writes through
+
+        Raises:
+            ImportError: If the async extras (aiohttp) are not installed
+        """
+        if not ASYNC_AVAILABLE:
+            raise ImportError(
+                'AsyncInfluxDBClient requires "influxdb-client[async]" (aiohttp)'
+            )
+
+        self.url = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+        self.token = os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token")
+        self.org = os.getenv("INFLUXDB_ORG", "aquatic-labs")
+        self.bucket = os.getenv("INFLUXDB_BUCKET", "water-quality")
+
+        # Connections kept open to InfluxDB, and queries/writes run at once
+        self.pool_size = int(os.getenv("INFLUXDB_ASYNC_POOL_SIZE", "100"))
+        self.max_concurrency = int(os.getenv("INFLUXDB_ASYNC_MAX_CONCURRENCY", "256"))
+        self.max_sensors_per_query = int(
+            os.getenv("INFLUXDB_MAX_SENSORS_PER_QUERY", "100")
+        )
+
+        self.query_cache = query_cache
+        if query_cache is None:
+            cache_mb = float(os.getenv("QUERY_CACHE_MB", "64"))
+            if cache_mb > 0:
+                self.query_cache = QueryCache(
+                    max_bytes=int(cache_mb * 1024 * 1024),
+                    block_windows=int(os.getenv("QUERY_CACHE_BLOCK_WINDOWS", "360")),
+                )
+
+        self.hot_tail = hot_tail
+
+        self.client = None
+        self._slots = None
+        self._stats = {"queries": 0, "writes": 0, "waiting": 0, "in_flight": 0}
+
+        logger.info("Async InfluxDB Client initialized:")
+        logger.info(f"  URL: {self.url}")
+        logger.info(f"  Pool size: {self.pool_size}")
+        logger.info(f"  Max concurrency: {self.max_concurrency}")
+
+    def _connect(self):
+        """Create the client and concurrency limit in the running loop."""
+        if self.client is None:
+            self.client = InfluxDBClientAsync(
+                url=self.url,
+                token=self.token,
+                org=self.org,
+                connection_pool_maxsize=self.pool_size,
+            )
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self.client
+
+    async def _acquire(self):
+        """Wait for a free concurrency slot."""
+        self._connect()
+        self._stats["waiting"] += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._stats["waiting"] -= 1
+        self._stats["in_flight"] += 1
+
+    def _release(self):
+        self._stats["in_flight"] -= 1
+        self._slots.release()
+
+    async def _stream(self, flux, to_row):
+        """Yield converted rows of a (query, params) pair while holding a slot."""
+        query, params = flux
+        await self._acquire()
+        try:
+            self._stats["queries"] += 1
+            records = await self.client.query_api().query_stream(
+                query, org=self.org, params=params
+            )
+            async for record in records:
+                yield to_row(record)
+        finally:
+            self._release()
+
+    async def _rows(self, flux, to_row):
+        return [row async for row in self._stream(flux, to_row)]
+
+    def _hot_rows(self, sensor_id, start_time, end_time, limit):
+        """Raw read answered from the hot tail, or None if it must be queried."""
+        if not self.hot_tail:
+            return None
+        columns = self.hot_tail.read_columns(sensor_id, start_time, end_time, limit)
+        return None if columns is None else to_rows(columns, sensor_id=sensor_id)
+
+    async def _iter_rows(self, rows):
+        for row in rows:
+            yield row
+
+    async def write_lines(self, lines):
+        """
+        Write pre-serialized line-protocol points.
+
+        Raises:
+            Exception: Write errors are propagated to the caller
+        """
+        await self._acquire()
+        try:
+            self._stats["writes"] += 1
+            await self.client.write_api().write(
+                bucket=self.bucket, record="\n".join(lines)
+            )
+        finally:
+            self._release()
+
+    async def write_measurement(self, sensor_id, timestamp, temperature, conductivity):
+        """
+        Write a sensor measurement to InfluxDB.
+
+        Returns:
+            bool: True if the point was written
+        """
+        try:
+            line = _measurement_line(sensor_id, timestamp, temperature, conductivity)
+            await self.write_lines([line])
+            if self.hot_tail:
+                self.hot_tail.add(sensor_id, timestamp, temperature, conductivity)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error writing to InfluxDB: {e}")
+            return False
+
+    async def write_measurements_bulk(self, measurements):
+        """
+        Write many sensor measurements to InfluxDB in a single request.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id, timestamp,
+                temperature and conductivity keys
+
+        Returns:
+            list: One entry per measurement, None if it was written or an
+                error message if it was rejected
+        """
+        errors = [None] * len(measurements)
+        lines = []
+        line_indexes = []
+
+        for index, measurement in enumerate(measurements):
+            try:
+                lines.append(
+                    _measurement_line(
+                        measurement["sensor_id"],
+                        measurement["timestamp"],
+                        measurement["temperature"],
+                        measurement["conductivity"],
+                    )
+                )
+                line_indexes.append(index)
+            except Exception as e:
+                errors[index] = str(e)
+
+        if not lines:
+            return errors
+
+        try:
+            await self.write_lines(lines)
+        except Exception as e:
+            logger.error(f"Error bulk writing {len(lines)} points to InfluxDB: {e}")
+            for index in line_indexes:
+                errors[index] = "Failure"
+            return errors
+
+        if self.hot_tail:
+            self.hot_tail.add_many(measurements[index] for index in line_indexes)
+        return errors
+
+    async def _read_many(self, sensor_ids, build_query, to_row):
+        """
+        Run a multi-sensor read and group the resulting rows by sensor.
+
+        Sensor lists longer than max_sensors_per_query are split into chunks
+        that are queried concurrently (bounded by the concurrency limit).
+
+        Returns:
+            dict: sensor_id -> list of rows, with an entry for every requested sensor
+        """
+        results = {sensor_id: [] for sensor_id in sensor_ids}
+        unique_ids = list(results)
+        chunks = [
+            unique_ids[i : i + self.max_sensors_per_query]
+            for i in range(0, len(unique_ids), self.max_sensors_per_query)
+        ]
+
+        chunk_rows = await asyncio.gather(
+            *(self._rows(build_query(chunk), to_row) for chunk in chunks)
+        )
+        for rows in chunk_rows:
+            for row in rows:
+                results.setdefault(row["sensor_id"], []).append(row)
+        return results
+
+    def iter_measurements(self, sensor_id, start_time=None, end_time=None, limit=100):
+        """
+        Stream measurements for a specific sensor, newest first.
+
+        Returns:
+            An async iterator of measurement dictionaries; query errors are
+            raised while iterating
+        """
+        rows = self._hot_rows(sensor_id, start_time, end_time, limit)
+        if rows is not None:
+            return self._iter_rows(rows)
+        flux = self._measurements_query([sensor_id], start_time, end_time, limit)
+        return self._stream(flux, _measurement_row)
+
+    async def read_measurements(
+        self, sensor_id, start_time=None, end_time=None, limit=100
+    ):
+        """
+        Read measurements from InfluxDB for a specific sensor.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            limit (int): A limit for the number of returned measurements
+
+        Returns:
+            list: List of measurement dictionaries, newest first
+        """
+        try:
+            rows = self._hot_rows(sensor_id, start_time, end_time, limit)
+            if rows is not None:
+                return rows
+            flux = self._measurements_query([sensor_id], start_time, end_time, limit)
+            return await self._rows(flux, _measurement_row)
+
+        except Exception as e:
+            logger.error(f"Error reading from InfluxDB: {e}")
+            return []
+
+    async def read_measurements_page(
+        self, sensor_id, start_time=None, end_time=None, limit=100, cursor=None
+    ):
+        """
+        Read one page of measurements, newest first (see storage/pagination.py).
+
+        Returns:
+            tuple: (measurements, cursor of the next page or None)
+
+        Raises:
+            ValueError: If a time bound or the cursor cannot be parsed
+            Exception: Query errors are propagated to the caller
+        """
+
+        async def fetch(lower_ns, upper_ns, count):
+            rows = self._hot_rows(sensor_id, lower_ns, upper_ns, count)
+            if rows is not None:
+                return rows
+            flux = self._measurements_query([sensor_id], lower_ns, upper_ns, count)
+            return await self._rows(flux, _measurement_row)
+
+        return await read_page_async(
+            fetch, *page_bounds(start_time, end_time, cursor), limit
+        )
+
+    async def read_measurements_many(
+        self, sensor_ids, start_time=None, end_time=None, limit=100
+    ):
+        """
+        Read raw measurements for several sensors with one query per chunk.
+
+        Returns:
+            dict: sensor_id -> list of measurement dictionaries, newest first
+        """
+        try:
+            return await self._read_many(
+                sensor_ids,
+                lambda chunk: self._measurements_query(
+                    chunk, start_time, end_time, limit
+                ),
+                _measurement_row,
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading multiple sensors from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    async def list_sensors(self):
+        """Get a list of all sensors with raw measurements in the bucket."""
+        try:
+            sensors = await self._rows(
+                self._sensors_query(), lambda record: record.get_value()
+            )
+            return sorted({sensor_id for sensor_id in sensors if sensor_id})
+
+        except Exception as e:
+            logger.error(f"Error listing sensors from InfluxDB: {e}")
+            return []
+
+    def iter_aggregated_measurements(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """Stream pre-computed mean values for a sensor, newest first."""
+        flux = self._aggregated_query([sensor_id], start_time, end_time, window)
+        return self._stream(flux, lambda record: _aggregated_row(record, window))
+
+    async def read_aggregated_measurements(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed aggregated measurements from InfluxDB.
+
+        Reads from the water_quality_<window> rollup, through the query cache
+        when it is enabled.
+
+        Returns:
+            list: List of aggregated measurement dictionaries (mean values)
+        """
+
+        async def fetch(start, stop):
+            flux = self._aggregated_query([sensor_id], start, stop, window)
+            return await self._rows(
+                flux, lambda record: _aggregated_row(record, window)
+            )
+
+        try:
+            if self.query_cache:
+                return await self.query_cache.read_async(
+                    "aggregated", sensor_id, window, start_time, end_time, fetch
+                )
+            return await fetch(start_time, end_time)
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated data from InfluxDB: {e}")
+            return []
+
+    async def read_aggregated_measurements_many(
+        self, sensor_ids, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed mean values for several sensors.
+
+        Returns:
+            dict: sensor_id -> list of aggregated measurement dictionaries
+        """
+        try:
+            return await self._read_many(
+                sensor_ids,
+                lambda chunk: self._aggregated_query(
+                    chunk, start_time, end_time, window
+                ),
+                lambda record: _aggregated_row(record, window),
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated data from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    def iter_aggregated_statistics(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """Stream pre-computed statistics for a sensor, newest window first."""
+        flux = self._statistics_query([sensor_id], start_time, end_time, window)
+        return self._stream(flux, lambda record: _statistics_row(record, window))
+
+    async def read_aggregated_statistics(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read detailed pre-computed statistics (mean, min, max, count, stddev).
+
+        Reads from the water_quality_<window> rollup, through the query cache
+        when it is enabled.
+
+        Returns:
+            list: List of statistical aggregations per time window
+        """
+
+        async def fetch(start, stop):
+            flux = self._statistics_query([sensor_id], start, stop, window)
+            return await self._rows(
+                flux, lambda record: _statistics_row(record, window)
+            )
+
+        try:
+            if self.query_cache:
+                return await self.query_cache.read_async(
+                    "statistics", sensor_id, window, start_time, end_time, fetch
+                )
+            return await fetch(start_time, end_time)
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated statistics from InfluxDB: {e}")
+            return []
+
+    async def read_aggregated_statistics_many(
+        self, sensor_ids, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed statistics for several sensors.
+
+        Returns:
+            dict: sensor_id -> list of statistical aggregations per time window
+        """
+        try:
+            return await self._read_many(
+                sensor_ids,
+                lambda chunk: self._statistics_query(
+                    chunk, start_time, end_time, window
+                ),
+                lambda record: _statistics_row(record, window),
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated statistics from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    async def read_sketches(
+        self, sensor_ids, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read the quantile sketches of a rollup tier, merged over the range.
+
+        Returns:
+            dict: field -> {bucket tag: count} (see storage/sketch.py)
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        chunks = [
+            sensor_ids[i : i + self.max_sensors_per_query]
+            for i in range(0, len(sensor_ids), self.max_sensors_per_query)
+        ]
+        chunk_records = await asyncio.gather(
+            *(
+                self._rows(
+                    self._sketch_query(chunk, start_time, end_time, window),
+                    lambda record: record,
+                )
+                for chunk in chunks
+            )
+        )
+        sketches = {field: {} for field in FIELDS}
+        for records in chunk_records:
+            for record in records:
+                _add_sketch_record(sketches, record)
+        return sketches
+
+    def get_stats(self):
+        """Return query/write counters and current concurrency use."""
+        return {
+            **self._stats,
+            "max_concurrency": self.max_concurrency,
+            "pool_size": self.pool_size,
+        }
+
+    async def close(self):
+        """Close the connection pool."""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.close()
@@ -0,0 +1,115 @@
+"""
+Column-oriented query results.
+Reads Flux CSV output straight into NumPy arrays, one array per column,
+without building a record object or dict for every row.
+"""
+
+import numpy as np
+from influxdb_client import Dialect
+
+# Plain CSV: one header row per table, no annotation rows
+CSV_DIALECT = Dialect(
+    header=True, annotations=[], date_time_format="RFC3339Nano", delimiter=","
+)
+
+
+def _to_epoch_ns(values):
+    """Convert RFC3339 UTC timestamp strings to int64 nanoseconds since the epoch."""
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    naive = [value[:-1] if value.endswith("Z") else value for value in values]
+    return np.array(naive, dtype="datetime64[ns]").astype(np.int64)
+
+
+def _to_float64(values):
+    """Convert CSV cells to float64, mapping empty cells (nulls) to NaN."""
+    return np.array([value or "nan" for value in values], dtype=np.float64)
+
+
+def query_columns(query_api, query, org, columns, params=None):
+    """
+    Run a Flux query and return the selected columns as NumPy arrays.
+
+    The `_time` column is always returned as int64 epoch nanoseconds under
+    the "timestamp" key; every other requested column is returned as float64.
+    Rows are returned in the order Flux produced them.
+
+    Args:
+        query_api: influxdb_client QueryApi
+        query (str): Flux query text
+        org (str): Organization name
+        columns (list): Value column names to extract
+        params (dict): Flux query parameters (optional)
+
+    Returns:
+        dict: Column name -> NumPy array, all of equal length
+    """
+    times = []
+    cells = {column: [] for column in columns}
+    time_index = None
+    value_indexes = None
+
+    rows = query_api.query_csv(query, org=org, dialect=CSV_DIALECT, params=params)
+    for row in rows:
+        if not row or (len(row) == 1 and not row[0]):
+            # Blank line between tables; the next row is a header
+            time_index = None
+            continue
+
+        if time_index is None or "_time" in row:
+            if "_time" not in row:
+                continue
+            time_index = row.index("_time")
+            value_indexes = [
+                (column, row.index(column) if column in row else None)
+                for column in columns
+            ]
+            continue
+
+        times.append(row[time_index])
+        for column, index in value_indexes:
+            cells[column].append(row[index] if index is not None else "")
+
+    result = {"timestamp": _to_epoch_ns(times)}
+    for column in columns:
+        result[column] = _to_float64(cells[column])
+    return result
+
+
+def format_timestamps(times):
+    """
+    Format int64 epoch nanoseconds like datetime.isoformat() on UTC times.
+
+    Returns:
+        list: Strings such as "2024-12-01T10:30:00.250000+00:00" (microsecond
+            precision, fraction omitted when zero)
+    """
+    text = np.datetime_as_string(
+        times.astype("datetime64[ns]").astype("datetime64[us]"), unit="us"
+    )
+    return [
+        (value[:-7] if value.endswith(".000000") else value) + "+00:00"
+        for value in text.tolist()
+    ]
+
+
+def to_rows(columns, **constants):
+    """
+    Turn column arrays back into one dict per row.
+
+    The int64 "timestamp" column is formatted with format_timestamps(),
+    NaN values become None, and `constants` (e.g. sensor_id) are added to
+    every row.
+
+    Returns:
+        list: Row dictionaries in column order
+    """
+    names = [name for name in columns if name != "timestamp"]
+    values = [
+        [None if value != value else value for value in columns[name].tolist()]
+        for name in names
+    ]
+    return [
+        {"timestamp": timestamp, **constants, **dict(zip(names, row))}
+        for timestamp, *row in zip(format_timestamps(columns["timestamp"]), *values)
+    ]
@@ -0,0 +1,173 @@
+"""
+Shape-preserving downsampling of measurement series to a target point count.
+Charts need a bounded number of points whatever the time range, so reads
+with points=N return a subset of the rows chosen to keep the visual shape:
+
+- "lttb": Largest-Triangle-Three-Buckets. Keeps the first and last point and
+  one point per bucket, the one forming the largest triangle with the point
+  kept in the previous bucket and the mean of the next bucket.
+- "minmax": The minimum and maximum of every field in each bucket, so spikes
+  are never dropped. Never more than N rows: with fewer than two per field
+  plus the endpoints, only the overall extremes that fit are kept.
+
+Both work on NumPy columns (see storage/columnar.py) and pick whole rows,
+so temperature and conductivity stay aligned on the same timestamps.
+"""
+
+import numpy as np
+from storage.flux_queries import FIELDS
+from utils.windows import epoch_ns
+
+METHODS = ("lttb", "minmax")
+
+
+def _scaled(values):
+    """Scale a column to [0, 1] with NaN as 0, so fields weigh the same."""
+    low, high = np.nanmin(values), np.nanmax(values)
+    scale = high - low if high > low else 1.0
+    return np.nan_to_num((values - low) / scale)
+
+
+def lttb_indices(times, values, points):
+    """
+    Select rows with Largest-Triangle-Three-Buckets.
+
+    The triangle area of a candidate is summed over all fields (each scaled
+    to [0, 1]); one Python step per output point, vectorized within a bucket.
+
+    Args:
+        times (np.ndarray): int64 timestamps, monotonic (either direction)
+        values (list): One float64 array per field, aligned with times
+        points (int): Number of rows to keep (at least 3)
+
+    Returns:
+        np.ndarray: Sorted row indices
+    """
+    n = len(times)
+    x = (times - times[0]).astype(np.float64)
+    x /= abs(x[-1]) or 1.0
+    y = np.column_stack([_scaled(column) for column in values])
+
+    # Buckets for the n - 2 inner rows, plus the last row as a final bucket
+    edges = np.append(np.linspace(1, n - 1, points - 1).astype(np.int64), n)
+    indices = np.empty(points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        mean_x = x[next_lo:next_hi].mean()
+        mean_y = y[next_lo:next_hi].mean(axis=0)
+
+        areas = np.abs(
+            (x[a] - mean_x) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi, None]) * (mean_y - y[a])
+        ).sum(axis=1)
+        a = lo + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def _overall_extremes(values, points):
+    """
+    First and last row plus the overall extremes of as many fields as fit
+    (for points too small for one bucket of every field's min and max).
+    """
+    n = len(values[0])
+    kept = [0, n - 1]
+    for column in values:
+        if np.isnan(column).all():
+            continue
+        for index in (np.nanargmin(column), np.nanargmax(column)):
+            if len(kept) == points:
+                return np.unique(kept)
+            if index not in kept:
+                kept.append(int(index))
+    return np.unique(kept)
+
+
+def minmax_indices(values, points):
+    """
+    Select the rows holding each field's minimum and maximum per bucket.
+
+    Args:
+        values (list): One float64 array per field
+        points (int): Upper bound on the number of rows kept
+
+    Returns:
+        np.ndarray: Sorted, unique row indices (first and last row included)
+    """
+    n = len(values[0])
+    buckets = (points - 2) // (2 * len(values))
+    if buckets < 1:
+        return _overall_extremes(values, points)
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+
+    selected = [np.array([0, n - 1])]
+    for column in values:
+        for reduce, fill in ((np.minimum, np.inf), (np.maximum, -np.inf)):
+            filled = np.where(np.isnan(column), fill, column)
+            extremes = reduce.reduceat(filled, starts)
+            hits = np.flatnonzero(filled == extremes[bucket_of])
+            _, first = np.unique(bucket_of[hits], return_index=True)
+            selected.append(hits[first])
+    return np.unique(np.concatenate(selected))
+
+
+def downsample_indices(columns, points, method="lttb"):
+    """
+    Choose the rows to keep from a set of measurement columns.
+
+    Args:
+        columns (dict): "timestamp" and field arrays of equal length
+        points (int): Target number of rows (at least 3)
+        method (str): "lttb" or "minmax"
+
+    Returns:
+        np.ndarray: Sorted row indices; every row if there are no more than
+            `points`
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method not in METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(METHODS)}")
+
+    times = columns["timestamp"]
+    if len(times) <= points:
+        return np.arange(len(times))
+    values = [columns[field] for field in FIELDS]
+    if method == "minmax":
+        return minmax_indices(values, points)
+    return lttb_indices(times, values, points)
+
+
+def downsample_columns(columns, points, method="lttb"):
+    """Return the columns reduced to the rows chosen by downsample_indices()."""
+    indices = downsample_indices(columns, points, method)
+    return {name: column[indices] for name, column in columns.items()}
+
+
+def downsample_rows(rows, points, method="lttb"):
+    """
+    Downsample measurement dictionaries (e.g. aggregated reads).
+
+    Args:
+        rows (list): Dictionaries with "timestamp" and one value per field,
+            ordered by time
+
+    Returns:
+        list: The selected rows, in their original order
+    """
+    if len(rows) <= points:
+        return rows
+    columns = {
+        "timestamp": np.fromiter(
+            (epoch_ns(row["timestamp"]) for row in rows), np.int64, len(rows)
+        )
+    }
+    for field in FIELDS:
+        columns[field] = np.array([row.get(field) for row in rows], dtype=np.float64)
+    return [rows[i] for i in downsample_indices(columns, points, method)]
@@ -0,0 +1,221 @@
+"""
+Flux query templates for the storage clients.
+Every read is one of a few query shapes. The Flux text of a shape only
+depends on its structure (how many sensors, whether the range has a stop),
+so it is built once and cached; sensor IDs, time bounds, windows and limits
+are sent separately as `params` and are never spliced into the query text.
+The client declares each one as a Flux option, so the query refers to them
+by bare name; the "p_" prefix keeps them from shadowing Flux builtins
+(option limit = ... would hide the limit() function).
+
+Predicates go in a single filter() directly after range(), ordered
+measurement -> tags -> fields, so InfluxDB can push the whole predicate
+down into the storage read.
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from storage.sketch import sketch_measurement
+from utils.windows import NS_PER_SECOND, parse_duration, parse_time
+
+FIELDS = ("temperature", "conductivity")
+# Statistics returned by the statistics reads (see storage/statistics.py)
+STAT_TYPES = ("mean", "min", "max", "count", "stddev")
+
+# Statistics stored per rollup window; stddev is derived from count/sum/sumsq
+STORED_STATS = ("mean", "min", "max", "count", "sum", "sumsq")
+
+RAW_MEASUREMENT = "water_quality"
+
+# Range start used when a read does not give one
+DEFAULT_START = "-7d"
+
+
+def time_param(value):
+    """
+    Convert a start/stop time into a Flux parameter value.
+
+    Relative times ("-1h") become negative durations, so the server still
+    resolves them against its own now(); integers are epoch nanoseconds
+    (truncated to microseconds) and anything else is parsed as an absolute
+    time.
+
+    Raises:
+        ValueError: If the value cannot be parsed
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, int):
+        seconds, ns = divmod(value, NS_PER_SECOND)
+        return datetime.fromtimestamp(seconds, tz=timezone.utc) + timedelta(
+            microseconds=ns // 1000
+        )
+    text = str(value).strip()
+    if text.startswith("-"):
+        return -timedelta(seconds=parse_duration(text[1:]))
+    return parse_time(text, datetime.now(timezone.utc))
+
+
+def _range_params(start_time, end_time):
+    params = {"p_start": time_param(start_time or DEFAULT_START)}
+    if end_time:
+        params["p_stop"] = time_param(end_time)
+    return params
+
+
+def _sensor_params(sensor_ids):
+    return {f"p_sensor_{i}": sensor_id for i, sensor_id in enumerate(sensor_ids)}
+
+
+def _or(predicates):
+    return "(" + " or ".join(predicates) + ")"
+
+
+@lru_cache(maxsize=512)
+def _template(shape, sensor_count, has_stop):
+    """Build the Flux text for one query shape; cached per shape."""
+    stop = ", stop: p_stop" if has_stop else ""
+    predicates = ["r._measurement == p_measurement"]
+    if sensor_count:
+        predicates.append(
+            _or(f"r.sensor_id == p_sensor_{i}" for i in range(sensor_count))
+        )
+    if shape == "aggregated":
+        predicates.append('r.stat_type == "mean"')
+    elif shape == "statistics":
+        predicates.append(_or(f'r.stat_type == "{stat}"' for stat in STORED_STATS))
+    predicates.append(_or(f'r._field == "{field}"' for field in FIELDS))
+
+    lines = [
+        "from(bucket: p_bucket)",
+        f"    |> range(start: p_start{stop})",
+        f"    |> filter(fn: (r) => {' and '.join(predicates)})",
+    ]
+    if shape == "measurements":
+        lines += [
+            '    |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")',
+            '    |> sort(columns: ["_time"], desc: true)',
+            "    |> limit(n: p_limit)",
+        ]
+    elif shape == "aggregated":
+        lines += [
+            '    |> pivot(rowKey: ["_time", "sensor_id"], columnKey: ["_field"], valueColumn: "_value")',
+            '    |> sort(columns: ["_time"], desc: true)',
+        ]
+    elif shape == "statistics":
+        lines += [
+            '    |> pivot(rowKey: ["_time", "sensor_id"], columnKey: ["_field", "stat_type"], valueColumn: "_value")',
+            '    |> group(columns: ["sensor_id"])',
+            '    |> sort(columns: ["_time"], desc: true)',
+        ]
+    elif shape == "sketch":
+        lines += [
+            '    |> group(columns: ["_field", "bucket"])',
+            "    |> sum()",
+        ]
+    return "\n".join(lines)
+
+
+def measurements_query(bucket, sensor_ids, start_time, end_time, limit):
+    """
+    Raw measurements, newest first per sensor.
+
+    Returns:
+        tuple: (query, params) for query_api.query*(..., params=params)
+
+    Raises:
+        ValueError: If a time bound cannot be parsed
+    """
+    params = {
+        "p_bucket": bucket,
+        "p_measurement": RAW_MEASUREMENT,
+        "p_limit": int(limit),
+        **_range_params(start_time, end_time),
+        **_sensor_params(sensor_ids),
+    }
+    return _template("measurements", len(sensor_ids), bool(end_time)), params
+
+
+def aggregated_query(bucket, sensor_ids, start_time, end_time, window):
+    """
+    Pre-computed mean values of a rollup tier, newest first.
+
+    Returns:
+        tuple: (query, params)
+
+    Raises:
+        ValueError: If a time bound cannot be parsed
+    """
+    params = {
+        "p_bucket": bucket,
+        "p_measurement": f"{RAW_MEASUREMENT}_{window}",
+        **_range_params(start_time, end_time),
+        **_sensor_params(sensor_ids),
+    }
+    return _template("aggregated", len(sensor_ids), bool(end_time)), params
+
+
+def statistics_query(bucket, sensor_ids, start_time, end_time, window):
+    """
+    Pre-computed mean/min/max of a rollup tier, one row per window.
+
+    Returns:
+        tuple: (query, params)
+
+    Raises:
+        ValueError: If a time bound cannot be parsed
+    """
+    params = {
+        "p_bucket": bucket,
+        "p_measurement": f"{RAW_MEASUREMENT}_{window}",
+        **_range_params(start_time, end_time),
+        **_sensor_params(sensor_ids),
+    }
+    return _template("statistics", len(sensor_ids), bool(end_time)), params
+
+
+def sketch_query(bucket, sensor_ids, start_time, end_time, window):
+    """
+    Quantile sketch buckets of a rollup tier, merged in Flux across every
+    window and sensor in range: one row per (_field, bucket) with the summed
+    count (see storage/sketch.py).
+
+    Returns:
+        tuple: (query, params)
+
+    Raises:
+        ValueError: If a time bound cannot be parsed
+    """
+    params = {
+        "p_bucket": bucket,
+        "p_measurement": sketch_measurement(window),
+        **_range_params(start_time, end_time),
+        **_sensor_params(sensor_ids),
+    }
+    return _template("sketch", len(sensor_ids), bool(end_time)), params
+
+
+# Sensor IDs from the storage engine's tag index; no points are read
+SENSORS_QUERY = """import "influxdata/influxdb/schema"
+
+schema.tagValues(
+    bucket: p_bucket,
+    tag: "sensor_id",
+    predicate: (r) => r._measurement == p_measurement,
+    start: p_start,
+)"""
+
+
+def sensors_query(bucket):
+    """
+    Every sensor ID with raw measurements still in the bucket, one per row.
+
+    Returns:
+        tuple: (query, params)
+    """
+    params = {
+        "p_bucket": bucket,
+        "p_measurement": RAW_MEASUREMENT,
+        "p_start": datetime(1970, 1, 1, tzinfo=timezone.utc),
+    }
+    return SENSORS_QUERY, params
@@ -0,0 +1,174 @@
+"""
+In-memory tail of the most recent raw readings of every sensor.
+Most raw reads ask for the last N readings or the last few minutes, and each
+of them used to run a full range scan and sort in InfluxDB. The client keeps
+the latest HOT_TAIL_READINGS readings of each sensor it writes in a
+fixed-size ring of NumPy arrays (timestamps and the two fields, no dict per
+reading) and answers a raw read from memory when the result is known to lie
+entirely inside the ring.
+
+A ring knows every reading of its sensor newer than its floor: the newest
+timestamp it has overwritten, or the time the ring was created for readings
+that may have been written before this process started. A read is served
+from memory when its range starts after the floor, or when the ring alone
+holds `limit` readings of the range newer than the floor (the newest
+`limit` cannot then be older). Everything else goes to InfluxDB.
+
+This only holds if this process writes every reading of the sensor, so the
+tail is off by default and should only be enabled with a single API worker
+(api/gunicorn_conf.py then starts one).
+"""
+
+import os
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from storage.flux_queries import DEFAULT_START, FIELDS, time_param
+from utils.windows import epoch_ns
+
+# Readings kept per sensor (0 disables the hot tail)
+HOT_TAIL_READINGS = int(os.getenv("HOT_TAIL_READINGS", "0"))
+
+
+def _bound_ns(value, now_ns):
+    """
+    Resolve a start/stop time like the Flux query would (relative times
+    against now, absolute times truncated to microseconds).
+    """
+    value = time_param(value)
+    if isinstance(value, timedelta):
+        return now_ns + value // timedelta(microseconds=1) * 1000
+    return epoch_ns(value)
+
+
+class _Ring:
+    """The latest readings of one sensor, in arrival order."""
+
+    def __init__(self, capacity, floor_ns):
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.fields = np.empty((len(FIELDS), capacity), dtype=np.float64)
+        self.size = 0
+        self.next = 0
+        self.floor_ns = floor_ns
+
+    def add(self, time_ns, values):
+        capacity = len(self.times)
+        if self.size == capacity:
+            self.floor_ns = max(self.floor_ns, int(self.times[self.next]))
+        else:
+            self.size += 1
+        self.times[self.next] = time_ns
+        self.fields[:, self.next] = values
+        self.next = (self.next + 1) % capacity
+
+    def snapshot(self):
+        """Copy the readings out, oldest arrival first."""
+        if self.size < len(self.times):
+            return self.times[: self.size].copy(), self.fields[:, : self.size].copy()
+        order = np.r_[self.next : self.size, 0 : self.next]
+        return self.times[order], self.fields[:, order]
+
+
+class HotTail:
+    """Per-sensor rings of recent readings, filled on write and read by the clients."""
+
+    def __init__(self, capacity=HOT_TAIL_READINGS):
+        self.capacity = capacity
+        self._rings = {}
+        self._lock = threading.Lock()
+        # Readings written before this process started are only in InfluxDB
+        self._created_ns = time.time_ns()
+        self._stats = {"hits": 0, "misses": 0, "unparsed": 0}
+
+    def add(self, sensor_id, timestamp, temperature, conductivity):
+        """Record one reading that was written (or queued) to InfluxDB."""
+        try:
+            time_ns = epoch_ns(timestamp)
+        except (TypeError, ValueError):
+            time_ns = None
+        with self._lock:
+            ring = self._rings.get(sensor_id)
+            if ring is None:
+                ring = self._rings[sensor_id] = _Ring(self.capacity, self._created_ns)
+            if time_ns is None:
+                # Stored somewhere the ring cannot place it; stop vouching for
+                # anything written so far
+                self._stats["unparsed"] += 1
+                ring.floor_ns = max(ring.floor_ns, time.time_ns())
+                return
+            ring.add(time_ns, (float(temperature), float(conductivity)))
+
+    def add_many(self, measurements):
+        """Record written measurement dictionaries (see add())."""
+        for measurement in measurements:
+            self.add(
+                measurement["sensor_id"],
+                measurement["timestamp"],
+                measurement["temperature"],
+                measurement["conductivity"],
+            )
+
+    def read_columns(self, sensor_id, start_time=None, end_time=None, limit=100):
+        """
+        Answer a raw read from memory if the ring covers it.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time: Range start as accepted by the Flux queries
+                (default: DEFAULT_START)
+            end_time: Exclusive range end (default: now)
+            limit (int): Maximum number of readings
+
+        Returns:
+            dict: "timestamp" (int64 epoch ns) and one float64 array per
+                field, newest first, like read_measurement_columns(); None
+                if the read has to go to InfluxDB
+
+        Raises:
+            ValueError: If a time bound cannot be parsed
+        """
+        now_ns = time.time_ns()
+        lower = _bound_ns(start_time or DEFAULT_START, now_ns)
+        upper = _bound_ns(end_time, now_ns) if end_time else now_ns
+
+        with self._lock:
+            ring = self._rings.get(sensor_id)
+            if ring is None:
+                floor_ns = self._created_ns
+                times = np.empty(0, dtype=np.int64)
+                fields = np.empty((len(FIELDS), 0), dtype=np.float64)
+            else:
+                floor_ns = ring.floor_ns
+                times, fields = ring.snapshot()
+
+        selected = np.flatnonzero((times >= lower) & (times < upper))
+        # Newest first; a rewritten timestamp keeps its latest values, like
+        # an overwritten point in InfluxDB
+        order = selected[np.argsort(times[selected], kind="stable")][::-1]
+        sorted_times = times[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = sorted_times[1:] != sorted_times[:-1]
+        order = order[keep][:limit]
+
+        if lower <= floor_ns and (len(order) < limit or times[order[-1]] <= floor_ns):
+            self._count("misses")
+            return None
+        self._count("hits")
+        columns = {"timestamp": times[order]}
+        for index, field in enumerate(FIELDS):
+            columns[field] = fields[index, order]
+        return columns
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        """Return hit/miss counters and the number of sensors held."""
+        with self._lock:
+            return {
+                **self._stats,
+                "sensors": len(self._rings),
+                "capacity": self.capacity,
+            }
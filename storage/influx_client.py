@@ -1,15 +1,154 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from influxdb_client import InfluxDBClient as InfluxClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
+from storage import flux_queries
+from storage.columnar import query_columns, to_rows
+from storage.flux_queries import FIELDS, RAW_MEASUREMENT, STORED_STATS
+from storage.hot_tail import HOT_TAIL_READINGS, HotTail
+from storage.pagination import page_bounds, read_page
+from storage.query_cache import QueryCache
+from storage.statistics import derive_columns, field_statistics, statistics_rows
+from storage.write_buffer import BufferedWriter, WriteBufferFullError
 from utils.logger_config import setup_logging
 
 logger = setup_logging("influx_db_client")
 
-
-class InfluxDBClient:
+# Line protocol escapes of a tag value (see _tag_value())
+_TAG_ESCAPES = str.maketrans(
+    {",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"}
+)
+
+
+def _tag_value(value):
+    """Escape a tag value like Point does, including a trailing backslash."""
+    escaped = value.translate(_TAG_ESCAPES)
+    # A trailing backslash would escape the space after the tag set
+    if escaped.endswith("\\"):
+        escaped += " "
+    return escaped
+
+
+def _measurement_point(sensor_id, timestamp, temperature, conductivity):
+    """Build the raw water_quality point for one reading."""
+    return (
+        Point("water_quality")
+        .tag("sensor_id", sensor_id)
+        .field("temperature", float(temperature))
+        .field("conductivity", float(conductivity))
+        .time(timestamp)
+    )
+
+
+def _float_field(value):
+    text = str(float(value))
+    return text[:-2] if text.endswith(".0") else text
+
+
+def _measurement_line(sensor_id, timestamp, temperature, conductivity):
+    """
+    Serialize one reading to line protocol.
+
+    Readings normalized on ingest carry integer epoch nanoseconds and are
+    formatted directly; other timestamps go through a Point, which parses them.
+    """
+    if type(timestamp) is not int:
+        return _measurement_point(
+            sensor_id, timestamp, temperature, conductivity
+        ).to_line_protocol()
+    return (
+        f"{RAW_MEASUREMENT},sensor_id={_tag_value(sensor_id)} "
+        f"conductivity={_float_field(conductivity)},"
+        f"temperature={_float_field(temperature)} {timestamp}"
+    )
+
+
+def _measurement_row(record):
+    """Convert a pivoted raw record into a measurement dictionary."""
+    return {
+        "timestamp": record.get_time().isoformat(),
+        "sensor_id": record.values.get("sensor_id"),
+        "temperature": record.values.get("temperature"),
+        "conductivity": record.values.get("conductivity"),
+    }
+
+
+def _aggregated_row(record, window):
+    """Convert a pivoted mean-value record into an aggregated measurement."""
+    return {
+        "timestamp": record.get_time().isoformat(),
+        "sensor_id": record.values.get("sensor_id"),
+        "temperature": record.values.get("temperature"),
+        "conductivity": record.values.get("conductivity"),
+        "window": window,
+    }
+
+
+def _add_sketch_record(sketches, record):
+    """Add a (_field, bucket, count) record of a sketch query to per-field counts."""
+    counts = sketches.get(record.get_field())
+    bucket = record.values.get("bucket")
+    if counts is not None and bucket and record.get_value():
+        counts[bucket] = counts.get(bucket, 0) + record.get_value()
+
+
+def _statistics_row(record, window):
+    """Convert a record pivoted on field and stat_type into a statistics entry."""
+    statistics = {
+        "timestamp": record.get_time().isoformat(),
+        "sensor_id": record.values.get("sensor_id"),
+        "window": window,
+    }
+    for field in FIELDS:
+        statistics[field] = field_statistics(record.values, field)
+    return statistics
+
+
+class FluxQueries:
+    """
+    Query builders shared by the sync and async clients.
+
+    Each returns a (query, params) pair from storage/flux_queries.py for the
+    client's bucket; subclasses set `bucket`.
+
+    Raises:
+        ValueError: If a time bound cannot be parsed
+    """
+
+    def _measurements_query(self, sensor_ids, start_time, end_time, limit):
+        return flux_queries.measurements_query(
+            self.bucket, sensor_ids, start_time, end_time, limit
+        )
+
+    def _sensors_query(self):
+        return flux_queries.sensors_query(self.bucket)
+
+    def _aggregated_query(self, sensor_ids, start_time, end_time, window):
+        return flux_queries.aggregated_query(
+            self.bucket, sensor_ids, start_time, end_time, window
+        )
+
+    def _statistics_query(self, sensor_ids, start_time, end_time, window):
+        return flux_queries.statistics_query(
+            self.bucket, sensor_ids, start_time, end_time, window
+        )
+
+    def _sketch_query(self, sensor_ids, start_time, end_time, window):
+        return flux_queries.sketch_query(
+            self.bucket, sensor_ids, start_time, end_time, window
+        )
+
+
+class InfluxDBClient(FluxQueries):
     """Client for interacting with InfluxDB."""
 
-    def __init__(self):
+    def __init__(self, write_mode=None):
+        """
+        Args:
+            write_mode (str): "sync" to write each request straight through, or
+                "buffered" to queue points for a background writer. Defaults to
+                the INFLUXDB_WRITE_MODE environment variable, then "sync".
+        """
         self.url = os.getenv("INFLUXDB_URL", "http://localhost:8086")
         self.token = os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token")
         self.org = os.getenv("INFLUXDB_ORG", "aquatic-labs")
@@ -20,31 +159,226 @@ class InfluxDBClient:
         self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
         self.query_api = self.client.query_api()
 
+        self.write_mode = write_mode or os.getenv("INFLUXDB_WRITE_MODE", "sync")
+        self.write_buffer = None
+        if self.write_mode == "buffered":
+            self.write_buffer = BufferedWriter(
+                write_fn=self._write_payload,
+                max_queue_size=int(os.getenv("INFLUXDB_WRITE_QUEUE_SIZE", "100000")),
+                batch_size=int(os.getenv("INFLUXDB_WRITE_BATCH_SIZE", "5000")),
+                flush_interval=float(os.getenv("INFLUXDB_FLUSH_INTERVAL_MS", "1000"))
+                / 1000.0,
+                max_retries=int(os.getenv("INFLUXDB_WRITE_MAX_RETRIES", "5")),
+                enqueue_timeout=float(os.getenv("INFLUXDB_ENQUEUE_TIMEOUT_MS", "50"))
+                / 1000.0,
+            )
+
         logger.info(f"InfluxDB Client initialized:")
         logger.info(f"  URL: {self.url}")
         logger.info(f"  Org: {self.org}")
         logger.info(f"  Bucket: {self.bucket}")
+        logger.info(f"  Write mode: {self.write_mode}")
+
+        # Multi-sensor reads put at most this many sensors in one Flux query
+        # and run at most this many such queries concurrently
+        self.max_sensors_per_query = int(
+            os.getenv("INFLUXDB_MAX_SENSORS_PER_QUERY", "100")
+        )
+        self.max_parallel_queries = int(os.getenv("INFLUXDB_MAX_PARALLEL_QUERIES", "4"))
+
+        # Settled blocks of aggregated/statistics results (0 MB disables)
+        self.query_cache = None
+        cache_mb = float(os.getenv("QUERY_CACHE_MB", "64"))
+        if cache_mb > 0:
+            self.query_cache = QueryCache(
+                max_bytes=int(cache_mb * 1024 * 1024),
+                block_windows=int(os.getenv("QUERY_CACHE_BLOCK_WINDOWS", "360")),
+            )
+
+        # Latest raw readings per sensor, answering recent raw reads (0 disables)
+        self.hot_tail = HotTail(HOT_TAIL_READINGS) if HOT_TAIL_READINGS > 0 else None
+
+    def _write_payload(self, payload):
+        """Synchronously write a newline-joined line-protocol payload."""
+        self.write_api.write(bucket=self.bucket, record=payload)
+
+    def write_lines(self, lines):
+        """
+        Write pre-serialized line-protocol points.
+
+        Raises:
+            WriteBufferFullError: In buffered mode, if the queue has no room
+            Exception: Write errors in sync mode are propagated to the caller
+        """
+        if self.write_buffer:
+            self.write_buffer.submit(lines)
+        else:
+            self._write_payload("\n".join(lines))
 
     def write_measurement(self, sensor_id, timestamp, temperature, conductivity):
-        """Write a sensor measurement to InfluxDB."""
+        """
+        Write a sensor measurement to InfluxDB.
+
+        In buffered mode the point is queued and True means it was accepted
+        by the buffer, not that it has reached InfluxDB yet.
+
+        Raises:
+            WriteBufferFullError: In buffered mode, if the queue has no room
+        """
         try:
-            # Create a point with the measurement data
-            point = (
-                Point("water_quality")
-                .tag("sensor_id", sensor_id)
-                .field("temperature", float(temperature))
-                .field("conductivity", float(conductivity))
-                .time(timestamp)
-            )
+            # Serialize the measurement to line protocol
+            line = _measurement_line(sensor_id, timestamp, temperature, conductivity)
 
             # Write to InfluxDB
-            self.write_api.write(bucket=self.bucket, record=point)
+            if self.write_buffer:
+                self.write_buffer.submit([line])
+            else:
+                self._write_payload(line)
+            if self.hot_tail:
+                self.hot_tail.add(sensor_id, timestamp, temperature, conductivity)
             return True
 
+        except WriteBufferFullError:
+            raise
         except Exception as e:
             logger.error(f"Error writing to InfluxDB: {e}")
             return False
 
+    def write_measurements_bulk(self, measurements):
+        """
+        Write many sensor measurements to InfluxDB in a single request.
+
+        Every measurement is serialized to line protocol up front so that a
+        malformed item (e.g. an unparseable timestamp) is rejected on its own
+        instead of failing the whole batch. The remaining lines are sent as
+        one newline-delimited payload.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id, timestamp,
+                temperature and conductivity keys
+
+        Returns:
+            list: One entry per measurement, None if it was written or an
+                error message if it was rejected
+
+        Raises:
+            WriteBufferFullError: In buffered mode, if the queue has no room
+                for the whole batch
+        """
+        errors = [None] * len(measurements)
+        lines = []
+        line_indexes = []
+
+        for index, measurement in enumerate(measurements):
+            try:
+                lines.append(
+                    _measurement_line(
+                        measurement["sensor_id"],
+                        measurement["timestamp"],
+                        measurement["temperature"],
+                        measurement["conductivity"],
+                    )
+                )
+                line_indexes.append(index)
+            except Exception as e:
+                errors[index] = str(e)
+
+        if not lines:
+            return errors
+
+        if self.write_buffer:
+            self.write_buffer.submit(lines)
+        else:
+            try:
+                self._write_payload("\n".join(lines))
+            except Exception as e:
+                logger.error(f"Error bulk writing {len(lines)} points to InfluxDB: {e}")
+                for index in line_indexes:
+                    errors[index] = "Failure"
+                return errors
+
+        if self.hot_tail:
+            self.hot_tail.add_many(measurements[index] for index in line_indexes)
+        return errors
+
+    def _read_many(self, sensor_ids, build_query, to_row):
+        """
+        Run a multi-sensor read and group the resulting rows by sensor.
+
+        Sensors are filtered with a single set-membership predicate. Large
+        sensor lists are split into chunks of max_sensors_per_query that are
+        queried in parallel (bounded by max_parallel_queries).
+
+        Args:
+            sensor_ids (list): Sensor IDs to read
+            build_query: Callable taking a list of sensor IDs, returning a
+                (query, params) pair
+            to_row: Callable converting a FluxRecord into a result row
+
+        Returns:
+            dict: sensor_id -> list of rows, with an entry for every requested sensor
+        """
+        results = {sensor_id: [] for sensor_id in sensor_ids}
+        unique_ids = list(results)
+        chunks = [
+            unique_ids[i : i + self.max_sensors_per_query]
+            for i in range(0, len(unique_ids), self.max_sensors_per_query)
+        ]
+
+        def run(chunk):
+            query, params = build_query(chunk)
+            return [
+                to_row(record)
+                for record in self.query_api.query_stream(
+                    query, org=self.org, params=params
+                )
+            ]
+
+        if len(chunks) == 1:
+            chunk_rows = [run(chunks[0])]
+        else:
+            workers = min(self.max_parallel_queries, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                chunk_rows = list(pool.map(run, chunks))
+
+        for rows in chunk_rows:
+            for row in rows:
+                results.setdefault(row["sensor_id"], []).append(row)
+        return results
+
+    def iter_measurements(self, sensor_id, start_time=None, end_time=None, limit=100):
+        """
+        Stream measurements from InfluxDB for a specific sensor, newest first.
+
+        Records are parsed from the HTTP response as they arrive, so memory
+        use does not grow with the size of the time range. Reads covered by
+        the hot tail are answered from memory.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            limit (int): A limit for the number of returned measurements
+
+        Yields:
+            dict: One measurement per row
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        if self.hot_tail:
+            columns = self.hot_tail.read_columns(sensor_id, start_time, end_time, limit)
+            if columns is not None:
+                yield from to_rows(columns, sensor_id=sensor_id)
+                return
+
+        query, params = self._measurements_query(
+            [sensor_id], start_time, end_time, limit
+        )
+
+        for record in self.query_api.query_stream(query, org=self.org, params=params):
+            yield _measurement_row(record)
+
     def read_measurements(self, sensor_id, start_time=None, end_time=None, limit=100):
         """
         Read measurements from InfluxDB for a specific sensor.
@@ -54,216 +388,423 @@ class InfluxDBClient:
             end_time (str): End time in ISO format (optional)
             limit (int): A limit for the number of returned measurements
         Returns:
+            list: List of measurement dictionaries, newest first
         """
         try:
-            # Build Flux query
-            time_range = start_time if start_time else "-7d"
-
-            query = f"""
-            from(bucket: "{self.bucket}")
-                |> range(start: {time_range})
-                |> filter(fn: (r) => r["_measurement"] == "water_quality")
-                |> filter(fn: (r) => r["sensor_id"] == "{sensor_id}")
-                |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
-                |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-                |> sort(columns: ["_time"], desc: true)
-                |> limit(n: {limit})
-            """
-            # Execute query
-            tables = self.query_api.query(query, org=self.org)
-
-            # Parse results
-            measurements = []
-            for table in tables:
-                for record in table.records:
-                    measurements.append(
-                        {
-                            "timestamp": record.get_time().isoformat(),
-                            "sensor_id": record.values.get("sensor_id"),
-                            "temperature": record.values.get("temperature"),
-                            "conductivity": record.values.get("conductivity"),
-                        }
-                    )
-
-            return measurements
+            return list(self.iter_measurements(sensor_id, start_time, end_time, limit))
 
         except Exception as e:
             logger.error(f"Error reading from InfluxDB: {e}")
             return []
 
-    def list_sensors(self):
-        """Get a list of all sensors that have sent measurements."""
+    def read_measurements_page(
+        self, sensor_id, start_time=None, end_time=None, limit=100, cursor=None
+    ):
+        """
+        Read one page of measurements for a sensor, newest first.
+
+        Pass the returned cursor back to read the next (older) page. Each
+        page queries a time window just below the previous page instead of
+        re-sorting the whole remaining range (see storage/pagination.py).
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            limit (int): Measurements per page
+            cursor (str): Cursor returned with the previous page; replaces
+                start_time and end_time
+
+        Returns:
+            tuple: (measurements, cursor of the next page or None)
+
+        Raises:
+            ValueError: If a time bound or the cursor cannot be parsed
+            Exception: Query errors are propagated to the caller
+        """
+
+        def fetch(lower_ns, upper_ns, count):
+            return list(self.iter_measurements(sensor_id, lower_ns, upper_ns, count))
+
+        return read_page(fetch, *page_bounds(start_time, end_time, cursor), limit)
+
+    def read_measurements_many(
+        self, sensor_ids, start_time=None, end_time=None, limit=100
+    ):
+        """
+        Read raw measurements for several sensors with one query per chunk.
+
+        Args:
+            sensor_ids (list): Sensor IDs to read
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            limit (int): Maximum number of measurements returned per sensor
+
+        Returns:
+            dict: sensor_id -> list of measurement dictionaries, newest first
+        """
         try:
-            query = f"""
-            from(bucket: "{self.bucket}")
-                |> range(start: -30d)
-                |> filter(fn: (r) => r["_measurement"] == "water_quality")
-                |> keep(columns: ["sensor_id"])
-                |> distinct(column: "sensor_id")
-            """
-
-            tables = self.query_api.query(query, org=self.org)
-
-            sensors = []
-            for table in tables:
-                for record in table.records:
-                    sensor_id = record.values.get("sensor_id")
-                    if sensor_id and sensor_id not in sensors:
-                        sensors.append(sensor_id)
+            return self._read_many(
+                sensor_ids,
+                lambda chunk: self._measurements_query(
+                    chunk, start_time, end_time, limit
+                ),
+                _measurement_row,
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading multiple sensors from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    def read_measurement_columns(
+        self, sensor_id, start_time=None, end_time=None, limit=100
+    ):
+        """
+        Read raw measurements as columns instead of one dict per row.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            limit (int): A limit for the number of returned measurements
+
+        Returns:
+            dict: "timestamp" (int64 epoch ns), "temperature" and
+                "conductivity" (float64) NumPy arrays, newest first
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        if self.hot_tail:
+            columns = self.hot_tail.read_columns(sensor_id, start_time, end_time, limit)
+            if columns is not None:
+                return columns
+
+        query, params = self._measurements_query(
+            [sensor_id], start_time, end_time, limit
+        )
+        return query_columns(
+            self.query_api, query, self.org, list(FIELDS), params=params
+        )
+
+    def list_sensors(self):
+        """
+        Get a list of all sensors with raw measurements in the bucket.
 
+        Reads the sensor_id tag index (schema.tagValues) rather than the
+        points themselves.
+        """
+        try:
+            query, params = self._sensors_query()
+            sensors = {
+                record.get_value()
+                for record in self.query_api.query_stream(
+                    query, org=self.org, params=params
+                )
+            }
+            sensors.discard(None)
             return sorted(sensors)
 
         except Exception as e:
             logger.error(f"Error listing sensors from InfluxDB: {e}")
             return []
 
+    def iter_aggregated_measurements(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Stream pre-computed aggregated measurements (mean values), newest first.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
+
+        Yields:
+            dict: One aggregated measurement per window
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        query, params = self._aggregated_query(
+            [sensor_id], start_time, end_time, window
+        )
+
+        for record in self.query_api.query_stream(query, org=self.org, params=params):
+            yield _aggregated_row(record, window)
+
     def read_aggregated_measurements(
         self, sensor_id, start_time=None, end_time=None, window="1m"
     ):
         """
         Read pre-computed aggregated measurements from InfluxDB.
 
-        Reads from:
-        - water_quality_1m for 1-minute aggregations
-        - water_quality_5m for 5-minute aggregations
+        Reads from the water_quality_<window> rollup, through the query cache
+        when it is enabled (QUERY_CACHE_MB).
 
         Args:
             sensor_id (str): Unique identifier for the sensor
             start_time (str): Start time in ISO format or relative time (e.g., "-1h")
             end_time (str): End time in ISO format (optional)
-            window (str): Aggregation window ("1m" or "5m")
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
 
         Returns:
             list: List of aggregated measurement dictionaries (mean values)
         """
         try:
-            time_range = start_time if start_time else "-7d"
-
-            # Select the appropriate pre-aggregated measurement
-            measurement_name = f"water_quality_{window}"
-
-            # Query pre-computed aggregations (mean values)
-            query = f"""
-            from(bucket: "{self.bucket}")
-                |> range(start: {time_range}"""
-
-            if end_time:
-                query += f", stop: {end_time}"
-
-            query += f""")
-                |> filter(fn: (r) => r["_measurement"] == "{measurement_name}")
-                |> filter(fn: (r) => r["sensor_id"] == "{sensor_id}")
-                |> filter(fn: (r) => r["stat_type"] == "mean")
-                |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
-                |> pivot(rowKey:["_time", "sensor_id"], columnKey: ["_field"], valueColumn: "_value")
-                |> sort(columns: ["_time"], desc: true)
-            """
-
-            tables = self.query_api.query(query, org=self.org)
-
-            measurements = []
-            for table in tables:
-                for record in table.records:
-                    measurements.append(
-                        {
-                            "timestamp": record.get_time().isoformat(),
-                            "sensor_id": record.values.get("sensor_id"),
-                            "temperature": record.values.get("temperature"),
-                            "conductivity": record.values.get("conductivity"),
-                            "window": window,
-                        }
-                    )
-
-            return measurements
+            if self.query_cache:
+                return self.query_cache.read(
+                    "aggregated",
+                    sensor_id,
+                    window,
+                    start_time,
+                    end_time,
+                    lambda start, stop: list(
+                        self.iter_aggregated_measurements(
+                            sensor_id, start, stop, window
+                        )
+                    ),
+                )
+            return list(
+                self.iter_aggregated_measurements(
+                    sensor_id, start_time, end_time, window
+                )
+            )
 
         except Exception as e:
             logger.error(f"Error reading aggregated data from InfluxDB: {e}")
             return []
 
+    def read_aggregated_measurements_many(
+        self, sensor_ids, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed mean values for several sensors.
+
+        Args:
+            sensor_ids (list): Sensor IDs to read
+            start_time (str): Start time in ISO format or relative time (e.g., "-1h")
+            end_time (str): End time in ISO format (optional)
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
+
+        Returns:
+            dict: sensor_id -> list of aggregated measurement dictionaries
+        """
+        try:
+            return self._read_many(
+                sensor_ids,
+                lambda chunk: self._aggregated_query(
+                    chunk, start_time, end_time, window
+                ),
+                lambda record: _aggregated_row(record, window),
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated data from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    def read_aggregated_columns(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed mean values as columns instead of one dict per row.
+
+        Returns:
+            dict: "timestamp" (int64 epoch ns), "temperature" and
+                "conductivity" (float64) NumPy arrays, newest first
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        query, params = self._aggregated_query(
+            [sensor_id], start_time, end_time, window
+        )
+        return query_columns(
+            self.query_api, query, self.org, list(FIELDS), params=params
+        )
+
+    def iter_aggregated_statistics(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Stream pre-computed statistics (mean, min, max, count, stddev), one
+        window at a time.
+
+        The stat_type/field pivot is done in Flux so that each streamed record
+        already holds every statistic for its window, newest first.
+
+        Args:
+            sensor_id (str): Unique identifier for the sensor
+            start_time (str): Start time in ISO format or relative time
+            end_time (str): End time in ISO format (optional)
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
+
+        Yields:
+            dict: Statistics for one time window
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        query, params = self._statistics_query(
+            [sensor_id], start_time, end_time, window
+        )
+
+        for record in self.query_api.query_stream(query, org=self.org, params=params):
+            yield _statistics_row(record, window)
+
     def read_aggregated_statistics(
         self, sensor_id, start_time=None, end_time=None, window="1m"
     ):
         """
-        Read detailed pre-computed statistics (mean, min, max, count) from InfluxDB.
+        Read detailed pre-computed statistics (mean, min, max, count, stddev).
 
-        Reads from pre-aggregated measurements:
-        - water_quality_1m for 1-minute windows
-        - water_quality_5m for 5-minute windows
+        Reads from the water_quality_<window> rollup, through the query cache
+        when it is enabled (QUERY_CACHE_MB). The result is read as NumPy
+        columns and the rows assembled from them, without a record object per
+        window.
 
         Args:
             sensor_id (str): Unique identifier for the sensor
             start_time (str): Start time in ISO format or relative time
             end_time (str): End time in ISO format (optional)
-            window (str): Aggregation window ("1m" or "5m")
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
 
         Returns:
             list: List of statistical aggregations per time window
         """
         try:
-            time_range = start_time if start_time else "-7d"
-            measurement_name = f"water_quality_{window}"
-
-            # Query all statistics from pre-computed aggregations
-            query = f"""
-            from(bucket: "{self.bucket}")
-                |> range(start: {time_range}"""
-
-            if end_time:
-                query += f", stop: {end_time}"
-
-            query += f""")
-                |> filter(fn: (r) => r["_measurement"] == "{measurement_name}")
-                |> filter(fn: (r) => r["sensor_id"] == "{sensor_id}")
-                |> filter(fn: (r) => r["_field"] == "temperature" or r["_field"] == "conductivity")
-                |> filter(fn: (r) => r["stat_type"] == "mean" or r["stat_type"] == "min" or r["stat_type"] == "max")
-                |> sort(columns: ["_time"], desc: true)
-            """
-
-            tables = self.query_api.query(query, org=self.org)
-
-            # Parse and organize results by timestamp
-            stats_by_time = {}
-
-            for table in tables:
-                for record in table.records:
-                    timestamp = record.get_time().isoformat()
-                    sensor_id_val = record.values.get("sensor_id")
-                    field = record.values.get("_field")
-                    stat_type = record.values.get("stat_type")
-                    value = record.values.get("_value")
-
-                    # Create key for this time window
-                    key = f"{timestamp}_{sensor_id_val}"
-
-                    if key not in stats_by_time:
-                        stats_by_time[key] = {
-                            "timestamp": timestamp,
-                            "sensor_id": sensor_id_val,
-                            "window": window,
-                            "temperature": {},
-                            "conductivity": {},
-                        }
-
-                    # Add statistic
-                    if field and stat_type:
-                        if field == "temperature":
-                            stats_by_time[key]["temperature"][stat_type] = value
-                        elif field == "conductivity":
-                            stats_by_time[key]["conductivity"][stat_type] = value
-
-            # Convert to list and sort by timestamp
-            result = sorted(
-                stats_by_time.values(), key=lambda x: x["timestamp"], reverse=True
-            )
-
-            return result
+            if self.query_cache:
+                return self.query_cache.read(
+                    "statistics",
+                    sensor_id,
+                    window,
+                    start_time,
+                    end_time,
+                    lambda start, stop: self._statistics_rows(
+                        sensor_id, start, stop, window
+                    ),
+                )
+            return self._statistics_rows(sensor_id, start_time, end_time, window)
 
         except Exception as e:
             logger.error(f"Error reading aggregated statistics from InfluxDB: {e}")
             return []
 
+    def read_aggregated_statistics_many(
+        self, sensor_ids, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed statistics for several sensors.
+
+        Args:
+            sensor_ids (list): Sensor IDs to read
+            start_time (str): Start time in ISO format or relative time
+            end_time (str): End time in ISO format (optional)
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
+
+        Returns:
+            dict: sensor_id -> list of statistical aggregations per time window
+        """
+        try:
+            return self._read_many(
+                sensor_ids,
+                lambda chunk: self._statistics_query(
+                    chunk, start_time, end_time, window
+                ),
+                lambda record: _statistics_row(record, window),
+            )
+
+        except Exception as e:
+            logger.error(f"Error reading aggregated statistics from InfluxDB: {e}")
+            return {sensor_id: [] for sensor_id in sensor_ids}
+
+    def read_statistics_columns(
+        self, sensor_id, start_time=None, end_time=None, window="1m"
+    ):
+        """
+        Read pre-computed statistics as columns instead of one dict per window.
+
+        Returns:
+            dict: "timestamp" (int64 epoch ns) plus one float64 NumPy array per
+                "<field>_<stat_type>" pair (e.g. "temperature_mean"), newest first
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        query, params = self._statistics_query(
+            [sensor_id], start_time, end_time, window
+        )
+        columns = [f"{field}_{stat}" for field in FIELDS for stat in STORED_STATS]
+        return derive_columns(
+            query_columns(self.query_api, query, self.org, columns, params=params)
+        )
+
+    def _statistics_rows(self, sensor_id, start_time, end_time, window):
+        """Read statistics as columns and assemble them into rows, newest first."""
+        return statistics_rows(
+            self.read_statistics_columns(sensor_id, start_time, end_time, window),
+            sensor_id,
+            window,
+        )
+
+    def read_sketches(self, sensor_ids, start_time=None, end_time=None, window="1m"):
+        """
+        Read the quantile sketches of a rollup tier, merged over the range.
+
+        The buckets of every window and sensor are summed in Flux, so the
+        result has one count per bucket whatever the length of the range.
+        Large sensor lists are split like the other multi-sensor reads and
+        the chunks' counts added together.
+
+        Args:
+            sensor_ids (list): Sensors whose readings are combined
+            start_time (str): Start time in ISO format or relative time
+            end_time (str): End time in ISO format (optional)
+            window (str): Rollup tier ("1m", "5m", "15m", "1h" or "1d")
+
+        Returns:
+            dict: field -> {bucket tag: count} (see storage/sketch.py)
+
+        Raises:
+            Exception: Query errors are propagated to the caller
+        """
+        sketches = {field: {} for field in FIELDS}
+        for i in range(0, len(sensor_ids), self.max_sensors_per_query):
+            query, params = self._sketch_query(
+                sensor_ids[i : i + self.max_sensors_per_query],
+                start_time,
+                end_time,
+                window,
+            )
+            for record in self.query_api.query_stream(
+                query, org=self.org, params=params
+            ):
+                _add_sketch_record(sketches, record)
+        return sketches
+
+    def get_write_stats(self):
+        """Return write pipeline counters (queue depth, flush latency, drops)."""
+        if not self.write_buffer:
+            return {"mode": self.write_mode}
+        return {"mode": self.write_mode, **self.write_buffer.stats()}
+
+    def get_cache_stats(self):
+        """Return query cache counters (hits, misses, evictions, memory use)."""
+        if not self.query_cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.query_cache.stats()}
+
+    def get_hot_tail_stats(self):
+        """Return hot tail counters (reads served from memory, sensors held)."""
+        if not self.hot_tail:
+            return {"enabled": False}
+        return {"enabled": True, **self.hot_tail.stats()}
+
     def close(self):
-        """Close the InfluxDB client connection."""
+        """Flush any buffered writes and close the InfluxDB client connection."""
+        if self.write_buffer:
+            self.write_buffer.close(timeout=30)
         if self.client:
             self.client.close()
 
@@ -0,0 +1,168 @@
+"""
+Keyset (cursor) pagination for raw measurement reads.
+A page is read newest first from a time range that ends just before the
+last row of the previous page. Instead of re-reading and sorting the whole
+remaining range for every page, each page queries a window sized from the
+density of the previous one, widening it only when it comes back short.
+Walking a long range therefore reads every point about once.
+
+The cursor handed to clients is opaque: URL-safe base64 of the range start,
+the exclusive upper bound of the next page, the window to try first and the
+number of rows at the top of the next page that were already returned.
+
+Rows are read with microsecond timestamps, while readings are stored with
+nanosecond precision, so several rows can share the microsecond of a page's
+last row. The next page therefore includes that whole microsecond and skips
+the rows of it the previous pages returned (in the same newest-first order),
+instead of starting strictly before it and losing the rest.
+"""
+
+import base64
+import json
+import time
+from storage.flux_queries import DEFAULT_START
+from utils.windows import NS_PER_SECOND, epoch_ns, parse_time
+
+# Factor a page window grows by each time it holds too few rows
+SPAN_GROWTH = 4
+
+# Margin added to the estimated window so most pages need a single query
+SPAN_HEADROOM = 1.25
+
+# Smallest window a page queries
+MIN_SPAN_NS = NS_PER_SECOND
+
+# Resolution of the row timestamps
+_TICK_NS = 1000
+
+
+def encode_cursor(start_ns, before_ns, span_ns, skip=0):
+    """Encode a page position as an opaque URL-safe string."""
+    raw = json.dumps([start_ns, before_ns, span_ns, skip], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor returned by encode_cursor().
+
+    Returns:
+        tuple: (start_ns, before_ns, span_ns, skip)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) == 3:
+            # Cursors issued before the skip count was added
+            values.append(0)
+        start_ns, before_ns, span_ns, skip = values
+        if not all(isinstance(value, int) for value in values) or skip < 0:
+            raise TypeError
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    return start_ns, before_ns, span_ns, skip
+
+
+def page_bounds(start_time=None, end_time=None, cursor=None):
+    """
+    Resolve the range of a page request to epoch nanoseconds.
+
+    A cursor carries the bounds of the first request, so a relative start
+    ("-1h") does not drift while the client walks the pages.
+
+    Returns:
+        tuple: (start_ns, before_ns, span_ns, skip); the first page reads
+            the whole range in one query and skips nothing
+
+    Raises:
+        ValueError: If a time or the cursor cannot be parsed
+    """
+    if cursor:
+        return decode_cursor(cursor)
+    start_ns = epoch_ns(parse_time(start_time or DEFAULT_START))
+    before_ns = epoch_ns(parse_time(end_time)) if end_time else time.time_ns()
+    return start_ns, before_ns, max(before_ns - start_ns, MIN_SPAN_NS), 0
+
+
+def _windows(start_ns, before_ns, span_ns):
+    """Yield successively older, wider (lower_ns, upper_ns) windows down to start."""
+    upper = before_ns
+    while upper > start_ns:
+        lower = max(start_ns, upper - span_ns)
+        yield lower, upper
+        upper = lower
+        span_ns *= SPAN_GROWTH
+
+
+def _skip_returned(rows, before_ns, skip):
+    """Drop the rows of the boundary microsecond that earlier pages returned."""
+    boundary_ns = before_ns - _TICK_NS
+    dropped = 0
+    while dropped < skip and dropped < len(rows):
+        if epoch_ns(rows[dropped]["timestamp"]) < boundary_ns:
+            break
+        dropped += 1
+    return rows[dropped:]
+
+
+def _finish(rows, limit, start_ns, before_ns, skip):
+    """Trim a page to its limit and build the cursor of the next one."""
+    rows = _skip_returned(rows, before_ns, skip)
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    newest, oldest = epoch_ns(rows[0]["timestamp"]), epoch_ns(rows[-1]["timestamp"])
+    span_ns = MIN_SPAN_NS
+    if limit > 1:
+        span_ns = max(
+            int((newest - oldest) * limit / (limit - 1) * SPAN_HEADROOM), MIN_SPAN_NS
+        )
+
+    # The next page includes the microsecond of the last row and skips the
+    # rows of it returned so far
+    next_before = oldest + _TICK_NS
+    returned = sum(1 for row in rows if epoch_ns(row["timestamp"]) == oldest)
+    if next_before == before_ns:
+        returned += skip
+    return rows, encode_cursor(start_ns, next_before, span_ns, returned)
+
+
+def read_page(fetch, start_ns, before_ns, span_ns, skip, limit):
+    """
+    Read one page of rows, newest first.
+
+    Args:
+        fetch: Callable (lower_ns, upper_ns, limit) returning the newest
+            rows in [lower_ns, upper_ns), newest first, each with a
+            "timestamp"
+        start_ns (int): Oldest time of the whole range
+        before_ns (int): Exclusive upper bound of this page
+        span_ns (int): Window to query first
+        skip (int): Rows of the microsecond below before_ns already returned
+        limit (int): Rows per page
+
+    Returns:
+        tuple: (rows, next cursor or None on the last page)
+    """
+    rows = []
+    wanted = limit + 1 + skip
+    for lower, upper in _windows(start_ns, before_ns, span_ns):
+        rows += fetch(lower, upper, wanted - len(rows))
+        if len(rows) >= wanted:
+            break
+    return _finish(rows, limit, start_ns, before_ns, skip)
+
+
+async def read_page_async(fetch, start_ns, before_ns, span_ns, skip, limit):
+    """read_page() with a coroutine fetch."""
+    rows = []
+    wanted = limit + 1 + skip
+    for lower, upper in _windows(start_ns, before_ns, span_ns):
+        rows += await fetch(lower, upper, wanted - len(rows))
+        if len(rows) >= wanted:
+            break
+    return _finish(rows, limit, start_ns, before_ns, skip)
@@ -0,0 +1,299 @@
+"""
+Read-through cache for pre-computed aggregation reads.
+Rollup windows do not change once they have been written, so the result of
+an aggregated or statistics query is split into fixed, epoch-aligned time
+blocks. Blocks that are entirely in the settled past are cached (LRU under a
+memory budget); only the still-changing tail is queried on every request.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from utils.logger_config import setup_logging
+from utils.windows import parse_duration, parse_time
+
+logger = setup_logging("query_cache")
+
+# Seconds between checks of the generation source (see generation_fn)
+GENERATION_CHECK_INTERVAL = 1.0
+
+
+def _format_time(value):
+    """Format a datetime as a Flux RFC3339 literal."""
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _estimate_bytes(rows):
+    """Approximate memory held by a list of (possibly nested) row dicts."""
+    if not rows:
+        return sys.getsizeof(rows)
+
+    def size(value):
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(
+                sys.getsizeof(k) + size(v) for k, v in value.items()
+            )
+        return sys.getsizeof(value)
+
+    return sys.getsizeof(rows) + size(rows[0]) * len(rows)
+
+
+class QueryCache:
+    """
+    LRU cache of settled time blocks of rollup query results.
+
+    A block is `block_windows` windows long and aligned to the epoch, so the
+    same block is shared by every request that overlaps it whatever its
+    relative start ("-7d" now and a minute from now). A block is cached once
+    it ends more than two windows plus `settle` seconds in the past, by which
+    time its rollup task has run. Cached blocks never expire by age; they are
+    evicted least-recently-used when `max_bytes` is exceeded, and all of them
+    are dropped when `generation_fn` (e.g. a completed backfill) changes.
+    """
+
+    def __init__(self, max_bytes, block_windows=360, settle=60.0, generation_fn=None):
+        """
+        Args:
+            max_bytes (int): Approximate memory budget for cached rows
+            block_windows (int): Windows per cached block
+            settle (float): Extra seconds before a finished block is cached
+            generation_fn: Optional callable whose return value changes
+                whenever stored rollups were rewritten
+        """
+        self.max_bytes = max_bytes
+        self.block_windows = block_windows
+        self.settle = settle
+        self.generation_fn = generation_fn
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = None
+        self._generation_checked = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "queries": 0,
+        }
+
+    def _check_generation(self):
+        """Drop every entry if the generation source has changed."""
+        if not self.generation_fn:
+            return
+        now = time.monotonic()
+        if now - self._generation_checked < GENERATION_CHECK_INTERVAL:
+            return
+        self._generation_checked = now
+
+        try:
+            generation = self.generation_fn()
+        except Exception as e:
+            logger.error(f"Error reading cache generation: {e}")
+            return
+
+        with self._lock:
+            if self._generation is not None and generation != self._generation:
+                self._entries.clear()
+                self._bytes = 0
+                self._stats["invalidations"] += 1
+            self._generation = generation
+
+    def _get(self, key):
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return rows[0]
+
+    def _put(self, key, rows):
+        size = _estimate_bytes(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (rows, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def _plan(self, kind, sensor_id, window, start_time, end_time):
+        """
+        Work out which cached blocks to use and which segments to query.
+
+        Returns:
+            dict: The cached blocks found, the (run, start, stop) segments to
+                fetch (run being the blocks each one fills) and the range
+                bounds, for _assemble(); None if the range is empty
+        """
+        self._check_generation()
+
+        now = datetime.now(timezone.utc)
+        start = parse_time(start_time or "-7d", now)
+        stop = parse_time(end_time, now) if end_time else now
+        if stop <= start:
+            return None
+
+        window_seconds = parse_duration(window)
+        block_seconds = window_seconds * self.block_windows
+        settled = now - timedelta(seconds=2 * window_seconds + self.settle)
+
+        # Epoch-aligned blocks covering [start, stop); the settled ones are cacheable
+        first = int(start.timestamp()) // block_seconds * block_seconds
+        block_starts = range(first, int(stop.timestamp()), block_seconds)
+        closed = [
+            b
+            for b in block_starts
+            if datetime.fromtimestamp(b + block_seconds, tz=timezone.utc) <= settled
+        ]
+        # Segments are queried with whole-second bounds (_format_time), so the
+        # tail starts and stops on the seconds actually fetched; rows outside
+        # [start, stop) are filtered out again in _assemble()
+        tail_start = (
+            datetime.fromtimestamp(closed[-1] + block_seconds, tz=timezone.utc)
+            if closed
+            else start.replace(microsecond=0)
+        )
+        fetch_stop = stop
+        if stop.microsecond:
+            fetch_stop = stop.replace(microsecond=0) + timedelta(seconds=1)
+
+        blocks = {}
+        missing = []
+        for b in closed:
+            rows = self._get((kind, sensor_id, window, b))
+            if rows is None:
+                missing.append(b)
+            else:
+                blocks[b] = rows
+
+        # One query per run of adjacent missing blocks; the run ending where
+        # the tail begins also covers the tail
+        runs = []
+        for b in missing:
+            if runs and runs[-1][-1] + block_seconds == b:
+                runs[-1].append(b)
+            else:
+                runs.append([b])
+        tail_seconds = tail_start.timestamp()
+        fetch_tail = tail_start < fetch_stop
+        segments = []
+        for run in runs:
+            run_start = datetime.fromtimestamp(run[0], tz=timezone.utc)
+            run_stop = run[-1] + block_seconds
+            if fetch_tail and run_stop == tail_seconds:
+                segments.append((run, run_start, fetch_stop))
+                fetch_tail = False
+            else:
+                segments.append(
+                    (run, run_start, datetime.fromtimestamp(run_stop, tz=timezone.utc))
+                )
+        if fetch_tail:
+            segments.append(([], tail_start, fetch_stop))
+
+        with self._lock:
+            self._stats["queries"] += len(segments)
+
+        return {
+            "key": (kind, sensor_id, window),
+            "blocks": blocks,
+            "segments": segments,
+            "block_seconds": block_seconds,
+            "tail_seconds": tail_seconds,
+            "start_seconds": start.timestamp(),
+            "stop_seconds": stop.timestamp(),
+        }
+
+    def _assemble(self, plan, fetched_rows):
+        """Cache the fetched blocks and merge them with the cached ones, newest first."""
+        blocks = plan["blocks"]
+        block_seconds = plan["block_seconds"]
+        tail_seconds = plan["tail_seconds"]
+
+        tail = []
+        for (run, _, _), rows in zip(plan["segments"], fetched_rows):
+            fetched = {b: [] for b in run}
+            for row in rows:
+                t = datetime.fromisoformat(row["timestamp"]).timestamp()
+                if t >= tail_seconds:
+                    tail.append(row)
+                else:
+                    fetched[int(t) // block_seconds * block_seconds].append(row)
+            for b, block_rows in fetched.items():
+                self._put((*plan["key"], b), block_rows)
+                blocks[b] = block_rows
+
+        start_seconds = plan["start_seconds"]
+        stop_seconds = plan["stop_seconds"]
+
+        def in_range(row):
+            t = datetime.fromisoformat(row["timestamp"]).timestamp()
+            return start_seconds <= t < stop_seconds
+
+        result = [row for row in tail if in_range(row)]
+        for b in sorted(blocks, reverse=True):
+            if b < start_seconds or b + block_seconds > stop_seconds:
+                result.extend(row for row in blocks[b] if in_range(row))
+            else:
+                result.extend(blocks[b])
+        return result
+
+    def read(self, kind, sensor_id, window, start_time, end_time, fetch):
+        """
+        Read rows for [start_time, end_time), newest first, through the cache.
+
+        Args:
+            kind (str): Query kind, part of the key ("aggregated", "statistics")
+            sensor_id (str): Sensor the rows belong to
+            window (str): Rollup tier
+            start_time (str): Start time (relative or ISO, default "-7d")
+            end_time (str): End time (ISO, optional)
+            fetch: Callable(start, stop) taking RFC3339 strings and returning
+                rows with an ISO "timestamp", newest first
+
+        Returns:
+            list: Rows within the requested range, newest first
+        """
+        plan = self._plan(kind, sensor_id, window, start_time, end_time)
+        if plan is None:
+            return []
+        fetched_rows = [
+            fetch(_format_time(start), _format_time(stop))
+            for _, start, stop in plan["segments"]
+        ]
+        return self._assemble(plan, fetched_rows)
+
+    async def read_async(self, kind, sensor_id, window, start_time, end_time, fetch):
+        """
+        Like read(), for a coroutine `fetch`; missing segments are queried concurrently.
+        """
+        plan = self._plan(kind, sensor_id, window, start_time, end_time)
+        if plan is None:
+            return []
+        fetched_rows = await asyncio.gather(
+            *(
+                fetch(_format_time(start), _format_time(stop))
+                for _, start, stop in plan["segments"]
+            )
+        )
+        return self._assemble(plan, fetched_rows)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current memory use."""
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
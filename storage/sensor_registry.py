@@ -0,0 +1,238 @@
+"""
+Persistent registry of every sensor that has sent measurements.
+`GET /sensors` used to run a distinct() over 30 days of raw points, which
+was the slowest read and forgot sensors that had been quiet for longer.
+The registry keeps one row per sensor (first seen, last seen, readings) in a
+local SQLite file, updated as readings are ingested, so listing sensors is a
+primary-key range scan regardless of how much data is stored.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from utils.logger_config import setup_logging
+from utils.windows import NS_PER_SECOND, epoch_ns
+
+logger = setup_logging("sensor_registry")
+
+# Shared by every API process on the host
+REGISTRY_PATH = os.getenv("SENSOR_REGISTRY_PATH", "logs/sensor_registry.db")
+
+# Seconds between writes of newly ingested readings to the registry file
+FLUSH_INTERVAL = float(os.getenv("SENSOR_REGISTRY_FLUSH_INTERVAL", "1"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensors (
+    sensor_id TEXT PRIMARY KEY,
+    first_seen_ns INTEGER,
+    last_seen_ns INTEGER,
+    readings INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sensors_last_seen ON sensors (last_seen_ns);
+CREATE TABLE IF NOT EXISTS registry_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Merge a batch of readings into a sensor's row; NULL times are unknown
+_UPSERT = """
+INSERT INTO sensors (sensor_id, first_seen_ns, last_seen_ns, readings)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (sensor_id) DO UPDATE SET
+    first_seen_ns = min(coalesce(first_seen_ns, excluded.first_seen_ns),
+                        coalesce(excluded.first_seen_ns, first_seen_ns)),
+    last_seen_ns = max(coalesce(last_seen_ns, excluded.last_seen_ns),
+                       coalesce(excluded.last_seen_ns, last_seen_ns)),
+    readings = readings + excluded.readings
+"""
+
+
+def _isoformat(time_ns):
+    if time_ns is None:
+        return None
+    seconds, ns = divmod(time_ns, NS_PER_SECOND)
+    moment = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    return moment.replace(microsecond=ns // 1000).isoformat()
+
+
+class SensorRegistry:
+    """
+    SQLite-backed index of sensors, their first/last reading and reading count.
+
+    Ingested readings are summarised in memory and merged into the database
+    at most every FLUSH_INTERVAL seconds (and before every read and on
+    close()). Merges are upserts that take the min/max of the seen times and
+    add the counts, so several API processes can share one file.
+    """
+
+    def __init__(self, path=REGISTRY_PATH, flush_interval=FLUSH_INTERVAL):
+        """
+        Args:
+            path (str): SQLite database file
+            flush_interval (float): Seconds between writes of pending updates
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+        # sensor_id -> [first_seen_ns, last_seen_ns, readings] not yet written
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stats = {"observed": 0, "flushes": 0, "flush_errors": 0}
+
+    def observe(self, measurements):
+        """
+        Record ingested measurements.
+
+        Args:
+            measurements (list): Dictionaries with sensor_id and timestamp keys
+        """
+        flush = False
+        with self._lock:
+            for measurement in measurements:
+                try:
+                    sensor_id = measurement["sensor_id"]
+                    time_ns = epoch_ns(measurement["timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                self._stats["observed"] += 1
+                entry = self._pending.get(sensor_id)
+                if entry is None:
+                    self._pending[sensor_id] = [time_ns, time_ns, 1]
+                else:
+                    entry[0] = min(entry[0], time_ns)
+                    entry[1] = max(entry[1], time_ns)
+                    entry[2] += 1
+
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                flush = bool(self._pending)
+
+        if flush:
+            self.flush()
+
+    def register(self, sensor_ids):
+        """Add sensors whose readings were not seen by the registry (no times)."""
+        with self._db_lock, self._db:
+            self._db.executemany(
+                _UPSERT, [(sensor_id, None, None, 0) for sensor_id in sensor_ids]
+            )
+
+    def flush(self):
+        """Write pending updates to the database."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        try:
+            with self._db_lock, self._db:
+                self._db.executemany(
+                    _UPSERT,
+                    [(sensor_id, *entry) for sensor_id, entry in pending.items()],
+                )
+            with self._lock:
+                self._stats["flushes"] += 1
+        except sqlite3.Error as e:
+            logger.error(f"Error writing sensor registry {self.path}: {e}")
+            with self._lock:
+                self._stats["flush_errors"] += 1
+                for sensor_id, (first, last, count) in pending.items():
+                    entry = self._pending.setdefault(sensor_id, [first, last, 0])
+                    entry[0] = min(entry[0], first)
+                    entry[1] = max(entry[1], last)
+                    entry[2] += count
+
+    def list_sensors(self, limit=None, after=None, seen_since_ns=None, prefix=None):
+        """
+        List sensors in sensor_id order.
+
+        Args:
+            limit (int): Maximum sensors to return (default: all)
+            after (str): Only sensors whose ID sorts after this one (paging cursor)
+            seen_since_ns (int): Only sensors with a reading at or after this
+                time (epoch nanoseconds)
+            prefix (str): Only sensor IDs starting with this string
+
+        Returns:
+            list: Dictionaries with sensor_id, first_seen, last_seen (RFC3339,
+                None if unknown) and readings
+        """
+        self.flush()
+
+        clauses, values = [], []
+        if after is not None:
+            clauses.append("sensor_id > ?")
+            values.append(after)
+        if prefix:
+            clauses.append("substr(sensor_id, 1, ?) = ?")
+            values += [len(prefix), prefix]
+        if seen_since_ns is not None:
+            clauses.append("last_seen_ns >= ?")
+            values.append(seen_since_ns)
+
+        query = "SELECT sensor_id, first_seen_ns, last_seen_ns, readings FROM sensors"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY sensor_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+
+        with self._db_lock:
+            rows = self._db.execute(query, values).fetchall()
+        return [
+            {
+                "sensor_id": sensor_id,
+                "first_seen": _isoformat(first_ns),
+                "last_seen": _isoformat(last_ns),
+                "readings": readings,
+            }
+            for sensor_id, first_ns, last_ns, readings in rows
+        ]
+
+    def get_meta(self, key):
+        """Return a value stored with set_meta(), or None."""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value FROM registry_meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        """Store a registry-wide string value (e.g. when it was seeded)."""
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO registry_meta (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    def stats(self):
+        """Return registry counters and the number of sensors with pending updates."""
+        with self._lock:
+            stats = {**self._stats, "pending_sensors": len(self._pending)}
+        with self._db_lock:
+            stats["sensors"] = self._db.execute(
+                "SELECT count(*) FROM sensors"
+            ).fetchone()[0]
+        return stats
+
+    def close(self):
+        """Flush pending updates and close the database."""
+        self.flush()
+        with self._db_lock:
+            self._db.close()
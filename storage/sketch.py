@@ -0,0 +1,157 @@
+"""
+Mergeable quantile sketches stored alongside the rollup statistics.
+Percentiles cannot be rolled up from mean/min/max, and exact quantiles need
+every raw reading. Each rollup window therefore also stores a DDSketch-style
+histogram per sensor and field: readings are counted in logarithmic buckets
+whose bounds grow by a factor GAMMA, so a value read back from a bucket is
+within RELATIVE_ACCURACY of every reading counted in it. Two histograms
+merge by adding the counts of equal buckets, which is how the rollup tasks
+build coarser tiers and how percentile reads combine windows and sensors.
+
+Buckets are stored in water_quality_<window>_sketch, one series per
+(sensor_id, bucket) holding the count of each field. The bucket tag is
+"p<index>" for positive values, "n<index>" for negative ones and "z" for
+values within MIN_VALUE of zero; value v > 0 falls in bucket
+ceil(log(v) / log(GAMMA)), which covers (GAMMA^(index-1), GAMMA^index].
+"""
+
+import math
+import numpy as np
+
+# Relative error of every estimated percentile; changing it makes stored
+# buckets unreadable, so it is a constant rather than a setting
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Values closer to zero than this are counted in the "z" bucket
+MIN_VALUE = 1e-9
+
+# Percentiles returned when a read does not ask for specific ones
+DEFAULT_PERCENTILES = (50.0, 95.0, 99.0)
+
+# The bucket of r._value, matching bucket_codes()/bucket_tag() below (Flux
+# float literals have no exponent form)
+FLUX_BUCKET = (
+    f'if r._value > {MIN_VALUE:.12f} then "p" + string(v: int(v: '
+    f"math.ceil(x: math.log(x: r._value) / {LOG_GAMMA!r})))"
+    f' else if r._value < -{MIN_VALUE:.12f} then "n" + string(v: int(v: '
+    f"math.ceil(x: math.log(x: -r._value) / {LOG_GAMMA!r})))"
+    ' else "z"'
+)
+
+# Sign part of a bucket code (code = 3 * index + sign)
+_SIGNS = ("z", "p", "n")
+
+
+def sketch_measurement(window):
+    """Measurement holding the sketches of a rollup tier."""
+    return f"water_quality_{window}_sketch"
+
+
+def bucket_codes(values):
+    """
+    Map readings to integer bucket codes, vectorized.
+
+    Args:
+        values (np.ndarray): Finite float64 readings (any shape)
+
+    Returns:
+        np.ndarray: int64 codes of the same shape; decode with bucket_tag()
+    """
+    magnitude = np.abs(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.ceil(np.log(np.maximum(magnitude, MIN_VALUE)) / LOG_GAMMA)
+    sign = np.where(magnitude <= MIN_VALUE, 0, np.where(values > 0, 1, 2))
+    index = np.where(sign == 0, 0, index).astype(np.int64)
+    return 3 * index + sign
+
+
+def bucket_tag(code):
+    """Bucket tag ("p12", "n3", "z") of a code from bucket_codes()."""
+    index, sign = divmod(int(code), 3)
+    return "z" if sign == 0 else f"{_SIGNS[sign]}{index}"
+
+
+def bucket_value(tag):
+    """
+    Representative value of a bucket: the point whose relative distance to
+    both bucket bounds is RELATIVE_ACCURACY.
+
+    Raises:
+        ValueError: If the tag is not a bucket tag
+    """
+    if tag == "z":
+        return 0.0
+    if tag[:1] not in ("p", "n"):
+        raise ValueError(f"Invalid sketch bucket: {tag!r}")
+    value = 2.0 * GAMMA ** int(tag[1:]) / (GAMMA + 1.0)
+    return value if tag[0] == "p" else -value
+
+
+def merge_counts(target, counts):
+    """Add the bucket counts of one sketch ({tag: count}) into another."""
+    for tag, count in counts.items():
+        target[tag] = target.get(tag, 0) + count
+    return target
+
+
+def percentiles(counts, ranks=DEFAULT_PERCENTILES):
+    """
+    Estimate percentiles from merged bucket counts.
+
+    Args:
+        counts (dict): bucket tag -> number of readings
+        ranks (list): Percentiles to estimate, each in [0, 100]
+
+    Returns:
+        dict: "count" (readings in the sketch) plus "p<rank>" -> estimated
+            value (e.g. "p99", "p99.9"); the values are None for an empty
+            sketch
+    """
+    buckets = sorted(
+        ((bucket_value(tag), count) for tag, count in counts.items() if count > 0)
+    )
+    total = sum(count for _, count in buckets)
+    result = {"count": int(total)}
+    if not buckets:
+        result.update({f"p{rank:g}": None for rank in ranks})
+        return result
+
+    values = np.array([value for value, _ in buckets])
+    cumulative = np.cumsum([count for _, count in buckets])
+    targets = np.array(ranks, dtype=np.float64) / 100.0 * (total - 1)
+    positions = np.minimum(
+        np.searchsorted(cumulative, targets, side="right"), len(values) - 1
+    )
+    for rank, position in zip(ranks, positions.tolist()):
+        result[f"p{rank:g}"] = float(values[position])
+    return result
+
+
+def parse_percentiles(text):
+    """
+    Parse a comma-separated list of percentiles ("50,95,99.9").
+
+    Returns:
+        list: Unique percentiles in request order (DEFAULT_PERCENTILES if
+            the text is empty)
+
+    Raises:
+        ValueError: If a value is not a number in [0, 100]
+    """
+    if not text:
+        return list(DEFAULT_PERCENTILES)
+    ranks = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        try:
+            rank = float(part)
+        except ValueError:
+            raise ValueError(f"Invalid percentile: {part.strip()!r}") from None
+        if not 0.0 <= rank <= 100.0:
+            raise ValueError(f"Percentiles must be between 0 and 100, got {rank:g}")
+        if rank not in ranks:
+            ranks.append(rank)
+    return ranks or list(DEFAULT_PERCENTILES)
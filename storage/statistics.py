@@ -0,0 +1,114 @@
+"""
+Statistics returned by the statistics reads, derived from the stored rollups.
+Every rollup window stores mean, min, max, count, sum and sumsq per field
+(see operations/aggregation_tasks.py). Reads return mean, min, max, count
+and the sample standard deviation, computed from count, sum and sum of
+squares so that any tier, and any merge of windows, stays exact.
+
+Columns are derived with vectorized NumPy; single records (streaming and
+multi-sensor reads) go through the scalar functions, which use the same
+formula.
+"""
+
+import math
+import numpy as np
+from storage.columnar import format_timestamps
+from storage.flux_queries import FIELDS, STAT_TYPES, STORED_STATS
+
+
+def stddev(count, total, sumsq):
+    """
+    Sample standard deviation from a count, sum and sum of squares.
+
+    Returns:
+        float: The standard deviation, or None for fewer than two readings
+            or missing inputs
+    """
+    if count is None or total is None or sumsq is None or count < 2:
+        return None
+    return math.sqrt(max(sumsq - total * total / count, 0.0) / (count - 1))
+
+
+def field_statistics(values, field):
+    """
+    Build one field's statistics from a pivoted row.
+
+    Args:
+        values (dict): "<field>_<stat>" -> stored value (e.g. record.values)
+        field (str): Field name
+
+    Returns:
+        dict: stat_type -> value for the statistics present; count is an int
+    """
+    stored = {stat: values.get(f"{field}_{stat}") for stat in STORED_STATS}
+    statistics = {
+        stat: stored[stat]
+        for stat in ("mean", "min", "max")
+        if stored[stat] is not None
+    }
+    if stored["count"] is not None:
+        statistics["count"] = int(stored["count"])
+    deviation = stddev(stored["count"], stored["sum"], stored["sumsq"])
+    if deviation is not None:
+        statistics["stddev"] = deviation
+    return statistics
+
+
+def derive_columns(columns):
+    """
+    Turn stored statistic columns into the returned ones.
+
+    Args:
+        columns (dict): "timestamp" plus a float64 array per
+            "<field>_<stat>" in STORED_STATS (NaN where missing)
+
+    Returns:
+        dict: "timestamp" plus a float64 array per "<field>_<stat>" in
+            STAT_TYPES; stddev is NaN for windows with fewer than two readings
+    """
+    derived = {"timestamp": columns["timestamp"]}
+    for field in FIELDS:
+        count = columns[f"{field}_count"]
+        total = columns[f"{field}_sum"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = np.maximum(columns[f"{field}_sumsq"] - total * total / count, 0)
+            deviation = np.where(count >= 2, np.sqrt(variance / (count - 1)), np.nan)
+        for stat in STAT_TYPES:
+            if stat == "stddev":
+                derived[f"{field}_stddev"] = deviation
+            else:
+                derived[f"{field}_{stat}"] = columns[f"{field}_{stat}"]
+    return derived
+
+
+def statistics_rows(columns, sensor_id, window):
+    """
+    Assemble statistics rows from derived columns.
+
+    Each column is converted to a Python list once; rows are then built
+    without per-value NumPy access. NaN statistics are left out of a row.
+
+    Returns:
+        list: Dictionaries shaped like the rows of read_aggregated_statistics
+    """
+    per_field = []
+    for field in FIELDS:
+        stats = []
+        for stat in STAT_TYPES:
+            values = columns[f"{field}_{stat}"].tolist()
+            if stat == "count":
+                values = [None if v != v else int(v) for v in values]
+            stats.append((stat, values))
+        per_field.append((field, stats))
+
+    rows = []
+    for index, timestamp in enumerate(format_timestamps(columns["timestamp"])):
+        row = {"timestamp": timestamp, "sensor_id": sensor_id, "window": window}
+        for field, stats in per_field:
+            row[field] = {
+                stat: values[index]
+                for stat, values in stats
+                if values[index] is not None and values[index] == values[index]
+            }
+        rows.append(row)
+    return rows
@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+from collections import deque
+from utils.logger_config import setup_logging
+
+logger = setup_logging("write_buffer")
+
+
+class WriteBufferFullError(Exception):
+    """Raised when the write buffer cannot accept more points."""
+
+    def __init__(self, retry_after):
+        super().__init__("Write buffer is full")
+        self.retry_after = retry_after
+
+
+class BufferedWriter:
+    """
+    Bounded in-process queue of line-protocol points flushed by a background thread.
+
+    Points are flushed once `batch_size` points are waiting or `flush_interval`
+    seconds have passed since the oldest waiting point was queued, whichever
+    comes first. Failed flushes are retried with jittered exponential backoff;
+    points that still fail after `max_retries` attempts are dropped and counted.
+
+    When the queue is full, `submit` waits up to `enqueue_timeout` seconds for
+    room and then raises WriteBufferFullError so callers can shed load instead
+    of blocking indefinitely.
+    """
+
+    def __init__(
+        self,
+        write_fn,
+        max_queue_size=100000,
+        batch_size=5000,
+        flush_interval=1.0,
+        max_retries=5,
+        base_backoff=0.5,
+        max_backoff=30.0,
+        enqueue_timeout=0.05,
+    ):
+        """
+        Args:
+            write_fn: Callable taking a newline-joined line-protocol payload
+            max_queue_size (int): Maximum number of points waiting to be written
+            batch_size (int): Maximum number of points sent per write
+            flush_interval (float): Seconds a point may wait before a flush
+            max_retries (int): Write attempts per batch before dropping it
+            base_backoff (float): Initial retry delay in seconds
+            max_backoff (float): Upper bound on the retry delay in seconds
+            enqueue_timeout (float): Seconds `submit` waits for room when full
+        """
+        self.write_fn = write_fn
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = deque()
+        self._oldest_enqueued_at = None
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "retries": 0,
+            "flushes": 0,
+            "last_flush_latency_ms": None,
+            "max_flush_latency_ms": None,
+            "total_flush_latency_ms": 0.0,
+        }
+
+        self._thread = threading.Thread(
+            target=self._run, name="influx-buffered-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, lines):
+        """
+        Queue line-protocol points for writing.
+
+        Args:
+            lines (list): Line-protocol strings, one per point
+
+        Raises:
+            WriteBufferFullError: If there is no room for all points in time
+        """
+        count = len(lines)
+        if count == 0:
+            return
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+
+            deadline = time.monotonic() + self.enqueue_timeout
+            while len(self._queue) + count > self.max_queue_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or count > self.max_queue_size:
+                    self._stats["rejected"] += count
+                    raise WriteBufferFullError(self._retry_after())
+                self._not_full.wait(remaining)
+
+            was_empty = not self._queue
+            if was_empty:
+                self._oldest_enqueued_at = time.monotonic()
+            self._queue.extend(lines)
+            self._stats["enqueued"] += count
+
+            # Wake the idle writer so it starts the flush_interval timer
+            if was_empty or len(self._queue) >= self.batch_size:
+                self._not_empty.notify()
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued point has been written or dropped.
+
+        Returns:
+            bool: True if the buffer drained before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            if self._queue:
+                self._flush_requested = True
+                self._not_empty.notify()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Flush pending points and stop the background writer."""
+        drained = self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify()
+        self._thread.join(timeout)
+        return drained
+
+    def stats(self):
+        """Return a snapshot of queue depth, throughput and flush latency counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._queue)
+            stats["in_flight"] = self._in_flight
+            stats["max_queue_size"] = self.max_queue_size
+
+        total_latency = stats.pop("total_flush_latency_ms")
+        stats["avg_flush_latency_ms"] = (
+            round(total_latency / stats["flushes"], 3) if stats["flushes"] else None
+        )
+        return stats
+
+    def _retry_after(self):
+        """Estimate how many seconds it takes to drain the queue (caller holds lock)."""
+        flushes = self._stats["flushes"]
+        if not flushes or not self._stats["written"]:
+            return max(1, int(self.flush_interval))
+
+        avg_latency_s = self._stats["total_flush_latency_ms"] / flushes / 1000.0
+        points_per_flush = self._stats["written"] / flushes
+        batches_waiting = len(self._queue) / max(points_per_flush, 1.0)
+        return max(1, int(batches_waiting * avg_latency_s + 0.999))
+
+    def _next_batch(self):
+        """Wait for a size or time threshold and take the next batch off the queue."""
+        with self._lock:
+            while True:
+                if self._queue:
+                    waited = time.monotonic() - self._oldest_enqueued_at
+                    if (
+                        len(self._queue) >= self.batch_size
+                        or waited >= self.flush_interval
+                        or self._flush_requested
+                        or self._closed
+                    ):
+                        break
+                    self._not_empty.wait(self.flush_interval - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._not_empty.wait()
+
+            count = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._oldest_enqueued_at = time.monotonic() if self._queue else None
+            self._in_flight = count
+            self._not_full.notify_all()
+            return batch
+
+    def _write_with_retry(self, batch):
+        """Write one batch, retrying with jittered exponential backoff."""
+        payload = "\n".join(batch)
+        for attempt in range(self.max_retries):
+            try:
+                self.write_fn(payload)
+                return True
+            except Exception as e:
+                if attempt + 1 >= self.max_retries:
+                    logger.error(
+                        f"Dropping {len(batch)} points after "
+                        f"{self.max_retries} failed writes: {e}"
+                    )
+                    return False
+
+                delay = min(self.max_backoff, self.base_backoff * (2**attempt))
+                delay *= random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"Write of {len(batch)} points failed ({e}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+        return False
+
+    def _run(self):
+        """Background writer loop."""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            started = time.perf_counter()
+            written = self._write_with_retry(batch)
+            latency_ms = (time.perf_counter() - started) * 1000.0
+
+            with self._lock:
+                self._in_flight = 0
+                if written:
+                    self._stats["written"] += len(batch)
+                    self._stats["flushes"] += 1
+                    self._stats["last_flush_latency_ms"] = round(latency_ms, 3)
+                    self._stats["max_flush_latency_ms"] = round(
+                        max(self._stats["max_flush_latency_ms"] or 0.0, latency_ms), 3
+                    )
+                    self._stats["total_flush_latency_ms"] += latency_ms
+                else:
+                    self._stats["dropped"] += len(batch)
+                if not self._queue:
+                    self._flush_requested = False
+                    self._drained.notify_all()
@@ -0,0 +1,216 @@
+"""
+Tests for ingest alert rules and the alert engine (operations/alerting.py).
+Run with: python -m pytest tests
+"""
+
+import random
+import statistics
+import pytest
+from operations.alerting import AlertEngine, Rule, _RingStats
+from utils.windows import NS_PER_SECOND
+
+T0 = 1733049000 * NS_PER_SECOND
+
+
+def _check(rule, values, step_ns=NS_PER_SECOND):
+    """Feed one sensor's values to a rule; return the violations in order."""
+    state = {}
+    return [
+        rule.check(state, float(value), T0 + i * step_ns)
+        for i, value in enumerate(values)
+    ]
+
+
+def _measurements(sensor_id, values, field="conductivity"):
+    return [
+        {"sensor_id": sensor_id, "timestamp": T0 + i * NS_PER_SECOND, field: value}
+        for i, value in enumerate(values)
+    ]
+
+
+def _engine(specs, cooldown=0.0):
+    return AlertEngine(
+        [Rule(spec) for spec in specs], log_path="", webhook_url="", cooldown=cooldown
+    )
+
+
+def _delivered(engine):
+    engine.close()
+    return engine.recent(limit=1000)
+
+
+def test_threshold_rule():
+    rule = Rule(
+        {
+            "name": "range",
+            "type": "threshold",
+            "field": "temperature",
+            "above": 30,
+            "below": 0,
+        }
+    )
+
+    assert _check(rule, [15, 30, 30.5, -1, 0]) == [
+        None,
+        None,
+        {"above": 30.0},
+        {"below": 0.0},
+        None,
+    ]
+
+
+def test_rate_rule():
+    rule = Rule(
+        {"name": "jump", "type": "rate", "field": "conductivity", "max_rate": 50}
+    )
+
+    violations = _check(rule, [1000, 1020, 1080, 1030], step_ns=NS_PER_SECOND // 2)
+
+    assert violations[:2] == [None, None]
+    assert violations[2] == {"rate": pytest.approx(120.0), "max_rate": 50.0}
+    assert violations[3] == {"rate": pytest.approx(-100.0), "max_rate": 50.0}
+
+
+def test_rate_rule_ignores_out_of_order_readings():
+    rule = Rule(
+        {"name": "jump", "type": "rate", "field": "conductivity", "max_rate": 50}
+    )
+    state = {}
+
+    assert rule.check(state, 1000.0, T0 + 2 * NS_PER_SECOND) is None
+    assert rule.check(state, 5000.0, T0 + NS_PER_SECOND) is None
+    assert rule.check(state, 1010.0, T0 + 3 * NS_PER_SECOND) is None
+
+
+def test_zscore_rule():
+    rule = Rule(
+        {
+            "name": "anomaly",
+            "type": "zscore",
+            "field": "conductivity",
+            "window": 20,
+            "threshold": 4,
+            "min_samples": 10,
+        }
+    )
+    rng = random.Random(1)
+    baseline = [1500 + rng.gauss(0, 5) for _ in range(20)]
+
+    violations = _check(rule, baseline + [1600])
+
+    assert violations[:-1] == [None] * 20
+    expected_z = (1600 - statistics.fmean(baseline)) / statistics.stdev(baseline)
+    assert violations[-1]["zscore"] == pytest.approx(expected_z)
+    assert violations[-1]["threshold"] == 4.0
+
+
+def test_zscore_rule_waits_for_min_samples():
+    rule = Rule(
+        {
+            "name": "anomaly",
+            "type": "zscore",
+            "field": "conductivity",
+            "window": 20,
+            "min_samples": 5,
+        }
+    )
+
+    assert _check(rule, [1500, 1501, 1499, 1500, 5000]) == [None] * 5
+    assert _check(rule, [1500, 1501, 1499, 1500, 1500, 5000])[-1] is not None
+
+
+@pytest.mark.parametrize("count", [3, 7, 8, 50, 123])
+def test_ring_stats_match_last_window(count):
+    ring = _RingStats(8)
+    rng = random.Random(count)
+    values = [rng.uniform(-1e3, 1e3) for _ in range(count)]
+    for value in values:
+        ring.add(value)
+
+    mean, stddev = ring.mean_stddev()
+
+    window = values[-8:]
+    assert ring.count == len(window)
+    assert mean == pytest.approx(statistics.fmean(window))
+    assert stddev == pytest.approx(statistics.stdev(window))
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"type": "threshold", "field": "conductivity", "above": 1},
+        {"name": "r", "type": "unknown", "field": "conductivity"},
+        {"name": "r", "type": "threshold", "field": "ph", "above": 1},
+        {"name": "r", "type": "threshold", "field": "conductivity"},
+        {"name": "r", "type": "rate", "field": "conductivity"},
+        {"name": "r", "type": "rate", "field": "conductivity", "max_rate": 0},
+        {"name": "r", "type": "zscore", "field": "conductivity", "window": 1},
+    ],
+)
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(ValueError):
+        Rule(spec)
+
+
+def test_engine_delivers_alerts():
+    engine = _engine(
+        [{"name": "high", "type": "threshold", "field": "conductivity", "above": 2000}]
+    )
+
+    engine.evaluate(_measurements("s1", [1500, 2500]))
+
+    (alert,) = _delivered(engine)
+    assert alert["rule"] == "high"
+    assert alert["sensor_id"] == "s1"
+    assert alert["value"] == 2500
+    assert alert["detail"] == {"above": 2000.0}
+    assert alert["timestamp"].startswith("2024-12-01T10:30:01")
+
+
+def test_cooldown_suppresses_repeats_per_sensor():
+    engine = _engine(
+        [{"name": "high", "type": "threshold", "field": "conductivity", "above": 2000}],
+        cooldown=60,
+    )
+
+    engine.evaluate(_measurements("s1", [2500, 2600, 2700]))
+    engine.evaluate(_measurements("s2", [2500]))
+
+    alerts = _delivered(engine)
+    assert [alert["sensor_id"] for alert in alerts] == ["s1", "s2"]
+    assert engine.stats()["suppressed"] == 2
+
+
+def test_no_cooldown_fires_every_violation():
+    engine = _engine(
+        [{"name": "high", "type": "threshold", "field": "conductivity", "above": 2000}]
+    )
+
+    engine.evaluate(_measurements("s1", [2500, 2600, 2700]))
+
+    assert len(_delivered(engine)) == 3
+
+
+def test_sensor_prefix_and_invalid_readings():
+    engine = _engine(
+        [
+            {
+                "name": "high",
+                "type": "threshold",
+                "field": "temperature",
+                "above": 30,
+                "sensor_prefix": "lake-",
+            }
+        ]
+    )
+
+    engine.evaluate(
+        [
+            *_measurements("river-1", [40], field="temperature"),
+            *_measurements("lake-1", [float("nan"), 40], field="temperature"),
+            {"sensor_id": "lake-2", "timestamp": "not a time", "temperature": 40},
+        ]
+    )
+
+    assert [alert["sensor_id"] for alert in _delivered(engine)] == ["lake-1"]
+    assert engine.stats()["readings"] == 3
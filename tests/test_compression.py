@@ -0,0 +1,135 @@
+"""
+Tests for request body decoding and response compression (api/compression.py).
+Run with: python -m pytest tests
+"""
+
+import gzip
+import zlib
+import pytest
+from api import compression
+from api.compression import (
+    RequestBodyError,
+    compress,
+    compress_stream,
+    decode_body,
+    negotiate,
+)
+
+BODY = b'[{"sensor_id":"s1","temperature":20.5}]' * 50
+
+
+@pytest.mark.parametrize("encoding", [None, "identity", " Identity "])
+def test_identity(encoding):
+    assert decode_body(BODY, encoding) == BODY
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "x-gzip", "GZIP"])
+def test_gzip(encoding):
+    assert decode_body(gzip.compress(BODY), encoding) == BODY
+
+
+def test_deflate():
+    assert decode_body(zlib.compress(BODY), "deflate") == BODY
+
+
+def test_multi_member_gzip():
+    data = gzip.compress(BODY[:100]) + gzip.compress(BODY[100:])
+
+    assert decode_body(data, "gzip") == BODY
+
+
+def test_deflate_trailing_data():
+    with pytest.raises(RequestBodyError) as error:
+        decode_body(zlib.compress(BODY) + b"extra", "deflate")
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"not compressed",
+        gzip.compress(BODY)[:20],
+        gzip.compress(BODY) + b"garbage",
+        b"",
+    ],
+    ids=["corrupt", "truncated", "trailing garbage", "empty"],
+)
+def test_invalid_gzip(data):
+    with pytest.raises(RequestBodyError) as error:
+        decode_body(data, "gzip")
+    assert error.value.status == 400
+
+
+def test_size_cap(monkeypatch):
+    monkeypatch.setattr(compression, "MAX_DECOMPRESSED_BYTES", len(BODY))
+    assert decode_body(gzip.compress(BODY), "gzip") == BODY
+
+    with pytest.raises(RequestBodyError) as error:
+        decode_body(gzip.compress(BODY + b" "), "gzip")
+    assert error.value.status == 413
+
+
+def test_size_cap_across_members(monkeypatch):
+    monkeypatch.setattr(compression, "MAX_DECOMPRESSED_BYTES", len(BODY))
+    data = gzip.compress(BODY) + gzip.compress(b" ")
+
+    with pytest.raises(RequestBodyError) as error:
+        decode_body(data, "gzip")
+    assert error.value.status == 413
+
+
+def test_unknown_encoding():
+    with pytest.raises(RequestBodyError) as error:
+        decode_body(BODY, "br")
+    assert error.value.status == 415
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("GZIP, br", "gzip"),
+        ("*", compression.ENCODINGS[0]),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("*;q=0, gzip;q=0.5", "gzip"),
+    ],
+)
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+
+def test_compress_round_trip():
+    assert gzip.decompress(compress(BODY, "gzip")) == BODY
+
+
+def test_compress_stream_flushes_every_chunk():
+    chunks = ["event: a\n\n", b"event: b\n\n"]
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    decoded = [
+        decompressor.decompress(part)
+        for part in compress_stream(iter(chunks), "gzip", flush_every_chunk=True)
+    ]
+
+    # Each chunk can be decoded as soon as it is sent
+    assert decoded[:2] == [b"event: a\n\n", b"event: b\n\n"]
+    assert decompressor.eof
+
+
+def test_compress_stream_closes_source():
+    closed = []
+
+    def source():
+        try:
+            yield "row\n"
+            yield "row\n"
+        finally:
+            closed.append(True)
+
+    stream = compress_stream(source(), "gzip")
+    next(stream)
+    stream.close()
+    assert closed == [True]
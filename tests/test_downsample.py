@@ -0,0 +1,155 @@
+"""
+Tests for shape-preserving downsampling (storage/downsample.py).
+Run with: python -m pytest tests
+"""
+
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from storage.downsample import (
+    downsample_columns,
+    downsample_indices,
+    downsample_rows,
+    lttb_indices,
+    minmax_indices,
+)
+
+METHODS = ["lttb", "minmax"]
+
+
+def _columns(n, newest_first=False, seed=0):
+    rng = np.random.default_rng(seed)
+    times = np.arange(n, dtype=np.int64) * 1_000_000_000
+    if newest_first:
+        times = times[::-1].copy()
+    return {
+        "timestamp": times,
+        "temperature": rng.normal(20.0, 1.0, n),
+        "conductivity": rng.normal(1500.0, 50.0, n),
+    }
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("n, points", [(0, 3), (1, 3), (3, 3), (10, 10), (10, 50)])
+def test_passthrough_when_points_cover_rows(method, n, points):
+    columns = _columns(n)
+
+    indices = downsample_indices(columns, points, method)
+
+    np.testing.assert_array_equal(indices, np.arange(n))
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("points", [3, 4, 5, 6, 7, 10, 11, 100])
+@pytest.mark.parametrize("n", [4, 11, 101, 1000])
+def test_at_most_points_sorted_unique_with_ends(method, points, n):
+    columns = _columns(n)
+
+    indices = downsample_indices(columns, points, method)
+
+    assert len(indices) <= min(points, n)
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == n - 1
+
+
+@pytest.mark.parametrize("points", [3, 7, 50])
+def test_lttb_returns_exactly_points(points):
+    columns = _columns(500)
+
+    indices = lttb_indices(
+        columns["timestamp"],
+        [columns["temperature"], columns["conductivity"]],
+        points,
+    )
+
+    assert len(indices) == points
+    assert len(np.unique(indices)) == points
+
+
+def test_lttb_keeps_a_spike():
+    columns = _columns(1000)
+    columns["temperature"][437] = 100.0
+
+    indices = downsample_indices(columns, 20, "lttb")
+
+    assert 437 in indices
+
+
+@pytest.mark.parametrize("points", [6, 10, 42])
+def test_minmax_keeps_global_extremes(points):
+    columns = _columns(1000)
+    columns["temperature"][123] = 100.0
+    columns["conductivity"][876] = -5.0
+
+    indices = downsample_indices(columns, points, "minmax")
+
+    assert {123, 876} <= set(indices.tolist())
+
+
+def test_minmax_bucket_edges():
+    # One bucket per field pair: the extremes of each bucket must come from
+    # inside that bucket, including the last, shorter one
+    values = [np.arange(10, dtype=np.float64), np.zeros(10)]
+
+    indices = minmax_indices(values, 2 + 2 * 2 * 3)
+
+    # Buckets [0, 3), [3, 6), [6, 10): the rising field has its minimum at
+    # each bucket start and its maximum at each bucket end; the flat field
+    # repeats the bucket starts
+    assert indices.tolist() == [0, 2, 3, 5, 6, 9]
+
+
+def test_minmax_ignores_nan():
+    columns = _columns(200)
+    columns["conductivity"][:] = np.nan
+    columns["temperature"][50] = np.nan
+
+    indices = downsample_indices(columns, 4, "minmax")
+
+    assert len(indices) <= 4
+    assert 50 not in indices[1:-1]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_columns_stay_aligned_and_ordered(method):
+    columns = _columns(300, newest_first=True)
+
+    reduced = downsample_columns(columns, 20, method)
+
+    # Newest-first input stays newest first, rows are not mixed up
+    assert np.all(np.diff(reduced["timestamp"]) < 0)
+    positions = (columns["timestamp"][0] - reduced["timestamp"]) // 1_000_000_000
+    np.testing.assert_array_equal(
+        reduced["temperature"], columns["temperature"][positions]
+    )
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_rows_keep_order_and_identity(method):
+    start = datetime(2024, 12, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "temperature": float(i % 17),
+            "conductivity": None if i % 5 == 0 else float(i % 13),
+        }
+        for i in range(120)
+    ]
+
+    selected = downsample_rows(rows, 10, method)
+
+    assert len(selected) <= 10
+    positions = [rows.index(row) for row in selected]
+    assert positions == sorted(positions)
+    assert selected[0] is rows[0] and selected[-1] is rows[-1]
+
+
+def test_rows_passthrough():
+    rows = [{"timestamp": "2024-12-01T00:00:00+00:00", "temperature": 1.0}]
+
+    assert downsample_rows(rows, 3) is rows
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample_indices(_columns(10), 3, "average")
@@ -0,0 +1,132 @@
+"""
+Tests for the in-memory raw reading tail (storage/hot_tail.py).
+Run with: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+from storage.hot_tail import HotTail
+from utils.windows import NS_PER_SECOND
+
+CAPACITY = 5
+
+
+@pytest.fixture
+def tail():
+    return HotTail(capacity=CAPACITY)
+
+
+def _time(tail, index):
+    """Timestamp of reading `index`, whole seconds after the tail was created."""
+    return (tail._created_ns // NS_PER_SECOND + index) * NS_PER_SECOND
+
+
+def _fill(tail, count, sensor_id="s1"):
+    for index in range(1, count + 1):
+        tail.add(sensor_id, _time(tail, index), 20.0 + index, 1500.0 + index)
+
+
+def _read(tail, first, last, limit=100, sensor_id="s1"):
+    """Read readings first..last inclusive."""
+    return tail.read_columns(
+        sensor_id, _time(tail, first), _time(tail, last + 1), limit=limit
+    )
+
+
+def test_wrapped_ring_keeps_newest_in_order(tail):
+    _fill(tail, 12)
+
+    columns = _read(tail, 8, 12)
+
+    assert columns["timestamp"].tolist() == [_time(tail, i) for i in range(12, 7, -1)]
+    assert columns["temperature"].tolist() == [32.0, 31.0, 30.0, 29.0, 28.0]
+    assert columns["conductivity"].tolist() == [1512.0, 1511.0, 1510.0, 1509.0, 1508.0]
+    assert columns["timestamp"].dtype == np.int64
+
+
+def test_range_filter_is_half_open(tail):
+    _fill(tail, 12)
+
+    columns = tail.read_columns("s1", _time(tail, 9), _time(tail, 11), limit=CAPACITY)
+
+    assert columns["timestamp"].tolist() == [_time(tail, 10), _time(tail, 9)]
+
+
+def test_limit_keeps_newest(tail):
+    _fill(tail, 12)
+
+    columns = _read(tail, 8, 12, limit=2)
+
+    assert columns["timestamp"].tolist() == [_time(tail, 12), _time(tail, 11)]
+
+
+@pytest.mark.parametrize("limit", [6, 100])
+def test_range_past_evicted_readings_misses(tail, limit):
+    _fill(tail, 12)
+
+    # Readings 1-7 were overwritten; the ring cannot answer for them
+    assert _read(tail, 5, 12, limit=limit) is None
+    assert tail.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("limit", [3, CAPACITY])
+def test_range_past_evicted_readings_hits_when_limit_is_retained(tail, limit):
+    _fill(tail, 12)
+
+    columns = _read(tail, 5, 12, limit=limit)
+
+    assert columns["timestamp"].tolist() == [
+        _time(tail, i) for i in range(12, 12 - limit, -1)
+    ]
+    assert tail.stats()["hits"] == 1
+
+
+def test_range_at_retained_edge(tail):
+    _fill(tail, 12)
+
+    # Reading 7 was the last one overwritten, so the range must start after it
+    assert _read(tail, 7, 12) is None
+    assert len(_read(tail, 8, 12)) == 3
+
+
+def test_rewritten_timestamp_keeps_latest_values(tail):
+    _fill(tail, 3)
+    tail.add("s1", _time(tail, 3), 99.0, 999.0)
+
+    columns = _read(tail, 1, 3)
+
+    assert columns["timestamp"].tolist() == [_time(tail, i) for i in (3, 2, 1)]
+    assert columns["temperature"].tolist() == [99.0, 22.0, 21.0]
+
+
+def test_partly_filled_ring(tail):
+    _fill(tail, 3)
+
+    assert len(_read(tail, 1, 3)["timestamp"]) == 3
+    assert _read(tail, 4, 6)["timestamp"].tolist() == []
+
+
+def test_readings_before_creation_miss(tail):
+    _fill(tail, 3)
+
+    assert tail.read_columns("s1", "-1h", limit=100) is None
+    assert tail.read_columns("unknown", "-1h", limit=1) is None
+
+
+def test_unparsed_timestamp_stops_vouching(tail):
+    _fill(tail, 3)
+    since_creation = tail._created_ns + 1000
+    assert tail.read_columns("s1", since_creation, _time(tail, 4)) is not None
+
+    tail.add("s1", "not a time", 1.0, 2.0)
+
+    assert tail.read_columns("s1", since_creation, _time(tail, 4)) is None
+    assert tail.stats()["unparsed"] == 1
+
+
+def test_sensors_are_kept_apart(tail):
+    _fill(tail, 12, sensor_id="a")
+    _fill(tail, 2, sensor_id="b")
+
+    assert len(_read(tail, 1, 12, limit=3, sensor_id="b")["timestamp"]) == 2
+    assert tail.stats()["sensors"] == 2
@@ -0,0 +1,190 @@
+"""
+Tests for in-process incremental aggregation (operations/incremental_aggregator.py).
+Run with: python -m pytest tests
+"""
+
+import statistics
+import numpy as np
+import pytest
+from operations.incremental_aggregator import IncrementalAggregator
+from utils.windows import NS_PER_SECOND
+
+WINDOW_NS = 60 * NS_PER_SECOND
+# A window start well in the past, so windows can be closed with `now`
+START_NS = 1733049000 * NS_PER_SECOND - 1733049000 * NS_PER_SECOND % WINDOW_NS
+
+
+@pytest.fixture
+def aggregator():
+    written = []
+    # The background thread never ticks; tests call emit_closed() themselves
+    aggregator = IncrementalAggregator(
+        written.extend, windows=["1m"], grace=0.0, tick_interval=3600
+    )
+    aggregator.written = written
+    yield aggregator
+    aggregator.close()
+
+
+def _readings(sensor_id, count, seed=0, start_ns=START_NS):
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(0, WINDOW_NS, count)
+    temperatures = rng.normal(20.0, 3.0, count)
+    conductivities = rng.normal(1500.0, 40.0, count)
+    return [
+        {
+            "sensor_id": sensor_id,
+            "timestamp": int(start_ns + offset),
+            "temperature": float(t),
+            "conductivity": float(c),
+        }
+        for offset, t, c in zip(offsets, temperatures, conductivities)
+    ]
+
+
+def _state_row(aggregator, sensor_id, start_ns=START_NS):
+    state = aggregator.states["1m"]
+    return state, state.slots[(sensor_id, start_ns)]
+
+
+@pytest.mark.parametrize("splits", [[500], [1, 499], [250, 250], [7, 93, 1, 399]])
+def test_merged_variance_matches_pvariance(aggregator, splits):
+    readings = _readings("s1", sum(splits))
+    position = 0
+    for size in splits:
+        aggregator.add(readings[position : position + size])
+        position += size
+
+    state, row = _state_row(aggregator, "s1")
+    assert state.count[row] == len(readings)
+    for index, field in enumerate(("temperature", "conductivity")):
+        values = [reading[field] for reading in readings]
+        assert state.mean[row, index] == pytest.approx(statistics.fmean(values))
+        assert state.m2[row, index] / state.count[row] == pytest.approx(
+            statistics.pvariance(values), rel=1e-9
+        )
+        assert state.min[row, index] == min(values)
+        assert state.max[row, index] == max(values)
+
+
+def test_open_statistics_match_stdlib(aggregator):
+    readings = _readings("s1", 300, seed=3)
+    for batch in np.array_split(np.arange(len(readings)), 5):
+        aggregator.add([readings[i] for i in batch])
+
+    (row,) = aggregator.open_statistics("s1", "1m")
+
+    assert row["partial"] is True
+    values = [reading["temperature"] for reading in readings]
+    stats = row["temperature"]
+    assert stats["count"] == 300
+    assert stats["mean"] == pytest.approx(statistics.fmean(values))
+    assert stats["stddev"] == pytest.approx(statistics.stdev(values), rel=1e-6)
+
+
+def test_sensors_and_windows_are_kept_apart(aggregator):
+    first = _readings("a", 50, seed=1)
+    second = _readings("b", 50, seed=2)
+    later = _readings("a", 50, seed=4, start_ns=START_NS + WINDOW_NS)
+    aggregator.add(first + second + later)
+
+    state = aggregator.states["1m"]
+    assert len(state.slots) == 3
+    _, row = _state_row(aggregator, "a")
+    values = [reading["temperature"] for reading in first]
+    assert state.mean[row, 0] == pytest.approx(statistics.fmean(values))
+
+
+def test_window_close_writes_every_statistic(aggregator):
+    aggregator.add(_readings("s1", 20))
+
+    aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND)
+
+    window_end = str(START_NS + WINDOW_NS)
+    stat_lines = [line for line in aggregator.written if "stat_type=" in line]
+    assert sorted(line.split("stat_type=")[1].split(" ")[0] for line in stat_lines) == [
+        "count",
+        "max",
+        "mean",
+        "min",
+        "sum",
+        "sumsq",
+    ]
+    assert all(line.endswith(window_end) for line in aggregator.written)
+    assert any(
+        line.startswith("water_quality_1m_sketch,") for line in aggregator.written
+    )
+    assert aggregator.states["1m"].slots == {}
+    assert aggregator.stats()["windows_emitted"] == 1
+
+
+def test_window_still_open_before_its_end(aggregator):
+    aggregator.add(_readings("s1", 20))
+
+    aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND - 1)
+
+    assert aggregator.written == []
+    assert len(aggregator.open_aggregated("s1", "1m")) == 1
+
+
+def test_late_points_are_counted_not_reopened(aggregator):
+    aggregator.add(_readings("s1", 20))
+    aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND)
+    written = len(aggregator.written)
+
+    aggregator.add(_readings("s1", 5, seed=9))
+
+    assert aggregator.stats()["late_points"] == 5
+    assert aggregator.states["1m"].slots == {}
+    aggregator.emit_closed(now=(START_NS + 2 * WINDOW_NS) / NS_PER_SECOND)
+    assert len(aggregator.written) == written
+
+
+def test_reused_rows_start_empty(aggregator):
+    aggregator.add(_readings("s1", 20))
+    aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND)
+
+    next_window = _readings("s1", 3, seed=5, start_ns=START_NS + WINDOW_NS)
+    aggregator.add(next_window)
+
+    state, row = _state_row(aggregator, "s1", START_NS + WINDOW_NS)
+    assert state.count[row] == 3
+    values = [reading["conductivity"] for reading in next_window]
+    assert state.m2[row, 1] / 3 == pytest.approx(statistics.pvariance(values))
+    assert state.max[row, 1] == max(values)
+
+
+def test_failed_writes_are_retried():
+    attempts = []
+
+    def flaky_write(lines):
+        attempts.append(list(lines))
+        if len(attempts) == 1:
+            raise ConnectionError("InfluxDB unavailable")
+
+    aggregator = IncrementalAggregator(
+        flaky_write, windows=["1m"], grace=0.0, tick_interval=3600
+    )
+    try:
+        aggregator.add(_readings("s1", 10))
+        aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND)
+        assert aggregator.stats()["pending_lines"] == len(attempts[0])
+
+        aggregator.emit_closed(now=(START_NS + WINDOW_NS) / NS_PER_SECOND)
+        assert attempts[1] == attempts[0]
+        assert aggregator.stats()["pending_lines"] == 0
+        assert aggregator.stats()["emit_errors"] == 1
+    finally:
+        aggregator.close()
+
+
+def test_invalid_readings_are_skipped(aggregator):
+    aggregator.add(
+        [
+            {"sensor_id": "s1", "timestamp": "not a time", "temperature": 1.0},
+            *_readings("s1", 2),
+        ]
+    )
+
+    assert aggregator.stats()["invalid_points"] == 1
+    assert aggregator.stats()["points"] == 2
@@ -0,0 +1,32 @@
+"""
+Regression tests for api/ingest_schema.py.
+Run with: python -m pytest tests
+"""
+
+import pytest
+from api.ingest_schema import parse_timestamp
+
+BASE_NS = 1733049000 * 1_000_000_000  # 2024-12-01T10:30:00Z
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-12-01T10:30:00Z", BASE_NS),
+        ("2024-12-01T10:30:00.123456789Z", BASE_NS + 123456789),
+        ("2024-12-01 10:30:00,25", BASE_NS + 250000000),
+        ("20241201T103000Z", BASE_NS),
+        ("20241201T103000.5Z", BASE_NS + 500000000),
+        ("20241201T103000,123456789Z", BASE_NS + 123456789),
+        ("2024-12-01T11:30:00.5+01:00", BASE_NS + 500000000),
+        (BASE_NS + 1, BASE_NS + 1),
+    ],
+)
+def test_parse_timestamp_keeps_fraction(value, expected):
+    assert parse_timestamp(value) == expected
+
+
+@pytest.mark.parametrize("value", ["not a time", "1969-12-31T23:59:59Z", -1, 1.5])
+def test_parse_timestamp_rejects(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
@@ -0,0 +1,83 @@
+"""
+Regression tests for the line protocol written by storage/influx_client.py.
+Run with: python -m pytest tests
+"""
+
+import pytest
+from influxdb_client import Point
+from api.ingest_schema import normalize_measurement
+from storage.influx_client import _measurement_line
+
+AWKWARD_IDS = ["a,b", "a=b", "a b", "a\nb", "a\\", " lead", "x=1,y 2\\"]
+
+
+def _split_unescaped(text, separator):
+    """Split like InfluxDB's parser: a backslash escapes the next character."""
+    parts, current, escaped = [], "", False
+    for char in text:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\":
+            current += char
+            escaped = True
+        elif char == separator:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def _unescape_tag(value):
+    for escaped, char in ((r"\,", ","), (r"\=", "="), (r"\ ", " ")):
+        value = value.replace(escaped, char)
+    return value
+
+
+@pytest.mark.parametrize("sensor_id", AWKWARD_IDS)
+def test_line_matches_point(sensor_id):
+    line = _measurement_line(sensor_id, 1733049000000000001, 21.5, 1500.0)
+    point = (
+        Point("water_quality")
+        .tag("sensor_id", sensor_id)
+        .field("temperature", 21.5)
+        .field("conductivity", 1500.0)
+        .time(1733049000000000001)
+    )
+    assert line == point.to_line_protocol()
+    assert "\n" not in line
+
+    # measurement+tags, fields, timestamp
+    series, fields, timestamp = _split_unescaped(line, " ")
+    assert _split_unescaped(fields, ",") == [
+        "conductivity=1500",
+        "temperature=21.5",
+    ]
+    assert timestamp == "1733049000000000001"
+    measurement, tag = _split_unescaped(series, ",")
+    assert measurement == "water_quality"
+    assert tag.startswith("sensor_id=")
+
+
+@pytest.mark.parametrize("sensor_id", ["a,b", "a=b", "a b", " lead"])
+def test_tag_value_round_trips(sensor_id):
+    line = _measurement_line(sensor_id, 1, 21.5, 1500.0)
+    series = _split_unescaped(line, " ")[0]
+    tag = _split_unescaped(series, ",")[1]
+    key, value = _split_unescaped(tag, "=")
+    assert key == "sensor_id"
+    assert _unescape_tag(value) == sensor_id
+
+
+def test_ingest_rejects_trailing_backslash():
+    item = {
+        "sensor_id": "a\\",
+        "timestamp": 1,
+        "temperature": 20.0,
+        "conductivity": 1500.0,
+    }
+    measurement, error = normalize_measurement(item, 10)
+    assert measurement is None
+    assert "backslash" in error
@@ -0,0 +1,78 @@
+"""
+Tests for keyset pagination (storage/pagination.py).
+Run with: python -m pytest tests
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from storage.pagination import encode_cursor, decode_cursor, read_page
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+BASE_NS = 1733049000 * 1_000_000_000
+
+
+def _fake_fetch(times_ns):
+    """
+    Serve rows like the raw read: bounds truncated to microseconds, newest
+    first, microsecond ISO timestamps.
+    """
+    ordered = sorted(times_ns, reverse=True)
+
+    def fetch(lower_ns, upper_ns, count):
+        lower, upper = lower_ns // 1000 * 1000, upper_ns // 1000 * 1000
+        selected = [t for t in ordered if lower <= t < upper][:count]
+        return [
+            {
+                "timestamp": (EPOCH + timedelta(microseconds=t // 1000)).isoformat(),
+                "ns": t,
+            }
+            for t in selected
+        ]
+
+    return fetch
+
+
+def _walk(times_ns, limit):
+    fetch = _fake_fetch(times_ns)
+    start_ns, before_ns = BASE_NS - 10**9, BASE_NS + 10**9
+    page = (start_ns, before_ns, before_ns - start_ns, 0)
+    seen = []
+    for _ in range(len(times_ns) + 2):
+        rows, cursor = read_page(fetch, *page, limit)
+        seen += [row["ns"] for row in rows]
+        if cursor is None:
+            return seen
+        page = decode_cursor(cursor)
+    raise AssertionError("pagination did not terminate")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_rows_sharing_a_microsecond_are_not_skipped(limit):
+    # Clusters of readings within the same microsecond, nanoseconds apart
+    times = [BASE_NS + us * 1000 + ns for us in range(0, 40, 7) for ns in (1, 5, 9)]
+    times += [BASE_NS - 3000, BASE_NS + 100_000]
+
+    assert _walk(times, limit) == sorted(times, reverse=True)
+
+
+def test_distinct_microseconds():
+    times = [BASE_NS + i * 1000 for i in range(25)]
+
+    assert _walk(times, 4) == sorted(times, reverse=True)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1, 2, 3, 4)) == (1, 2, 3, 4)
+
+
+def test_cursor_without_skip_count_is_accepted():
+    legacy = "WzEsMiwzXQ"  # [1,2,3]
+
+    assert decode_cursor(legacy) == (1, 2, 3, 0)
+
+
+# Garbage, and a negative skip count ([1,2,3,-1])
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WzEsMiwzLC0xXQ"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
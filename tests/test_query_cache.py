@@ -0,0 +1,79 @@
+"""
+Regression tests for storage/query_cache.py.
+Run with: python -m pytest tests
+"""
+
+from datetime import datetime, timedelta, timezone
+from storage.query_cache import QueryCache
+from utils.windows import parse_time
+
+
+def _fetch_every_second(start, stop):
+    """Fake rollup query: one row per whole second in [start, stop), newest first."""
+    first = int(parse_time(start).timestamp())
+    last = int(parse_time(stop).timestamp())
+    return [
+        {"timestamp": datetime.fromtimestamp(t, tz=timezone.utc).isoformat()}
+        for t in range(last - 1, first - 1, -1)
+    ]
+
+
+def _expected(start, stop):
+    """Rows a query for [start, stop) must return."""
+    return [
+        row
+        for row in _fetch_every_second(
+            (start - timedelta(seconds=1)).isoformat(),
+            (stop + timedelta(seconds=1)).isoformat(),
+        )
+        if start <= datetime.fromisoformat(row["timestamp"]) < stop
+    ]
+
+
+def test_fractional_start_in_tail():
+    cache = QueryCache(max_bytes=1024 * 1024)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(seconds=25.5)
+    stop = now - timedelta(seconds=5)
+
+    rows = cache.read(
+        "aggregated",
+        "s1",
+        "1s",
+        start.isoformat(),
+        stop.isoformat(),
+        _fetch_every_second,
+    )
+
+    assert rows == _expected(start, stop)
+    assert len(rows) == 20
+
+
+def test_relative_start_in_tail():
+    cache = QueryCache(max_bytes=1024 * 1024)
+
+    rows = cache.read("aggregated", "s1", "1s", "-25s", None, _fetch_every_second)
+
+    # The relative start is resolved between the two clock reads
+    assert 24 <= len(rows) <= 26
+    timestamps = [datetime.fromisoformat(row["timestamp"]) for row in rows]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+def test_fractional_start_with_cached_blocks():
+    cache = QueryCache(max_bytes=1024 * 1024, block_windows=10, settle=0)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(seconds=95.5)
+    stop = now - timedelta(seconds=0.5)
+
+    for _ in range(2):
+        rows = cache.read(
+            "aggregated",
+            "s1",
+            "1s",
+            start.isoformat(),
+            stop.isoformat(),
+            _fetch_every_second,
+        )
+        assert rows == _expected(start, stop)
+    assert cache.stats()["hits"] > 0
@@ -0,0 +1,109 @@
+"""
+Tests for the mergeable quantile sketches (storage/sketch.py).
+Run with: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+from storage.sketch import (
+    MIN_VALUE,
+    RELATIVE_ACCURACY,
+    bucket_codes,
+    bucket_tag,
+    bucket_value,
+    merge_counts,
+    parse_percentiles,
+    percentiles,
+)
+
+RANKS = [0.0, 1.0, 10.0, 25.0, 50.0, 75.0, 90.0, 99.0, 99.9, 100.0]
+
+
+def _sketch(values):
+    codes, counts = np.unique(bucket_codes(np.asarray(values)), return_counts=True)
+    return {bucket_tag(code): int(count) for code, count in zip(codes, counts)}
+
+
+def _assert_close(estimate, exact):
+    assert abs(estimate - exact) <= RELATIVE_ACCURACY * abs(exact) + MIN_VALUE
+
+
+def _samples():
+    rng = np.random.default_rng(42)
+    return {
+        "positive": rng.lognormal(3.0, 1.5, 5000),
+        "negative": -rng.lognormal(1.0, 0.5, 5000),
+        "mixed": rng.normal(0.0, 25.0, 5000),
+        "with zeros": np.concatenate([np.zeros(1500), rng.normal(5.0, 3.0, 3500)]),
+        "tiny": np.array([1e-12, -1e-12, 0.0, 2e-9, -2e-9, 1e-3]),
+    }
+
+
+@pytest.mark.parametrize("name", list(_samples()))
+def test_percentiles_within_relative_accuracy(name):
+    values = _samples()[name]
+
+    result = percentiles(_sketch(values), RANKS)
+
+    assert result["count"] == len(values)
+    ordered = np.sort(values)
+    for rank in RANKS:
+        # The sketch returns the bucket of the reading at rank * (n - 1)
+        exact = np.percentile(ordered, rank, method="lower")
+        _assert_close(result[f"p{rank:g}"], exact)
+
+
+def test_merged_sketches_match_the_whole():
+    values = _samples()["mixed"]
+    parts = np.array_split(values, 7)
+
+    merged = {}
+    for part in parts:
+        merge_counts(merged, _sketch(part))
+
+    assert merged == _sketch(values)
+    assert percentiles(merged, RANKS) == percentiles(_sketch(values), RANKS)
+
+
+@pytest.mark.parametrize(
+    "value, tag",
+    [
+        (0.0, "z"),
+        (MIN_VALUE / 2, "z"),
+        (-MIN_VALUE / 2, "z"),
+        (1.0, "p0"),
+        (-1.0, "n0"),
+        (1.5, "p21"),
+        (-1.5, "n21"),
+    ],
+)
+def test_bucket_tags(value, tag):
+    assert bucket_tag(bucket_codes(np.array([value]))[0]) == tag
+
+
+@pytest.mark.parametrize(
+    "value", [1e-6, 0.37, 1.0, 3.14159, 25.0, 1499.9, 1e6, -0.37, -25.0, -1e6]
+)
+def test_bucket_value_within_accuracy(value):
+    tag = bucket_tag(bucket_codes(np.array([value]))[0])
+
+    _assert_close(bucket_value(tag), value)
+    assert np.sign(bucket_value(tag)) == np.sign(value)
+
+
+def test_bucket_value_rejects_unknown_tags():
+    with pytest.raises(ValueError):
+        bucket_value("q3")
+
+
+def test_empty_sketch():
+    assert percentiles({}, [50.0]) == {"count": 0, "p50": None}
+
+
+def test_parse_percentiles():
+    assert parse_percentiles("") == [50.0, 95.0, 99.0]
+    assert parse_percentiles("99.9, 50,50,") == [99.9, 50.0]
+    with pytest.raises(ValueError):
+        parse_percentiles("101")
+    with pytest.raises(ValueError):
+        parse_percentiles("p50")
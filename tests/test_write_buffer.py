@@ -0,0 +1,155 @@
+"""
+Tests for the background line-protocol writer (storage/write_buffer.py).
+Run with: python -m pytest tests
+"""
+
+import time
+import pytest
+from storage.write_buffer import BufferedWriter, WriteBufferFullError
+
+
+def _lines(count, prefix="m"):
+    return [f"{prefix} value={i} {i}" for i in range(count)]
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class FlakyWrite:
+    """write_fn that fails its first `failures` calls and records every payload."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, payload):
+        self.calls.append(payload)
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("InfluxDB unavailable")
+
+    @property
+    def written(self):
+        return self.calls[self.failures :]
+
+
+def test_full_batches_are_written_without_waiting():
+    write = FlakyWrite()
+    writer = BufferedWriter(write, batch_size=3, flush_interval=60)
+    lines = _lines(7)
+
+    writer.submit(lines)
+
+    _wait_for(lambda: writer.stats()["written"] == 6)
+    assert write.written == ["\n".join(lines[0:3]), "\n".join(lines[3:6])]
+    assert writer.stats()["queue_depth"] == 1
+
+    assert writer.close(timeout=2)
+    assert write.written[-1] == lines[6]
+    assert writer.stats()["flushes"] == 3
+
+
+def test_partial_batch_is_written_after_flush_interval():
+    write = FlakyWrite()
+    writer = BufferedWriter(write, batch_size=100, flush_interval=0.05)
+
+    writer.submit(_lines(2))
+
+    _wait_for(lambda: writer.stats()["written"] == 2)
+    assert len(write.written) == 1
+    writer.close(timeout=2)
+
+
+def test_flush_writes_partial_batch():
+    write = FlakyWrite()
+    writer = BufferedWriter(write, batch_size=100, flush_interval=60)
+    writer.submit(_lines(2))
+
+    assert writer.flush(timeout=2)
+
+    assert write.written == ["\n".join(_lines(2))]
+    writer.close(timeout=2)
+
+
+def test_failed_write_is_retried():
+    write = FlakyWrite(failures=2)
+    writer = BufferedWriter(
+        write, batch_size=100, flush_interval=60, base_backoff=0.001
+    )
+    writer.submit(_lines(4))
+
+    assert writer.flush(timeout=2)
+
+    assert write.calls == ["\n".join(_lines(4))] * 3
+    stats = writer.stats()
+    assert stats["retries"] == 2
+    assert stats["written"] == 4
+    assert stats["dropped"] == 0
+    writer.close(timeout=2)
+
+
+def test_batch_is_dropped_after_max_retries():
+    write = FlakyWrite(failures=1000)
+    writer = BufferedWriter(
+        write, batch_size=100, flush_interval=60, max_retries=3, base_backoff=0.001
+    )
+    writer.submit(_lines(4))
+
+    assert writer.flush(timeout=2)
+
+    assert len(write.calls) == 3
+    stats = writer.stats()
+    assert stats["retries"] == 2
+    assert stats["dropped"] == 4
+    assert stats["written"] == 0
+
+    # Later points are still written
+    write.failures = 0
+    write.calls.clear()
+    writer.submit(_lines(1))
+    assert writer.flush(timeout=2)
+    assert writer.stats()["written"] == 1
+    writer.close(timeout=2)
+
+
+def test_full_queue_rejects_points():
+    writer = BufferedWriter(
+        FlakyWrite(),
+        max_queue_size=4,
+        batch_size=100,
+        flush_interval=60,
+        enqueue_timeout=0.01,
+    )
+    writer.submit(_lines(3))
+
+    with pytest.raises(WriteBufferFullError) as error:
+        writer.submit(_lines(2))
+
+    assert error.value.retry_after >= 1
+    stats = writer.stats()
+    assert stats["rejected"] == 2
+    assert stats["queue_depth"] == 3
+    writer.close(timeout=2)
+
+
+def test_oversized_submit_is_rejected():
+    writer = BufferedWriter(FlakyWrite(), max_queue_size=4, flush_interval=60)
+
+    with pytest.raises(WriteBufferFullError):
+        writer.submit(_lines(5))
+    writer.close(timeout=2)
+
+
+def test_close_writes_pending_points_and_refuses_more():
+    write = FlakyWrite()
+    writer = BufferedWriter(write, batch_size=100, flush_interval=60)
+    writer.submit(_lines(3))
+
+    assert writer.close(timeout=2)
+
+    assert write.written == ["\n".join(_lines(3))]
+    with pytest.raises(RuntimeError):
+        writer.submit(_lines(1))
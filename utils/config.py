@@ -3,6 +3,11 @@ API_URL = "http://localhost:8081/measurements"
 SENSORS = ["sensor_001", "sensor_002", "sensor_003"]
 INTERVAL_SECONDS = 0.5
 
+# Load simulator defaults (simulation/load_simulator.py)
+LOAD_SENSORS = 10000
+LOAD_RATE = 5000  # readings per second, across all sensors
+LOAD_CONNECTIONS = 64
+
 # Realistic value ranges for water quality monitoring
 TEMP_RANGE = (20.0, 30.0)  # Celsius
 CONDUCTIVITY_RANGE = (1000, 3000)  # microsiemens/cm
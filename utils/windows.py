@@ -0,0 +1,159 @@
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+# Rollup tiers, finest first. The first tier is aggregated from raw
+# measurements and every other tier from the tier before it, so each
+# window must be a whole multiple of the previous one.
+ROLLUP_WINDOWS = [
+    window.strip()
+    for window in os.getenv("ROLLUP_WINDOWS", "1m,5m,15m,1h,1d").split(",")
+    if window.strip()
+]
+
+# Automatic window selection aims for at least this many windows per query
+TARGET_WINDOWS = int(os.getenv("API_TARGET_WINDOWS", "100"))
+
+NS_PER_SECOND = 1_000_000_000
+
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_DURATION_RE = re.compile(r"(\d+)([smhdw])")
+
+
+def parse_duration(text: str) -> int:
+    """
+    Parse a Flux-style duration ("90s", "5m", "1h30m", "7d") into seconds.
+
+    Raises:
+        ValueError: If the text is not a positive duration
+    """
+    text = text.strip()
+    parts = _DURATION_RE.findall(text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"Invalid duration: {text!r}")
+
+    seconds = sum(int(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+    if seconds <= 0:
+        raise ValueError(f"Invalid duration: {text!r}")
+    return seconds
+
+
+def format_duration(seconds: int) -> str:
+    """Format seconds as the shortest exact Flux duration literal ("5m", "90s")."""
+    for unit in ("w", "d", "h", "m"):
+        if seconds % _UNIT_SECONDS[unit] == 0:
+            return f"{seconds // _UNIT_SECONDS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+def rollup_tiers() -> List[Tuple[str, Optional[str]]]:
+    """
+    Return the rollup hierarchy as (window, source_window) pairs, finest first.
+
+    The source window is None for the first tier, which is computed from raw data.
+
+    Raises:
+        ValueError: If a tier is not a whole multiple of the tier below it
+    """
+    tiers = []
+    previous = None
+    for window in ROLLUP_WINDOWS:
+        if previous and parse_duration(window) % parse_duration(previous):
+            raise ValueError(f"Rollup window {window} is not a multiple of {previous}")
+        tiers.append((window, previous))
+        previous = window
+    return tiers
+
+
+def parse_time(value: str, now: Optional[datetime] = None) -> datetime:
+    """
+    Resolve a relative ("-1h") or RFC3339 time string to an aware UTC datetime.
+
+    Raises:
+        ValueError: If the value cannot be parsed
+    """
+    now = now or datetime.now(timezone.utc)
+    value = value.strip()
+    if value == "now()":
+        return now
+    if value.startswith("-"):
+        return datetime.fromtimestamp(
+            now.timestamp() - parse_duration(value[1:]), tz=timezone.utc
+        )
+
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def epoch_ns(timestamp):
+    """
+    Convert a measurement timestamp to integer nanoseconds since the epoch.
+
+    Accepts RFC3339/ISO strings, datetimes and integers (already nanoseconds).
+
+    Raises:
+        ValueError: If the timestamp cannot be parsed
+    """
+    if isinstance(timestamp, bool):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+    if not isinstance(timestamp, datetime):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+
+    delta = timestamp - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (
+        delta.days * 86400 + delta.seconds
+    ) * NS_PER_SECOND + delta.microseconds * 1000
+
+
+def range_seconds(
+    start_time: str, end_time: Optional[str] = None, now: Optional[datetime] = None
+) -> float:
+    """Length of a query range in seconds (end defaults to now)."""
+    now = now or datetime.now(timezone.utc)
+    start = parse_time(start_time, now)
+    end = parse_time(end_time, now) if end_time else now
+    return max(0.0, (end - start).total_seconds())
+
+
+def _coarsest_tier_within(seconds: float) -> str:
+    """Return the coarsest tier no longer than `seconds` (or the finest tier)."""
+    chosen = ROLLUP_WINDOWS[0]
+    for window in ROLLUP_WINDOWS:
+        if parse_duration(window) <= seconds:
+            chosen = window
+    return chosen
+
+
+def resolve_window(requested: str) -> str:
+    """
+    Map a requested resolution onto the coarsest rollup tier that satisfies it.
+
+    A tier satisfies a resolution when its window is no longer than the
+    requested one; requests finer than every tier get the finest tier.
+
+    Raises:
+        ValueError: If the requested window is not a valid duration
+    """
+    return _coarsest_tier_within(parse_duration(requested))
+
+
+def select_window(
+    start_time: str, end_time: Optional[str] = None, now: Optional[datetime] = None
+) -> str:
+    """
+    Pick the coarsest rollup tier that still yields TARGET_WINDOWS windows.
+
+    Raises:
+        ValueError: If a time cannot be parsed
+    """
+    resolution = range_seconds(start_time, end_time, now) / TARGET_WINDOWS
+    return _coarsest_tier_within(resolution)